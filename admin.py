@@ -11,6 +11,7 @@ from datetime import datetime, timedelta
 
 from app.models import User, Artist, Album, Song, Download, VerificationCode
 from app import db
+from app.rankings import get_chart_songs
 
 # Define upload paths
 STATIC_PATH = 'app/static'
@@ -162,7 +163,7 @@ class SongModelView(SecureModelView):
 
     def on_model_change(self, form, model, is_created):
         if hasattr(form, 'lyrics_text') and form.lyrics_text.data:
-            model.parse_lyrics(form.lyrics_text.data)
+            model.set_lyrics(form.lyrics_text.data)
 
 
 class DownloadModelView(SecureModelView):
@@ -213,8 +214,9 @@ class MusicAdminIndexView(AdminIndexView):
             'recent_users': db.session.query(User).filter(
                 User.created_at >= datetime.utcnow() - timedelta(days=1)
             ).count(),
-            'top_songs': db.session.query(Song).order_by(Song.download_count.desc()).limit(5).all(),
-            'most_liked_songs': db.session.query(Song).order_by(Song.likes_count.desc()).limit(5).all(),
+            'top_songs': get_chart_songs('downloads', 5),
+            'most_liked_songs': get_chart_songs('likes', 5),
+            'trending_songs': get_chart_songs('trending', 5),
             'recent_downloads_list': db.session.query(Download).order_by(
                 Download.download_time.desc()
             ).limit(10).all(),
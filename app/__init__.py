@@ -7,6 +7,7 @@ import os
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
 from .utils.redis_client import RedisClient
+from .utils.http_client import upstream
 
 db = SQLAlchemy()
 migrate = Migrate()
@@ -22,6 +23,7 @@ def create_app(config_class=Config, debug=False):
 
     csrf.init_app(app)
     redis_client.init_app(app)
+    upstream.init_app(app)
 
     app.debug = debug
 
@@ -43,6 +45,24 @@ def create_app(config_class=Config, debug=False):
     from app.routes import main as main_blueprint
     app.register_blueprint(main_blueprint)
 
+    # 歌曲目录变更后递增目录版本号
+    from app.models import Song, Album, Artist
+    from app.utils.catalog import init_catalog_events
+    init_catalog_events((Song, Album, Artist))
+
+    from app import (catalog_search, catalog_suggest, cover_art, download_jobs, download_stats, ingest, likes,
+                     rankings, rate_limit, verification_codes)
+    download_jobs.init_app(app)
+    ingest.init_app(app)
+    cover_art.init_app(app)
+    likes.init_app(app)
+    download_stats.init_app(app)
+    rankings.init_app(app)
+    catalog_search.init_app(app)
+    catalog_suggest.init_app(app)
+    rate_limit.init_app(app)
+    verification_codes.init_app(app)
+
     with app.app_context():
         db.create_all()
 
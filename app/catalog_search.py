@@ -0,0 +1,240 @@
+# app/catalog_search.py
+
+import logging
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import click
+import redis
+from flask import current_app
+from sqlalchemy import func, select
+
+from app import db
+from app.models import Album, Artist, Song, song_artists
+from app.utils.catalog import get_catalog_version
+from app.utils.redis_client import RedisClient
+from app.utils.search_index import SearchIndex, warn_if_pinyin_missing
+
+logger = logging.getLogger(__name__)
+
+# 字段顺序即 SearchIndex 中的主字段（歌曲名完全匹配时加分）
+FIELD_WEIGHTS = {'name': 3, 'artist': 2, 'album': 1}
+
+# 写入过歌曲信息的歌曲ID（有序集合，分数为发布序号），各进程同步索引时重新索引序号更大的歌曲
+CHANGES_KEY = 'catalog_search:changes'
+CHANGES_SEQ_KEY = 'catalog_search:changes:seq'
+# 被裁剪掉的最大序号，落后于它的进程需要完整重建
+CHANGES_TRIMMED_KEY = 'catalog_search:changes:trimmed'
+CHANGES_MAX_SIZE = 10000
+
+# KEYS: 变更集合, 序号, 裁剪序号; ARGV: 序号起始值, 最大长度, 歌曲ID...
+# 序号键丢失后从毫秒时间戳重新开始，不会小于各进程已处理的序号
+_PUBLISH_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    redis.call('SET', KEYS[2], ARGV[1])
+end
+local seq = redis.call('INCR', KEYS[2])
+for i = 3, #ARGV do
+    redis.call('ZADD', KEYS[1], seq, ARGV[i])
+end
+local excess = redis.call('ZCARD', KEYS[1]) - tonumber(ARGV[2])
+if excess > 0 then
+    local last = redis.call('ZRANGE', KEYS[1], excess - 1, excess - 1, 'WITHSCORES')
+    redis.call('SET', KEYS[3], last[2])
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, excess - 1)
+end
+return seq
+"""
+
+_index = SearchIndex(FIELD_WEIGHTS)
+_sync_lock = threading.Lock()
+# 索引对应的目录版本、已索引的最大歌曲ID、已处理的变更序号、上次完整构建的时间
+_state = {'version': None, 'max_id': 0, 'seq': 0, 'built_at': None}
+
+
+def _documents(rows) -> List[Tuple[int, Dict[str, str]]]:
+    """(歌曲ID, 歌曲名, 专辑名) 加上艺术家（一次 IN 查询）组成索引文档"""
+    artists = {}
+    for song_id, artist_name in db.session.execute(
+        select(song_artists.c.song_id, Artist.name)
+        .join(Artist, song_artists.c.artist_id == Artist.id)
+        .where(song_artists.c.song_id.in_([row[0] for row in rows]))
+    ):
+        artists.setdefault(song_id, []).append(artist_name)
+
+    return [
+        (song_id, {'name': name, 'artist': ' '.join(artists.get(song_id, ())), 'album': album_name or ''})
+        for song_id, name, album_name in rows
+    ]
+
+
+def _song_rows():
+    return select(Song.id, Song.name, Album.name).outerjoin(Album, Song.album_id == Album.id)
+
+
+def _load_documents(min_id: int = 0, chunk_size: int = 1000) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """按ID顺序分批读取 ID 大于 min_id 的歌曲"""
+    last_id = min_id
+    while True:
+        rows = db.session.execute(
+            _song_rows().where(Song.id > last_id).order_by(Song.id).limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        yield from _documents(rows)
+        last_id = rows[-1][0]
+
+
+def current_change_seq() -> int:
+    """已发布的最新歌曲变更序号，Redis 不可用时返回 0（输入补全索引也使用这些变更）"""
+    client = RedisClient().client
+    if client is None:
+        return 0
+    try:
+        return int(client.get(CHANGES_SEQ_KEY) or 0)
+    except redis.RedisError as e:
+        logger.warning(f"读取歌曲变更序号失败: {e}")
+        return 0
+
+
+def published_changes(seq: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    序号大于 seq 的歌曲变更
+
+    Returns:
+        Optional[List[Tuple[int, int]]]: (歌曲ID, 序号) 列表，Redis 不可用时为空；
+        需要的变更已被裁剪时返回 None，调用方完整重建
+    """
+    client = RedisClient().client
+    if client is None:
+        return []
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.get(CHANGES_TRIMMED_KEY)
+        pipe.zrangebyscore(CHANGES_KEY, f'({seq}', '+inf', withscores=True)
+        trimmed, changes = pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"读取歌曲变更失败: {e}")
+        return []
+    if trimmed is not None and float(trimmed) > seq:
+        return None
+    return [(int(song_id), int(score)) for song_id, score in changes]
+
+
+def _publish_changes(song_ids) -> None:
+    """发布写入过的歌曲ID，其他进程同步索引时重新索引"""
+    client = RedisClient().client
+    if client is None:
+        return
+    try:
+        client.eval(_PUBLISH_SCRIPT, 3, CHANGES_KEY, CHANGES_SEQ_KEY, CHANGES_TRIMMED_KEY,
+                    int(time.time() * 1000), CHANGES_MAX_SIZE, *song_ids)
+    except redis.RedisError as e:
+        logger.warning(f"发布歌曲变更失败: {e}")
+
+
+def rebuild_index() -> int:
+    """从数据库完整构建索引，返回索引的歌曲数"""
+    warn_if_pinyin_missing()
+    version = get_catalog_version()
+    # 先读取序号：构建期间发布的变更在下次同步时重新索引
+    seq = current_change_seq()
+    documents = list(_load_documents())
+    _index.replace_all(documents)
+    _state.update(version=version, max_id=max((doc_id for doc_id, _ in documents), default=0),
+                  seq=seq, built_at=time.monotonic())
+    logger.info(f'歌曲搜索索引已构建，共 {len(documents)} 首')
+    return len(documents)
+
+
+def sync_index() -> None:
+    """
+    让索引跟上歌曲目录
+
+    其他进程写入的歌曲（改名、重新写入）通过 Redis 发布（见 index_songs），在这里重新索引；
+    目录版本变化时再读取新增的歌曲（ID 大于已索引的最大ID）。没有变更时不访问数据库。
+    歌曲数对不上（有删除）、落后的变更已被裁剪或超过 SEARCH_INDEX_REBUILD_INTERVAL 时完整重建。
+    其他线程正在同步时直接使用当前的索引。
+    """
+    version = get_catalog_version()
+    changes = published_changes(_state['seq'])
+    interval = current_app.config.get('SEARCH_INDEX_REBUILD_INTERVAL', 3600)
+    expired = _state['built_at'] is None or time.monotonic() - _state['built_at'] > interval
+    if version == _state['version'] and changes == [] and not expired:
+        return
+
+    # 首次构建时等待，之后的同步不阻塞查询
+    if not _sync_lock.acquire(blocking=_state['built_at'] is None):
+        return
+    try:
+        if _state['built_at'] is None or expired or changes is None:
+            rebuild_index()
+            return
+        if changes:
+            _reindex([song_id for song_id, _ in changes])
+            _state['seq'] = max(_state['seq'], max(seq for _, seq in changes))
+        if version == _state['version']:
+            return
+
+        added = 0
+        for doc_id, fields in _load_documents(_state['max_id']):
+            _index.add(doc_id, fields)
+            _state['max_id'] = max(_state['max_id'], doc_id)
+            added += 1
+        if db.session.execute(select(func.count(Song.id))).scalar() != len(_index):
+            rebuild_index()
+            return
+        _state['version'] = version
+        if added:
+            logger.info(f'歌曲搜索索引新增 {added} 首')
+    finally:
+        _sync_lock.release()
+
+
+def _reindex(song_ids) -> None:
+    """从数据库重新读取指定歌曲的索引文档，已删除的歌曲移出索引"""
+    rows = db.session.execute(_song_rows().where(Song.id.in_(song_ids))).all()
+    for doc_id, fields in _documents(rows) if rows else ():
+        _index.add(doc_id, fields)
+    found = {row[0] for row in rows}
+    for doc_id in song_ids:
+        if doc_id not in found:
+            _index.remove(doc_id)
+
+
+def index_songs(song_ids) -> None:
+    """重新索引指定的歌曲（写入歌曲信息并提交之后调用），并发布给其他进程"""
+    song_ids = list(set(song_ids))
+    if not song_ids:
+        return
+    _publish_changes(song_ids)
+    if _state['built_at'] is not None:
+        _reindex(song_ids)
+
+
+def search_catalog(query: str, limit: int = 20) -> List[Song]:
+    """
+    搜索本地歌曲目录（歌曲名、艺术家、专辑，支持中文和拼音）
+
+    Returns:
+        List[Song]: 按相关度排列的歌曲
+    """
+    sync_index()
+    song_ids = _index.search(query, limit)
+    if not song_ids:
+        return []
+    songs = {song.id: song for song in Song.query.filter(Song.id.in_(song_ids))}
+    return [songs[song_id] for song_id in song_ids if song_id in songs]
+
+
+def init_app(app):
+    """注册本地搜索命令"""
+
+    @app.cli.command('catalog-search')
+    @click.argument('query')
+    @click.option('--limit', '-n', default=20, show_default=True)
+    def catalog_search(query, limit):
+        """在本地歌曲目录中搜索（用于检查索引）"""
+        for song in search_catalog(query, limit):
+            click.echo(f"{song.id}\t{song.name}\t{', '.join(song.artist_names)}\t{song.album.name if song.album else ''}")
@@ -0,0 +1,244 @@
+# app/catalog_suggest.py
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import click
+from flask import current_app
+from sqlalchemy import func, select
+
+from app import db
+from app.catalog_search import current_change_seq, published_changes
+from app.models import Album, Artist, Song, song_artists
+from app.utils.catalog import get_catalog_version
+from app.utils.search_index import warn_if_pinyin_missing
+from app.utils.suggest_index import SuggestIndex, read_snapshot, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+# 歌曲热度 = 收藏数 * LIKE_WEIGHT + 下载次数；艺术家和专辑的热度为其歌曲热度之和
+LIKE_WEIGHT = 3
+
+_sync_lock = threading.Lock()
+# 当前索引、对应的目录版本、已索引的最大歌曲ID、已处理的歌曲变更序号（见 catalog_search）、上次完整构建的时间
+_state = {'index': None, 'version': None, 'max_id': 0, 'seq': 0, 'built_at': None}
+
+
+def _song_score():
+    return func.coalesce(Song.likes_count, 0) * LIKE_WEIGHT + func.coalesce(Song.download_count, 0)
+
+
+def _song_rows():
+    return select(Song.id, Song.name, Song.album_id, _song_score())
+
+
+def _entries_for_rows(rows) -> Dict[str, dict]:
+    """(歌曲ID, 歌曲名, 专辑ID, 热度) 加上艺术家和专辑（各一次 IN 查询）生成补全条目"""
+    artists = {}
+    for song_id, artist_id, artist_name in db.session.execute(
+        select(song_artists.c.song_id, Artist.id, Artist.name)
+        .join(Artist, song_artists.c.artist_id == Artist.id)
+        .where(song_artists.c.song_id.in_([row[0] for row in rows]))
+    ):
+        artists.setdefault(song_id, []).append((artist_id, artist_name))
+    albums = {
+        album_id: (name, artist_name)
+        for album_id, name, artist_name in db.session.execute(
+            select(Album.id, Album.name, Artist.name)
+            .outerjoin(Artist, Album.artist_id == Artist.id)
+            .where(Album.id.in_({row[2] for row in rows if row[2]}))
+        )
+    }
+
+    entries = {}
+    for song_id, name, album_id, score in rows:
+        song_artist_list = artists.get(song_id, [])
+        entries[f's:{song_id}'] = {
+            'type': 'song', 'id': song_id, 'text': name, 'score': score,
+            'subtitle': ', '.join(artist_name for _, artist_name in song_artist_list)
+        }
+        for artist_id, artist_name in song_artist_list:
+            entry = entries.setdefault(f'a:{artist_id}', {
+                'type': 'artist', 'id': artist_id, 'text': artist_name, 'subtitle': '', 'score': 0
+            })
+            entry['score'] += score
+        if album_id in albums:
+            album_name, album_artist = albums[album_id]
+            entry = entries.setdefault(f'l:{album_id}', {
+                'type': 'album', 'id': album_id, 'text': album_name, 'subtitle': album_artist or '', 'score': 0
+            })
+            entry['score'] += score
+    return entries
+
+
+def _load_entries(min_id: int = 0, chunk_size: int = 1000) -> Tuple[Dict[str, dict], int]:
+    """
+    读取 ID 大于 min_id 的歌曲及其艺术家、专辑，生成补全条目
+
+    Returns:
+        Tuple[Dict, int]: (引用 -> 条目, 读取到的最大歌曲ID)
+    """
+    entries = {}
+    last_id = min_id
+    while True:
+        rows = db.session.execute(_song_rows().where(Song.id > last_id).order_by(Song.id).limit(chunk_size)).all()
+        if not rows:
+            return entries, last_id
+        for ref, entry in _entries_for_rows(rows).items():
+            existing = entries.get(ref)
+            if existing is not None and entry['type'] != 'song':
+                existing['score'] += entry['score']
+            else:
+                entries[ref] = entry
+        last_id = rows[-1][0]
+
+
+def _total_scores(entries: Dict[str, dict]) -> None:
+    """
+    艺术家和专辑条目的热度按其全部歌曲重新汇总
+
+    增量同步时使用：条目只包含部分歌曲，同一首歌被重复处理也不会重复累加。
+    """
+    artist_ids = [entry['id'] for entry in entries.values() if entry['type'] == 'artist']
+    if artist_ids:
+        for artist_id, score in db.session.execute(
+            select(song_artists.c.artist_id, func.sum(_song_score()))
+            .join(Song, Song.id == song_artists.c.song_id)
+            .where(song_artists.c.artist_id.in_(artist_ids))
+            .group_by(song_artists.c.artist_id)
+        ):
+            entries[f'a:{artist_id}']['score'] = score
+    album_ids = [entry['id'] for entry in entries.values() if entry['type'] == 'album']
+    if album_ids:
+        for album_id, score in db.session.execute(
+            select(Song.album_id, func.sum(_song_score())).where(Song.album_id.in_(album_ids)).group_by(Song.album_id)
+        ):
+            entries[f'l:{album_id}']['score'] = score
+
+
+def _changed_entries(song_ids) -> Tuple[Dict[str, dict], List[str]]:
+    """
+    重新生成指定歌曲及其艺术家、专辑的条目
+
+    Returns:
+        Tuple[Dict, List[str]]: (引用 -> 条目, 已删除歌曲的引用)
+    """
+    rows = db.session.execute(_song_rows().where(Song.id.in_(list(song_ids)))).all()
+    entries = _entries_for_rows(rows) if rows else {}
+    _total_scores(entries)
+    found = {row[0] for row in rows}
+    return entries, [f's:{song_id}' for song_id in song_ids if song_id not in found]
+
+
+def _snapshot_path() -> str:
+    return current_app.config['SUGGEST_SNAPSHOT_PATH']
+
+
+def rebuild_suggestions() -> SuggestIndex:
+    """从数据库完整构建补全索引（同时刷新热度），并写入磁盘快照"""
+    warn_if_pinyin_missing()
+    version = get_catalog_version()
+    # 先读取序号：构建期间发布的变更在下次同步时重新处理
+    seq = current_change_seq()
+    entries, max_id = _load_entries()
+    index = SuggestIndex.build(entries)
+    _state.update(index=index, version=version, max_id=max_id, seq=seq, built_at=time.time())
+    try:
+        write_snapshot(index, _snapshot_path(),
+                       {'version': version, 'max_id': max_id, 'seq': seq, 'built_at': _state['built_at']})
+    except OSError as e:
+        logger.warning(f"写入补全索引快照失败: {e}")
+    logger.info(f'补全索引已构建，共 {len(entries)} 条')
+    return index
+
+
+def _load_from_snapshot() -> bool:
+    """从磁盘快照加载索引，之后只需补上快照之后新增和变更的歌曲"""
+    snapshot = read_snapshot(_snapshot_path())
+    if snapshot is None:
+        return False
+    index, meta = snapshot
+    _state.update(index=index, version=meta.get('version'), max_id=meta.get('max_id', 0),
+                  seq=meta.get('seq', 0), built_at=meta.get('built_at', 0))
+    logger.info(f'从快照加载补全索引，共 {len(index.entries)} 条')
+    return True
+
+
+def _song_entry_count(index: SuggestIndex) -> int:
+    return sum(1 for entry in index.entries.values() if entry['type'] == 'song')
+
+
+def sync_suggestions() -> Optional[SuggestIndex]:
+    """
+    让补全索引跟上歌曲目录
+
+    进程启动后优先加载磁盘快照；写入过的歌曲（改名、重新写入）通过 catalog_search 的变更发布，
+    在这里重新生成歌曲及其艺术家、专辑的条目；目录版本变化时再读取新增的歌曲。
+    歌曲数对不上（有删除）、落后的变更已被裁剪或超过 SUGGEST_REBUILD_INTERVAL 时完整重建以刷新热度。
+    其他线程正在同步时直接使用当前的索引。
+    """
+    version = get_catalog_version()
+    interval = current_app.config.get('SUGGEST_REBUILD_INTERVAL', 3600)
+    index = _state['index']
+    changes = published_changes(_state['seq']) if index is not None else None
+    expired = index is None or time.time() - _state['built_at'] > interval
+    if version == _state['version'] and changes == [] and not expired:
+        return index
+
+    if not _sync_lock.acquire(blocking=index is None):
+        return index
+    try:
+        if _state['index'] is None and not _load_from_snapshot():
+            return rebuild_suggestions()
+        if time.time() - _state['built_at'] > interval:
+            return rebuild_suggestions()
+        changes = published_changes(_state['seq'])
+        if changes is None:
+            return rebuild_suggestions()
+
+        index = _state['index']
+        if changes:
+            index.add(*_changed_entries({song_id for song_id, _ in changes}))
+            _state['seq'] = max(_state['seq'], max(seq for _, seq in changes))
+        if version == _state['version']:
+            return index
+
+        entries, max_id = _load_entries(_state['max_id'])
+        if entries:
+            _total_scores(entries)
+            index.add(entries)
+            _state['max_id'] = max_id
+        if db.session.execute(select(func.count(Song.id))).scalar() != _song_entry_count(index):
+            return rebuild_suggestions()
+        _state['version'] = version
+        return index
+    finally:
+        _sync_lock.release()
+
+
+def suggest(query: str, limit: int = 8) -> List[dict]:
+    """
+    输入补全：以 query 开头的歌曲名、艺术家、专辑（支持拼音和首字母），按热度排序
+
+    Returns:
+        List[dict]: {'type': song/artist/album, 'id', 'text', 'subtitle', 'score'}
+    """
+    index = sync_suggestions()
+    if index is None:
+        return []
+    return [
+        {key: entry[key] for key in ('type', 'id', 'text', 'subtitle', 'score')}
+        for entry in index.suggest(query, limit)
+    ]
+
+
+def init_app(app):
+    """注册补全索引命令"""
+
+    @app.cli.command('suggest-snapshot')
+    def suggest_snapshot():
+        """从数据库构建补全索引并写入磁盘快照，供 web 进程启动时加载"""
+        index = rebuild_suggestions()
+        click.echo(f'补全索引共 {len(index.entries)} 条，快照: {_snapshot_path()}')
@@ -0,0 +1,290 @@
+# app/catalog_upsert.py
+
+from datetime import datetime
+from typing import Any, Dict, List, Sequence
+
+from sqlalchemy import Column, Table, and_, bindparam, delete, insert, literal, select, tuple_, union_all, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app import db
+from app.models import Artist, Album, Song, song_artists
+from app.utils.catalog import mark_catalog_changed
+from app.utils.lyrics import forget_song_timeline
+
+# SQLite / PostgreSQL 的 ON CONFLICT 写法
+_ON_CONFLICT_DIALECTS = {'sqlite': sqlite, 'postgresql': postgresql}
+
+# 一次查询中 UNION ALL 的键数量（SQLite 的 SQLITE_MAX_COMPOUND_SELECT 默认为 500）
+_MATCH_CHUNK_SIZE = 200
+
+
+def match_keys(columns: Sequence[Column], keys: Sequence[tuple], extra: Sequence[Column] = ()) -> List[tuple]:
+    """
+    查找与 keys 匹配的行，返回 (输入的键..., extra 列...) 列表，按表中的主键排序
+
+    输入的键作为派生表与表连接，比较由数据库完成，与唯一键使用同样的排序规则
+    （如 MySQL 默认不区分大小写和重音、忽略尾部空格），返回的是调用方传入的原始值，
+    不需要在 Python 中模拟排序规则。
+    """
+    table = columns[0].table
+    matched = []
+    keys = list(dict.fromkeys(keys))
+    for start in range(0, len(keys), _MATCH_CHUNK_SIZE):
+        inputs = union_all(*(
+            select(*(literal(value, column.type).label(f'k{i}') for i, (value, column) in enumerate(zip(key, columns))))
+            for key in keys[start:start + _MATCH_CHUNK_SIZE]
+        )).subquery()
+        stmt = (
+            select(*inputs.c, *extra)
+            .join_from(inputs, table, and_(*(column == inputs.c[f'k{i}'] for i, column in enumerate(columns))))
+            .order_by(*table.primary_key.columns)
+        )
+        matched.extend(tuple(row) for row in db.session.execute(stmt))
+    return matched
+
+
+def _lookup_ids(id_column: Column, columns: Sequence[Column], keys: Sequence[tuple]) -> Dict[tuple, int]:
+    """输入的键 -> 匹配的行ID（多行匹配时取ID最小的）"""
+    ids = {}
+    for row in match_keys(columns, keys, [id_column]):
+        ids.setdefault(row[:-1], row[-1])
+    return ids
+
+
+def upsert(table: Table, rows: List[Dict[str, Any]], conflict_columns: Sequence[str],
+           update_columns: Sequence[str] = ()) -> None:
+    """
+    批量插入，唯一键冲突时用新值更新 update_columns（为空时保留已有的行）
+
+    MySQL 使用 INSERT ... ON DUPLICATE KEY UPDATE，SQLite/PostgreSQL 使用 ON CONFLICT；
+    以 executemany 方式执行，由驱动合并为多行 INSERT。
+    """
+    if not rows:
+        return
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('mysql', 'mariadb'):
+        stmt = mysql.insert(table)
+        if update_columns:
+            values = {column: stmt.inserted[column] for column in update_columns}
+        else:
+            # 不更新任何值，相当于保留已有的行
+            values = {conflict_columns[0]: table.c[conflict_columns[0]]}
+        stmt = stmt.on_duplicate_key_update(values)
+    elif dialect in _ON_CONFLICT_DIALECTS:
+        stmt = _ON_CONFLICT_DIALECTS[dialect].insert(table)
+        if update_columns:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(conflict_columns),
+                set_={column: stmt.excluded[column] for column in update_columns}
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=list(conflict_columns))
+    else:
+        _select_then_insert(table, rows, conflict_columns, update_columns)
+        return
+
+    db.session.execute(stmt, rows)
+
+
+def _select_then_insert(table: Table, rows: List[Dict[str, Any]], conflict_columns: Sequence[str],
+                        update_columns: Sequence[str]) -> None:
+    """
+    没有原生 upsert 的数据库：先查出已存在的唯一键，再批量插入新行、批量更新已有的行
+
+    查询和写入之间没有加锁，并发写入相同的键时仍可能违反唯一键。
+    """
+    columns = [table.c[column] for column in conflict_columns]
+    rows = list({tuple(row[column] for column in conflict_columns): row for row in rows}.items())
+    existing = {row for row in match_keys(columns, [key for key, _ in rows])}
+
+    new_rows = [row for key, row in rows if key not in existing]
+    if new_rows:
+        db.session.execute(insert(table), new_rows)
+
+    updates = [
+        dict({f'key_{column}': row[column] for column in conflict_columns},
+             **{f'new_{column}': row[column] for column in update_columns})
+        for key, row in rows if key in existing
+    ]
+    if update_columns and updates:
+        stmt = update(table).where(and_(*(
+            table.c[column] == bindparam(f'key_{column}') for column in conflict_columns
+        ))).values({column: bindparam(f'new_{column}') for column in update_columns})
+        db.session.execute(stmt, updates)
+
+
+def upsert_artists(infos: Sequence[Dict[str, Any]], now: datetime) -> Dict[str, int]:
+    """批量写入艺术家，返回 名称（与 infos 中相同）-> 艺术家ID"""
+    rows = {}
+    for info in infos:
+        for index, name in enumerate(info['artist_names']):
+            rows.setdefault(name, {
+                'name': name,
+                'image_url': info['image_url'] if index == 0 else None,
+                'created_at': now,
+                'updated_at': now
+            })
+    upsert(Artist.__table__, list(rows.values()), ['name'])
+
+    ids = _lookup_ids(Artist.id, [Artist.name], [(name,) for name in rows])
+    return {key[0]: artist_id for key, artist_id in ids.items()}
+
+
+def upsert_albums(infos: Sequence[Dict[str, Any]], artist_ids: Dict[str, int], now: datetime) -> Dict[tuple, int]:
+    """按 (专辑名, 第一位艺术家) 批量写入专辑，返回 (专辑名, 艺术家ID) -> 专辑ID"""
+    rows = {}
+    for info in infos:
+        artist_id = artist_ids[info['artist_names'][0]]
+        rows.setdefault((info['album_name'], artist_id), {
+            'name': info['album_name'],
+            'artist_id': artist_id,
+            'cover_image_path': info['image_url'],
+            'created_at': now,
+            'updated_at': now
+        })
+    upsert(Album.__table__, list(rows.values()), ['name', 'artist_id'])
+
+    return _lookup_ids(Album.id, [Album.name, Album.artist_id], list(rows))
+
+
+def _existing_songs(keyed: Dict[tuple, Dict[str, Any]]) -> Dict[tuple, int]:
+    """
+    查找已有歌曲：有 EMixSongID 的按 EMixSongID，其余（以及旧数据）按 (歌曲名, 专辑)
+
+    Returns:
+        Dict: 歌曲的去重键 -> 歌曲ID
+    """
+    emixsong_ids = [row['emixsong_id'] for row in keyed.values() if row['emixsong_id']]
+    by_emixsong_id = {
+        key[0]: song_id for key, song_id in _lookup_ids(Song.id, [Song.emixsong_id], [(i,) for i in emixsong_ids]).items()
+    } if emixsong_ids else {}
+
+    name_keys = [(row['name'], row['album_id']) for row in keyed.values()
+                 if row['emixsong_id'] not in by_emixsong_id]
+    by_name = _lookup_ids(Song.id, [Song.name, Song.album_id], name_keys) if name_keys else {}
+
+    existing = {}
+    for key, row in keyed.items():
+        song_id = by_emixsong_id.get(row['emixsong_id']) or by_name.get((row['name'], row['album_id']))
+        if song_id:
+            existing[key] = song_id
+    return existing
+
+
+def upsert_songs(infos: Sequence[Dict[str, Any]], album_ids: Dict[tuple, int],
+                 artist_ids: Dict[str, int], now: datetime) -> List[int]:
+    """批量写入歌曲，返回与 infos 一一对应的歌曲ID"""
+    keys = []
+    keyed = {}
+    for info in infos:
+        album_id = album_ids[(info['album_name'], artist_ids[info['artist_names'][0]])]
+        emixsong_id = info.get('emixsong_id')
+        key = ('id', emixsong_id) if emixsong_id else ('name', info['name'], album_id)
+        keys.append(key)
+        keyed[key] = {
+            'name': info['name'],
+            'album_id': album_id,
+            'duration': info['duration'],
+            'image_url': info['image_url'],
+            'lyrics': info['lyrics'],
+            'lyrics_timeline': info['lyrics_timeline'],
+            'emixsong_id': emixsong_id,
+            'updated_at': now
+        }
+
+    existing = _existing_songs(keyed)
+
+    # 已有歌曲：按主键批量更新，已有的 EMixSongID 不被空值覆盖
+    updates = []
+    for key, song_id in existing.items():
+        row = {name: value for name, value in keyed[key].items() if name not in ('name', 'album_id')}
+        if not row['emixsong_id']:
+            del row['emixsong_id']
+        updates.append(dict(row, id=song_id))
+    # ORM 按主键批量更新要求每组的字段相同
+    groups = {}
+    for row in updates:
+        groups.setdefault(frozenset(row), []).append(row)
+    for rows in groups.values():
+        db.session.execute(update(Song), rows)
+    # 与 Song.set_lyrics 相同，歌词被覆盖后清除本进程缓存的时间轴
+    for row in updates:
+        forget_song_timeline(row['id'])
+
+    # 新歌曲：有 EMixSongID 的并发写入时按唯一键合并，其余直接插入
+    new_rows = [dict(row, created_at=now, download_count=0, file_size=0, likes_count=0)
+                for key, row in keyed.items() if key not in existing]
+    upsert(
+        Song.__table__,
+        [row for row in new_rows if row['emixsong_id']],
+        ['emixsong_id'],
+        ['duration', 'image_url', 'lyrics', 'lyrics_timeline', 'updated_at']
+    )
+    plain_rows = [row for row in new_rows if not row['emixsong_id']]
+    if plain_rows:
+        db.session.execute(insert(Song.__table__), plain_rows)
+
+    if new_rows:
+        existing.update(_existing_songs({key: row for key, row in keyed.items() if key not in existing}))
+    return [existing[key] for key in keys]
+
+
+def _expire_songs(song_ids: set) -> None:
+    """批量 SQL 不会刷新会话中已加载的对象，让它们下次访问时重新加载"""
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, Song) and obj.id in song_ids:
+            db.session.expire(obj)
+
+
+def replace_song_artists(song_artist_ids: Dict[int, List[int]], now: datetime) -> None:
+    """批量更新 song_artists 关联：删除多余的关联，插入缺少的关联"""
+    if not song_artist_ids:
+        return
+
+    wanted = {(song_id, artist_id) for song_id, artist_ids in song_artist_ids.items() for artist_id in artist_ids}
+    current = set(db.session.execute(
+        select(song_artists.c.song_id, song_artists.c.artist_id)
+        .where(song_artists.c.song_id.in_(list(song_artist_ids)))
+    ).all())
+
+    stale = current - wanted
+    if stale:
+        db.session.execute(
+            delete(song_artists).where(tuple_(song_artists.c.song_id, song_artists.c.artist_id).in_(list(stale)))
+        )
+    missing = wanted - current
+    if missing:
+        db.session.execute(
+            insert(song_artists),
+            [{'song_id': song_id, 'artist_id': artist_id, 'created_at': now} for song_id, artist_id in missing]
+        )
+
+
+def upsert_song_infos(infos: Sequence[Dict[str, Any]]) -> List[int]:
+    """
+    批量写入歌曲信息（parse_song_info 的结果，可附带 'emixsong_id'）
+
+    艺术家、专辑、歌曲各用一次批量写入和一次查询解析ID，
+    不逐行 SELECT，也不经过 ORM 对象；不提交事务，由调用方提交。
+
+    Returns:
+        List[int]: 与 infos 一一对应的歌曲ID
+    """
+    if not infos:
+        return []
+
+    now = datetime.utcnow()
+    artist_ids = upsert_artists(infos, now)
+    album_ids = upsert_albums(infos, artist_ids, now)
+    song_ids = upsert_songs(infos, album_ids, artist_ids, now)
+
+    song_artist_ids = {}
+    for info, song_id in zip(infos, song_ids):
+        song_artist_ids[song_id] = list(dict.fromkeys(artist_ids[name] for name in info['artist_names']))
+    replace_song_artists(song_artist_ids, now)
+    _expire_songs(set(song_ids))
+
+    # 批量 SQL 不经过 ORM flush，需要手动标记目录变更
+    mark_catalog_changed(db.session)
+    return song_ids
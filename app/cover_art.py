@@ -0,0 +1,205 @@
+# app/cover_art.py
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import click
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from app.models import Song
+from app.utils.http_client import upstream
+from app.utils.singleflight import SingleFlight
+from app.utils.song_storage import STATIC_DIR
+from app.utils.thumbnails import make_thumbnails, thumbnails_available
+
+logger = logging.getLogger(__name__)
+
+# 封面原图和缩略图按 URL 的哈希存储，相同 URL 只下载一次
+COVERS_DIR = STATIC_DIR / 'music_images' / 'covers'
+
+COVER_FETCH_WORKERS = 4
+_fetch_executor = ThreadPoolExecutor(max_workers=COVER_FETCH_WORKERS, thread_name_prefix='cover-fetch')
+_single_flight = SingleFlight()
+
+# 生成缩略图是 CPU 密集型操作，在进程池中执行，首次使用时创建；
+# daemon 进程（如下载 worker）不能创建子进程，在当前线程中生成
+_thumbnail_pool = None
+_pool_lock = threading.Lock()
+_pillow_warned = False
+
+
+def cover_path(url: str) -> Path:
+    """封面原图的存储路径"""
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return COVERS_DIR / digest[:2] / f'{digest}.jpg'
+
+
+def fetch_cover(url: str) -> Optional[Path]:
+    """下载封面原图，已存在时直接返回；并发请求同一 URL 时只下载一次"""
+    path = cover_path(url)
+    if path.exists():
+        return path
+
+    def load():
+        if path.exists():
+            return path
+        response = upstream.get(url)
+        response.raise_for_status()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        temp.write_bytes(response.content)
+        os.replace(temp, path)
+        return path
+
+    try:
+        return _single_flight.do(url, load)
+    except Exception as e:
+        logger.error(f'下载封面失败: {url}, 错误: {e}')
+        return None
+
+
+def _thumbnail_executor(workers: int) -> Optional[ProcessPoolExecutor]:
+    """缩略图进程池，当前进程是 daemon 进程时返回 None"""
+    global _thumbnail_pool
+    if multiprocessing.current_process().daemon:
+        return None
+    with _pool_lock:
+        if _thumbnail_pool is None:
+            context = multiprocessing.get_context('spawn')
+            _thumbnail_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return _thumbnail_pool
+
+
+def _relative(path) -> str:
+    return Path(path).resolve().relative_to(STATIC_DIR.resolve()).as_posix()
+
+
+def process_cover(url: str) -> Optional[Dict]:
+    """
+    下载封面并生成缩略图
+
+    Returns:
+        Optional[Dict]: {'original': 原图路径, 'thumbnails': {尺寸: {格式: 路径}}}，
+        路径相对于 static 目录；下载失败返回 None，生成缩略图失败时 thumbnails 为 None
+    """
+    global _pillow_warned
+    path = fetch_cover(url)
+    if path is None:
+        return None
+
+    if not thumbnails_available():
+        # 缩略图保持为空，安装 Pillow 后 covers-backfill 会补全
+        if not _pillow_warned:
+            _pillow_warned = True
+            logger.warning('未安装 Pillow，封面只保存原图，不生成缩略图')
+        return {'original': _relative(path), 'thumbnails': None}
+
+    config = current_app.config
+    args = (
+        str(path.resolve()),
+        config.get('COVER_THUMBNAIL_SIZES', (96, 300)),
+        config.get('COVER_THUMBNAIL_FORMATS', ('webp', 'jpeg')),
+        config.get('COVER_THUMBNAIL_QUALITY', 80)
+    )
+    try:
+        executor = _thumbnail_executor(config.get('COVER_THUMBNAIL_PROCESSES', 2))
+        thumbnails = executor.submit(make_thumbnails, *args).result() if executor else make_thumbnails(*args)
+        if thumbnails is not None:
+            thumbnails = {
+                size: {fmt: _relative(thumbnail) for fmt, thumbnail in formats.items()}
+                for size, formats in thumbnails.items()
+            }
+    except Exception as e:
+        logger.error(f'生成缩略图失败: {path}, 错误: {e}')
+        thumbnails = None
+
+    return {'original': _relative(path), 'thumbnails': thumbnails}
+
+
+def apply_cover(song_ids: Iterable[int], cover: Dict) -> None:
+    """
+    把封面路径写入歌曲，以及还没有封面的专辑；不提交事务
+
+    没有缩略图时 image_thumbnails 保持为空，之后的 covers-backfill 会重试。
+    """
+    for song in Song.query.filter(Song.id.in_(list(song_ids))):
+        song.local_image_path = cover['original']
+        if cover['thumbnails'] is None:
+            continue
+        song.image_thumbnails = cover['thumbnails']
+        album = song.album
+        if album and not album.cover_thumbnails:
+            album.local_cover_path = cover['original']
+            album.cover_thumbnails = cover['thumbnails']
+
+
+def _run_cover_job(app, url: str, song_ids: List[int]) -> None:
+    with app.app_context():
+        cover = process_cover(url)
+        if cover is None:
+            return
+        try:
+            apply_cover(song_ids, cover)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f'保存封面路径失败: {url}, 错误: {e}')
+
+
+def schedule_covers(song_ids: Iterable[int]) -> List[Future]:
+    """
+    在后台获取歌曲封面并生成缩略图
+
+    只处理有封面 URL 且还没有缩略图的歌曲，相同 URL 的歌曲合并为一个任务。
+
+    Returns:
+        List[Future]: 后台任务，命令行工具退出前可以等待它们完成
+    """
+    song_ids = list(song_ids)
+    if not song_ids:
+        return []
+
+    rows = db.session.execute(
+        select(Song.id, Song.image_url)
+        .where(Song.id.in_(song_ids), Song.image_url.isnot(None), Song.image_thumbnails.is_(None))
+    )
+    by_url = {}
+    for song_id, url in rows:
+        if url:
+            by_url.setdefault(url, []).append(song_id)
+
+    app = current_app._get_current_object()
+    return [_fetch_executor.submit(_run_cover_job, app, url, ids) for url, ids in by_url.items()]
+
+
+def init_app(app):
+    """注册封面补全命令"""
+
+    @app.cli.command('covers-backfill')
+    @click.option('--batch-size', '-b', default=200, show_default=True, help='每批处理的歌曲数')
+    def covers_backfill(batch_size):
+        """为还没有缩略图的歌曲获取封面并生成缩略图"""
+        last_id = 0
+        total = 0
+        while True:
+            song_ids = db.session.execute(
+                select(Song.id)
+                .where(Song.id > last_id, Song.image_url.isnot(None), Song.image_thumbnails.is_(None))
+                .order_by(Song.id)
+                .limit(batch_size)
+            ).scalars().all()
+            if not song_ids:
+                break
+            wait(schedule_covers(song_ids))
+            last_id = song_ids[-1]
+            total += len(song_ids)
+            click.echo(f'已处理 {total} 首歌曲')
+        click.echo('封面补全完成')
@@ -0,0 +1,217 @@
+# app/download_jobs.py
+
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import click
+import redis
+from flask import current_app
+
+from app import db
+from app.download_stats import record_download
+from app.models import Download
+from app.music_downloader import run_download_pipeline
+from app.utils.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+# 待处理任务队列
+QUEUE_KEY = 'download_jobs'
+# 每个 worker 正在处理的任务列表和心跳；心跳过期的 worker 视为已退出，其任务重新入队
+PROCESSING_KEY = 'download_jobs:processing:{worker_id}'
+HEARTBEAT_KEY = 'download_jobs:worker:{worker_id}'
+WORKERS_KEY = 'download_jobs:workers'
+
+HEARTBEAT_INTERVAL = 10
+HEARTBEAT_TTL = 30
+# 队列读取出错后的重试间隔（秒），逐次翻倍
+RETRY_BACKOFF = 1
+RETRY_BACKOFF_MAX = 60
+
+# Redis 不可用时在 web 进程内执行任务
+_local_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='download-job')
+
+
+def enqueue_download(song_name: str, user_id: Optional[int] = None) -> Download:
+    """
+    创建下载任务并放入队列
+
+    任务记录保存在 downloads 表中，状态为 pending，任务ID即 Download.id。
+    任务由 `flask download-worker` 启动的 worker 执行，没有 worker 运行时任务一直保持 pending；
+    只有 Redis 不可用时才在本进程中执行。
+    """
+    job = Download(
+        song_query=song_name,
+        user_id=user_id,
+        status=Download.STATUS_PENDING
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    client = RedisClient().client
+    queued = False
+    if client is not None:
+        try:
+            client.lpush(QUEUE_KEY, job.id)
+            queued = True
+        except redis.RedisError as e:
+            logger.warning(f"下载任务入队失败: {e}")
+
+    if not queued:
+        logger.warning(f"下载队列不可用，在本进程中执行任务 {job.id}")
+        app = current_app._get_current_object()
+        _local_executor.submit(_run_in_app_context, app, job.id)
+
+    return job
+
+
+def _run_in_app_context(app, job_id: int) -> None:
+    with app.app_context():
+        run_download_job(job_id)
+
+
+def run_download_job(job_id: int) -> None:
+    """执行一个下载任务并更新任务状态"""
+    job = db.session.get(Download, job_id)
+    if job is None or job.is_finished:
+        return
+
+    job.status = Download.STATUS_RUNNING
+    db.session.commit()
+
+    song_id, file_path = None, None
+    try:
+        success, message, song = run_download_pipeline(job.song_query, download=job)
+        if song is not None:
+            song_id, file_path = song.id, song.file_path
+    except Exception as e:
+        logger.exception(f"下载任务 {job_id} 执行失败: {e}")
+        success, message = False, f"发生错误: {str(e)}"
+
+    db.session.rollback()  # 下载流程出错时会话可能处于失败状态
+    job = db.session.get(Download, job_id)
+    job.status = Download.STATUS_COMPLETED if success else Download.STATUS_FAILED
+    job.message = message[:255]
+    job.song_id = song_id
+    job.source_url = file_path
+    db.session.commit()
+
+    # 任务记录本身就是下载历史，这里只增加下载次数
+    if success and song_id is not None:
+        record_download(song_id)
+
+
+def _heartbeat(client, worker_id: str) -> None:
+    client.set(HEARTBEAT_KEY.format(worker_id=worker_id), 1, ex=HEARTBEAT_TTL)
+    client.sadd(WORKERS_KEY, worker_id)
+
+
+def _heartbeat_loop(worker_id: str, stop: threading.Event) -> None:
+    """定期刷新心跳（执行长任务时也不中断），顺便回收已退出 worker 的任务"""
+    client = RedisClient().get_client()
+    while not stop.wait(HEARTBEAT_INTERVAL):
+        try:
+            _heartbeat(client, worker_id)
+            requeued = requeue_stale_jobs()
+            if requeued:
+                logger.info(f'重新入队 {requeued} 个已退出 worker 的任务')
+        except redis.RedisError as e:
+            logger.warning(f"下载 worker 心跳失败: {e}")
+
+
+def worker_loop(poll_timeout: int = 5) -> None:
+    """
+    从 Redis 队列中取任务并执行，直到进程被终止
+
+    Redis 出错时按 RETRY_BACKOFF 逐次翻倍等待后重试，不退出。
+    """
+    client = RedisClient().get_client()
+    worker_id = uuid.uuid4().hex
+    processing_key = PROCESSING_KEY.format(worker_id=worker_id)
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat_loop, args=(worker_id, stop), daemon=True,
+                     name='download-worker-heartbeat').start()
+    logger.info(f'下载 worker {worker_id} 已启动')
+
+    backoff = RETRY_BACKOFF
+    try:
+        while True:
+            try:
+                _heartbeat(client, worker_id)
+                job_id = client.brpoplpush(QUEUE_KEY, processing_key, timeout=poll_timeout)
+                backoff = RETRY_BACKOFF
+            except redis.RedisError as e:
+                logger.warning(f"读取下载队列失败，{backoff} 秒后重试: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, RETRY_BACKOFF_MAX)
+                continue
+            if job_id is None:
+                continue
+
+            try:
+                run_download_job(int(job_id))
+            except Exception as e:
+                logger.exception(f"下载任务 {job_id} 处理异常: {e}")
+                db.session.rollback()
+            finally:
+                db.session.remove()
+            try:
+                client.lrem(processing_key, 1, job_id)
+            except redis.RedisError as e:
+                # 留在处理列表中的已完成任务重新入队后会被 run_download_job 跳过
+                logger.warning(f"移除已完成的下载任务 {job_id} 失败: {e}")
+    finally:
+        stop.set()
+
+
+def _worker_process_main() -> None:
+    """worker 子进程入口，每个进程创建自己的应用和数据库连接"""
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        worker_loop()
+
+
+def requeue_stale_jobs() -> int:
+    """把心跳已过期（异常退出）的 worker 未完成的任务放回队列，正在运行的 worker 的任务不受影响"""
+    client = RedisClient().get_client()
+    count = 0
+    for worker_id in client.smembers(WORKERS_KEY):
+        if client.exists(HEARTBEAT_KEY.format(worker_id=worker_id)):
+            continue
+        # RPOPLPUSH 逐个移动，多个进程同时回收同一个 worker 也不会重复入队
+        processing_key = PROCESSING_KEY.format(worker_id=worker_id)
+        while client.rpoplpush(processing_key, QUEUE_KEY) is not None:
+            count += 1
+        client.srem(WORKERS_KEY, worker_id)
+    return count
+
+
+def init_app(app):
+    """注册下载 worker 命令"""
+
+    @app.cli.command('download-worker')
+    @click.option('--workers', '-w', default=2, show_default=True, help='worker 进程数')
+    def download_worker(workers):
+        """启动后台下载 worker 进程池（/api/download 创建的任务只有在 worker 运行时才会执行）"""
+        requeued = requeue_stale_jobs()
+        if requeued:
+            click.echo(f'重新入队 {requeued} 个未完成的任务')
+
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=_worker_process_main, daemon=True) for _ in range(workers)]
+        for process in processes:
+            process.start()
+        click.echo(f'已启动 {workers} 个下载 worker')
+
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
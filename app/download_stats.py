@@ -0,0 +1,254 @@
+# app/download_stats.py
+
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+import click
+import redis
+from flask import current_app
+from sqlalchemy import bindparam, delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Download, DownloadStatsFlush, Song, User
+from app.rankings import record_download_event
+from app.utils.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+# 歌曲ID -> 未写入数据库的下载次数增量
+COUNTS_KEY = 'downloads:counts'
+# 未写入数据库的下载历史，每项为 JSON
+HISTORY_KEY = 'downloads:history'
+# 写入时先改名为一个批次，写入失败时下次优先处理同一批次
+FLUSHING_COUNTS_KEY = 'downloads:counts:flushing'
+FLUSHING_HISTORY_KEY = 'downloads:history:flushing'
+# 正在写入的批次ID，写入数据库时同一事务记录到 download_stats_flushes，已记录的批次不再写入
+FLUSHING_BATCH_KEY = 'downloads:flushing:batch'
+FLUSH_LOCK_KEY = 'downloads:flush_lock'
+
+# 批次记录保留时间，远长于批次在 Redis 中等待重试的时间
+FLUSH_RECORD_TTL = timedelta(days=7)
+
+# KEYS: 增量, 历史, 写入中的增量, 写入中的历史, 批次ID; ARGV: 新批次ID
+# 没有未完成的批次时把待写入的数据改名为新批次；返回 {批次ID, 增量, 历史}，没有数据时返回空表
+_TAKE_PENDING_SCRIPT = """
+local batch = redis.call('GET', KEYS[5])
+if not batch then
+    if redis.call('EXISTS', KEYS[3]) == 0 and redis.call('EXISTS', KEYS[4]) == 0 then
+        for i = 1, 2 do
+            if redis.call('EXISTS', KEYS[i]) == 1 then
+                redis.call('RENAME', KEYS[i], KEYS[i + 2])
+            end
+        end
+    end
+    if redis.call('EXISTS', KEYS[3]) == 0 and redis.call('EXISTS', KEYS[4]) == 0 then
+        return {}
+    end
+    batch = ARGV[1]
+    redis.call('SET', KEYS[5], batch)
+end
+return {batch, redis.call('HGETALL', KEYS[3]), redis.call('LRANGE', KEYS[4], 0, -1)}
+"""
+
+# KEYS: 写入中的增量, 写入中的历史, 批次ID; ARGV: 已写入的批次ID
+# 只删除这一批次，不影响其他进程之后取出的新批次
+_FINISH_BATCH_SCRIPT = """
+if redis.call('GET', KEYS[3]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1], KEYS[2], KEYS[3])
+end
+return 0
+"""
+
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_flusher_started = False
+_flusher_lock = threading.Lock()
+
+
+def _increment_counts(deltas) -> None:
+    """按增量更新下载次数（UPDATE ... SET download_count = download_count + n，不会丢失并发更新）"""
+    songs = Song.__table__
+    db.session.execute(
+        songs.update()
+        .where(songs.c.id == bindparam('song_id'))
+        .values(download_count=func.coalesce(songs.c.download_count, 0) + bindparam('delta')),
+        [{'song_id': song_id, 'delta': delta} for song_id, delta in deltas.items()]
+    )
+
+
+def _insert_history(rows) -> None:
+    """批量插入下载历史，跳过已被删除的歌曲和用户"""
+    song_ids = set(db.session.execute(
+        select(Song.id).where(Song.id.in_({row['song_id'] for row in rows}))
+    ).scalars())
+    user_ids = set(db.session.execute(
+        select(User.id).where(User.id.in_({row['user_id'] for row in rows}))
+    ).scalars())
+    rows = [row for row in rows if row['song_id'] in song_ids and row['user_id'] in user_ids]
+    if rows:
+        db.session.execute(insert(Download.__table__), rows)
+
+
+def _history_row(song_id: int, user_id: int, source_url: Optional[str], timestamp: float) -> dict:
+    download_time = datetime.utcfromtimestamp(timestamp)
+    return {
+        'song_id': song_id,
+        'user_id': user_id,
+        'source_url': source_url,
+        'status': Download.STATUS_COMPLETED,
+        'download_time': download_time,
+        'updated_at': download_time,
+        'resume_count': 0
+    }
+
+
+def _batch_applied(batch_id: str) -> bool:
+    return db.session.get(DownloadStatsFlush, batch_id) is not None
+
+
+def _apply_batch(batch_id: str, deltas, rows) -> bool:
+    """
+    在一个事务中写入一批数据并记录批次ID
+
+    批次ID是主键：进程在提交后、删除 Redis 中的批次前崩溃，或写入超过锁的有效期
+    另一个进程同时写入同一批次时，只有一次能提交，不会重复累加。
+
+    Returns:
+        bool: 是否由本次写入（False 表示批次已经写入过）
+    """
+    if _batch_applied(batch_id):
+        return False
+    try:
+        db.session.execute(insert(DownloadStatsFlush.__table__).values(batch_id=batch_id, created_at=datetime.utcnow()))
+        if deltas:
+            _increment_counts(deltas)
+        if rows:
+            _insert_history(rows)
+        db.session.execute(
+            delete(DownloadStatsFlush).where(DownloadStatsFlush.created_at < datetime.utcnow() - FLUSH_RECORD_TTL)
+        )
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        if _batch_applied(batch_id):
+            return False
+        raise
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def record_download(song_id: int, user_id: Optional[int] = None, source_url: Optional[str] = None) -> None:
+    """
+    记录一次下载：下载次数加一，有用户时写入下载历史
+
+    增量和历史先写入 Redis，由后台线程批量写入数据库（见 flush_download_stats）；
+    Redis 不可用时直接用原子 UPDATE 和 INSERT 写入数据库。同时更新排行榜（见 rankings）。
+    """
+    record_download_event(song_id)
+
+    client = RedisClient().client
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.hincrby(COUNTS_KEY, song_id, 1)
+            if user_id:
+                pipe.rpush(HISTORY_KEY, json.dumps({
+                    'song_id': song_id,
+                    'user_id': user_id,
+                    'source_url': source_url,
+                    'time': time.time()
+                }))
+            pipe.execute()
+            _ensure_flusher(current_app._get_current_object())
+            return
+        except redis.RedisError as e:
+            logger.warning(f"Redis 下载计数失败，直接写入数据库: {e}")
+
+    _increment_counts({song_id: 1})
+    if user_id:
+        _insert_history([_history_row(song_id, user_id, source_url, time.time())])
+    db.session.commit()
+
+
+def flush_download_stats() -> int:
+    """
+    把 Redis 中的下载次数增量和下载历史批量写入数据库
+
+    同一时间只有一个进程写入（Redis 锁）；写入前先把待写入的数据改名为一个批次，
+    写入期间的新数据进入新的键，数据库事务提交后才删除。批次ID与数据在同一事务中记录，
+    重复处理同一批次（提交后崩溃、锁过期后并发写入）时跳过，不会重复计数。
+
+    Returns:
+        int: 写入的下载次数
+    """
+    client = RedisClient().client
+    if client is None:
+        return 0
+
+    token = uuid.uuid4().hex
+    if not client.set(FLUSH_LOCK_KEY, token, nx=True, ex=60):
+        return 0
+
+    try:
+        keys = (COUNTS_KEY, HISTORY_KEY, FLUSHING_COUNTS_KEY, FLUSHING_HISTORY_KEY, FLUSHING_BATCH_KEY)
+        taken = client.eval(_TAKE_PENDING_SCRIPT, len(keys), *keys, token)
+        if not taken:
+            return 0
+        batch_id, counts, history = taken
+        deltas = {int(song_id): int(delta) for song_id, delta in zip(counts[::2], counts[1::2]) if int(delta)}
+        rows = []
+        for item in history:
+            entry = json.loads(item)
+            rows.append(_history_row(entry['song_id'], entry['user_id'], entry['source_url'], entry['time']))
+        applied = (deltas or rows) and _apply_batch(batch_id, deltas, rows)
+
+        client.eval(_FINISH_BATCH_SCRIPT, 3, FLUSHING_COUNTS_KEY, FLUSHING_HISTORY_KEY, FLUSHING_BATCH_KEY, batch_id)
+        return sum(deltas.values()) if applied else 0
+    finally:
+        client.eval(_RELEASE_LOCK_SCRIPT, 1, FLUSH_LOCK_KEY, token)
+
+
+def _flusher_loop(app) -> None:
+    interval = app.config.get('DOWNLOAD_STATS_FLUSH_INTERVAL', 5)
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            try:
+                flush_download_stats()
+            except Exception as e:
+                logger.error(f"下载统计写入数据库失败: {e}")
+            finally:
+                db.session.remove()
+
+
+def _ensure_flusher(app) -> None:
+    """在本进程中启动后台写入线程（只启动一次）"""
+    global _flusher_started
+    if _flusher_started:
+        return
+    with _flusher_lock:
+        if not _flusher_started:
+            threading.Thread(target=_flusher_loop, args=(app,), name='download-stats-flusher', daemon=True).start()
+            _flusher_started = True
+
+
+def init_app(app):
+    """注册下载统计写入命令"""
+
+    @app.cli.command('flush-download-stats')
+    def flush_download_stats_command():
+        """立即把 Redis 中的下载次数和下载历史写入数据库"""
+        click.echo(f'写入 {flush_download_stats()} 次下载')
@@ -0,0 +1,235 @@
+# app/ingest.py
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Iterable, List, Tuple
+
+import click
+import requests
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from app.catalog_search import index_songs
+from app.catalog_upsert import upsert_song_infos
+from app.cover_art import schedule_covers
+from app.models import Song
+from app.music_downloader import (
+    AudioFile, apply_audio_file, fetch_audio_file, fetch_url, get_song_info,
+    parse_song_info, search_audio_ids, SEARCH_ENRICH_TIMEOUT
+)
+from app.utils.song_storage import existing_song_file
+
+logger = logging.getLogger(__name__)
+
+
+class IngestItem:
+    """导入文件中的一行及其处理结果"""
+
+    def __init__(self, entry: str):
+        self.entry = entry
+        self.emixsong_id = None
+        self.file_name = None
+        self.info = None
+        self.song = None
+        self.error = None
+
+
+class IngestStats:
+    """导入进度和吞吐量统计"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.processed = 0
+        self.downloaded = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+
+    def summary(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return (
+            f'[{self.processed}/{self.total}] 下载 {self.downloaded}，已存在 {self.skipped}，失败 {self.failed}；'
+            f'{self.processed / elapsed:.2f} 首/秒，{self.bytes / elapsed / 1024 / 1024:.2f} MB/秒，'
+            f'耗时 {elapsed:.0f} 秒'
+        )
+
+
+def read_entries(lines: Iterable[str]) -> List[str]:
+    """读取导入文件：每行一个歌曲名称或 EMixSongID，忽略空行和 # 开头的注释，去掉重复行"""
+    entries = []
+    seen = set()
+    for line in lines:
+        entry = line.strip()
+        if entry and not entry.startswith('#') and entry not in seen:
+            seen.add(entry)
+            entries.append(entry)
+    return entries
+
+
+def _batches(entries: List[str], size: int) -> List[List[str]]:
+    return [entries[i:i + size] for i in range(0, len(entries), size)]
+
+
+def fetch_item(entry: str, by_id: bool) -> IngestItem:
+    """搜索并获取歌曲信息，只访问上游接口（带缓存），在线程池中执行"""
+    item = IngestItem(entry)
+    try:
+        if by_id:
+            item.emixsong_id = entry
+        else:
+            results = search_audio_ids(entry)
+            if not results or not results[1]:
+                item.error = '未找到该歌曲'
+                return item
+            item.file_name, item.emixsong_id = results[0][0], results[1][0]
+
+        item.info = parse_song_info(get_song_info(item.emixsong_id, SEARCH_ENRICH_TIMEOUT))
+        if not item.info:
+            item.error = '获取歌曲信息失败'
+        elif not item.file_name:
+            item.file_name = f"{'、'.join(item.info['artist_names'])} - {item.info['name']}"
+    except Exception as e:
+        item.error = f'获取歌曲信息失败: {e}'
+    return item
+
+
+def store_batch(items: List[IngestItem], stats: IngestStats) -> List[IngestItem]:
+    """
+    将一批歌曲信息批量写入数据库（见 upsert_song_infos），一个事务提交
+
+    已有音频文件的歌曲计为已存在，不再写入；返回写入的条目。
+    """
+    items = [item for item in items if item.info]
+    file_paths = dict(db.session.execute(
+        select(Song.emixsong_id, Song.file_path).where(Song.emixsong_id.in_({item.emixsong_id for item in items}))
+    ).all())
+
+    pending = []
+    seen = set()
+    for item in items:
+        if item.emixsong_id in seen or existing_song_file(file_paths.get(item.emixsong_id)):
+            stats.skipped += 1
+        else:
+            seen.add(item.emixsong_id)
+            pending.append(item)
+    if not pending:
+        return []
+
+    song_ids = upsert_song_infos([dict(item.info, emixsong_id=item.emixsong_id) for item in pending])
+    db.session.commit()
+    index_songs(song_ids)
+
+    songs = {song.id: song for song in Song.query.filter(Song.id.in_(song_ids))}
+    for item, song_id in zip(pending, song_ids):
+        item.song = songs[song_id]
+    return pending
+
+
+def fetch_audio(emixsong_id: str, file_name: str, chunk_size: int, max_resumes: int) -> AudioFile:
+    """获取下载链接并下载音频文件，不访问数据库，在线程池中执行"""
+    url_mp3 = fetch_url(emixsong_id)
+    if not url_mp3:
+        raise requests.RequestException('获取下载链接失败')
+    return fetch_audio_file(file_name, url_mp3, emixsong_id, chunk_size, max_resumes)
+
+
+def download_batch(items: List[IngestItem], executor: ThreadPoolExecutor, stats: IngestStats) -> None:
+    """并发下载一批歌曲的音频，结果在一个事务中写回数据库"""
+    config = current_app.config
+    futures = [
+        executor.submit(
+            fetch_audio, item.emixsong_id, item.file_name,
+            config.get('DOWNLOAD_CHUNK_SIZE', 256 * 1024), config.get('DOWNLOAD_MAX_RESUMES', 5)
+        )
+        for item in items
+    ]
+    for item, future in zip(items, futures):
+        try:
+            audio = future.result()
+        except Exception as e:
+            item.error = f'下载失败: {e}'
+            continue
+        apply_audio_file(item.song, audio)
+        stats.downloaded += 1
+        stats.bytes += audio.bytes_downloaded
+    db.session.commit()
+
+
+def ingest(entries: List[str], by_id: bool = False, workers: int = 8, download_workers: int = 4,
+           batch_size: int = 100, download_audio: bool = True) -> Tuple[IngestStats, List[IngestItem]]:
+    """
+    批量导入歌曲：搜索 -> 歌曲信息 -> 入库 -> 音频，封面在后台获取
+
+    - 上游请求在有界线程池中并发执行，处理当前批次时下一批的歌曲信息已经在获取
+    - 每批的艺术家、专辑和歌曲用少量 IN 查询解析，整批一次提交
+    - 数据库操作只在调用线程中执行（封面任务除外，见 schedule_covers）
+
+    Returns:
+        Tuple[IngestStats, List[IngestItem]]: (统计, 失败的条目)
+    """
+    stats = IngestStats(len(entries))
+    failed = []
+    cover_jobs = []
+    batches = _batches(entries, batch_size)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest-info') as info_executor, \
+            ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix='ingest-audio') as audio_executor:
+
+        def submit(batch):
+            return [info_executor.submit(fetch_item, entry, by_id) for entry in batch]
+
+        pending = submit(batches[0]) if batches else []
+        for index in range(len(batches)):
+            items = [future.result() for future in pending]
+            pending = submit(batches[index + 1]) if index + 1 < len(batches) else []
+
+            try:
+                stored = store_batch(items, stats)
+                cover_jobs.extend(schedule_covers(item.song.id for item in stored))
+                to_download = [item for item in stored if not existing_song_file(item.song.file_path)]
+                if download_audio and to_download:
+                    download_batch(to_download, audio_executor, stats)
+            except Exception as e:
+                db.session.rollback()
+                logger.exception(f'第 {index + 1} 批导入失败: {e}')
+                for item in items:
+                    item.error = item.error or f'入库失败: {e}'
+
+            batch_failed = [item for item in items if item.error]
+            failed.extend(batch_failed)
+            stats.failed += len(batch_failed)
+            stats.processed += len(items)
+            # 释放本批对象，避免会话随导入规模增长
+            db.session.expunge_all()
+            logger.info(stats.summary())
+
+    wait(cover_jobs)
+    return stats, failed
+
+
+def init_app(app):
+    """注册批量导入命令"""
+
+    @app.cli.command('ingest-songs')
+    @click.argument('source', type=click.File('r', encoding='utf-8'))
+    @click.option('--ids', 'by_id', is_flag=True, help='文件中每行是 EMixSongID 而不是歌曲名称')
+    @click.option('--workers', '-w', default=8, show_default=True, help='获取歌曲信息的并发数')
+    @click.option('--download-workers', '-d', default=4, show_default=True, help='下载音频的并发数')
+    @click.option('--batch-size', '-b', default=100, show_default=True, help='每批入库的歌曲数')
+    @click.option('--no-audio', is_flag=True, help='只导入歌曲信息，不下载音频')
+    @click.option('--failed-output', type=click.File('w', encoding='utf-8'), help='把失败的条目写入文件，便于重试')
+    def ingest_songs(source, by_id, workers, download_workers, batch_size, no_audio, failed_output):
+        """从文件批量导入歌曲"""
+        entries = read_entries(source)
+        click.echo(f'共 {len(entries)} 首歌曲待导入')
+
+        stats, failed = ingest(entries, by_id, workers, download_workers, batch_size, not no_audio)
+
+        for item in failed:
+            click.echo(f'失败: {item.entry} - {item.error}', err=True)
+            if failed_output:
+                failed_output.write(f'{item.entry}\n')
+        click.echo(stats.summary())
@@ -0,0 +1,369 @@
+# app/likes.py
+
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+import click
+import redis
+from flask import current_app
+from sqlalchemy import delete, func, select, tuple_
+
+from app import db
+from app.catalog_upsert import upsert
+from app.models import Song, user_favorites
+from app.rankings import record_like_event
+from app.utils.pagination import invalidate_count
+from app.utils.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+# 用户收藏的歌曲ID集合，以及集合是否已从数据库加载
+LIKED_SET_KEY = 'likes:user:{user_id}'
+LIKED_READY_KEY = 'likes:user:{user_id}:ready'
+# 歌曲ID -> 收藏数；整个哈希定期过期，之后按数据库中的收藏数重新建立
+COUNTS_KEY = 'likes:counts'
+# 待写入数据库的收藏状态 "用户ID:歌曲ID" -> "1|0:时间戳"，写入时先改名为 FLUSHING_KEY
+PENDING_KEY = 'likes:pending'
+FLUSHING_KEY = 'likes:pending:flushing'
+FLUSH_LOCK_KEY = 'likes:flush_lock'
+
+LIKED_SET_TTL = 7 * 24 * 3600
+COUNTS_TTL = 24 * 3600
+
+# KEYS: 收藏集合, 已加载标记; ARGV: ttl, 歌曲ID...
+_LOAD_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return 0
+end
+for i = 2, #ARGV do
+    redis.call('SADD', KEYS[1], ARGV[i])
+end
+redis.call('SET', KEYS[2], '1', 'EX', ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+# KEYS: 收藏集合, 已加载标记, 收藏数, 待写入
+# ARGV: 歌曲ID, 用户ID, 数据库中的收藏数, ttl, 时间戳, 收藏数哈希的 ttl
+# 集合未加载时返回 nil，由调用方加载后重试
+_TOGGLE_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    return nil
+end
+if redis.call('HEXISTS', KEYS[3], ARGV[1]) == 0 then
+    redis.call('HSET', KEYS[3], ARGV[1], ARGV[3])
+end
+if redis.call('TTL', KEYS[3]) < 0 then
+    redis.call('EXPIRE', KEYS[3], ARGV[6])
+end
+local liked = 1
+local delta = 1
+if redis.call('SISMEMBER', KEYS[1], ARGV[1]) == 1 then
+    redis.call('SREM', KEYS[1], ARGV[1])
+    liked = 0
+    delta = -1
+else
+    redis.call('SADD', KEYS[1], ARGV[1])
+end
+local count = redis.call('HINCRBY', KEYS[3], ARGV[1], delta)
+if count < 0 then
+    redis.call('HSET', KEYS[3], ARGV[1], 0)
+    count = 0
+end
+redis.call('HSET', KEYS[4], ARGV[2] .. ':' .. ARGV[1], liked .. ':' .. ARGV[5])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return {liked, count}
+"""
+
+# KEYS: 待写入, 写入中；上次写入失败留下的数据优先处理
+_TAKE_PENDING_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return {}
+    end
+    redis.call('RENAME', KEYS[1], KEYS[2])
+end
+return redis.call('HGETALL', KEYS[2])
+"""
+
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_flusher_started = False
+_flusher_lock = threading.Lock()
+
+# Redis 不可用时本进程直接写入数据库的收藏状态 (用户ID, 歌曲ID) -> 是否收藏，
+# 下次成功连接 Redis 时同步过去（见 _sync_db_changes）
+_db_changes: Dict[Tuple[int, int], bool] = {}
+_db_changes_lock = threading.Lock()
+
+
+def _song_likes_count(song_id: int) -> Optional[int]:
+    """数据库中的收藏数，歌曲不存在时返回 None"""
+    row = db.session.query(Song.likes_count).filter(Song.id == song_id).first()
+    return None if row is None else row.likes_count or 0
+
+
+def _ensure_liked_set(client, user_id: int) -> None:
+    """把用户的收藏从数据库加载到 Redis（只加载一次）"""
+    if client.exists(LIKED_READY_KEY.format(user_id=user_id)):
+        return
+    song_ids = db.session.execute(
+        select(user_favorites.c.song_id).where(user_favorites.c.user_id == user_id)
+    ).scalars().all()
+    client.eval(
+        _LOAD_SCRIPT, 2,
+        LIKED_SET_KEY.format(user_id=user_id), LIKED_READY_KEY.format(user_id=user_id),
+        LIKED_SET_TTL, *song_ids
+    )
+
+
+def _refresh_likes_count(song_ids) -> None:
+    """按收藏关系重新计算歌曲的收藏数（单条 UPDATE，不会丢失并发更新）"""
+    songs = Song.__table__
+    db.session.execute(
+        songs.update()
+        .where(songs.c.id.in_(list(song_ids)))
+        .values(likes_count=select(func.count())
+                .where(user_favorites.c.song_id == songs.c.id)
+                .scalar_subquery())
+    )
+
+
+def _sync_db_changes(client) -> None:
+    """
+    把 Redis 不可用期间直接写入数据库的收藏状态同步到 Redis
+
+    更新用户的收藏集合，删除同一收藏关系在 Redis 中更早的待写入记录（否则会覆盖数据库中较新的状态），
+    删除这些歌曲缓存的收藏数，下次使用时按数据库重新建立。
+    """
+    if not _db_changes:
+        return
+    with _db_changes_lock:
+        changes = dict(_db_changes)
+        _db_changes.clear()
+    try:
+        pipe = client.pipeline()
+        for (user_id, song_id), is_liked in changes.items():
+            liked_set = LIKED_SET_KEY.format(user_id=user_id)
+            if is_liked:
+                pipe.sadd(liked_set, song_id)
+            else:
+                pipe.srem(liked_set, song_id)
+            pipe.hdel(PENDING_KEY, f'{user_id}:{song_id}')
+        pipe.hdel(COUNTS_KEY, *{song_id for _, song_id in changes})
+        pipe.execute()
+    except redis.RedisError:
+        with _db_changes_lock:
+            for key, is_liked in changes.items():
+                _db_changes.setdefault(key, is_liked)
+        raise
+
+
+def _toggle_in_db(user_id: int, song_id: int) -> Tuple[bool, int]:
+    """Redis 不可用时直接修改数据库，并记录下来，Redis 恢复后同步"""
+    key = tuple_(user_favorites.c.user_id, user_favorites.c.song_id)
+    result = db.session.execute(delete(user_favorites).where(key == (user_id, song_id)))
+    is_liked = result.rowcount == 0
+    if is_liked:
+        upsert(user_favorites, [{'user_id': user_id, 'song_id': song_id, 'created_at': datetime.utcnow()}],
+               ['user_id', 'song_id'])
+    _refresh_likes_count([song_id])
+    db.session.commit()
+    with _db_changes_lock:
+        _db_changes[(user_id, song_id)] = is_liked
+    return is_liked, _song_likes_count(song_id)
+
+
+def toggle_like(user_id: int, song_id: int) -> Optional[Tuple[bool, int]]:
+    """
+    切换收藏状态
+
+    收藏关系和收藏数记录在 Redis 中，由后台线程批量写入数据库（见 flush_pending_likes）；
+    Redis 不可用时直接写数据库。
+
+    Returns:
+        Optional[Tuple[bool, int]]: (是否已收藏, 收藏数)，歌曲不存在时返回 None
+    """
+    likes_count = _song_likes_count(song_id)
+    if likes_count is None:
+        return None
+
+    client = RedisClient().client
+    if client is not None:
+        try:
+            keys = (
+                LIKED_SET_KEY.format(user_id=user_id), LIKED_READY_KEY.format(user_id=user_id),
+                COUNTS_KEY, PENDING_KEY
+            )
+            args = (song_id, user_id, likes_count, LIKED_SET_TTL, int(time.time()), COUNTS_TTL)
+            _sync_db_changes(client)
+            result = client.eval(_TOGGLE_SCRIPT, len(keys), *keys, *args)
+            if result is None:
+                _ensure_liked_set(client, user_id)
+                result = client.eval(_TOGGLE_SCRIPT, len(keys), *keys, *args)
+            _ensure_flusher(current_app._get_current_object())
+            is_liked, likes_count = bool(result[0]), int(result[1])
+            record_like_event(song_id, is_liked, likes_count)
+            return is_liked, likes_count
+        except redis.RedisError as e:
+            logger.warning(f"Redis 收藏计数失败，直接写入数据库: {e}")
+
+    return _toggle_in_db(user_id, song_id)
+
+
+def get_like_statuses(user_id: int, song_ids: Iterable[int]) -> Dict[int, Tuple[bool, int]]:
+    """
+    批量获取收藏状态和收藏数
+
+    收藏数一次 IN 查询；收藏状态优先用一次 SMISMEMBER 从 Redis 读取，
+    Redis 不可用时用一次 IN 查询。
+
+    Returns:
+        Dict[int, Tuple[bool, int]]: 歌曲ID -> (是否已收藏, 收藏数)，不存在的歌曲不在结果中
+    """
+    song_ids = list(dict.fromkeys(song_ids))
+    if not song_ids:
+        return {}
+    likes_counts = {
+        song_id: likes_count or 0
+        for song_id, likes_count in db.session.execute(
+            select(Song.id, Song.likes_count).where(Song.id.in_(song_ids))
+        )
+    }
+    song_ids = [song_id for song_id in song_ids if song_id in likes_counts]
+    if not song_ids:
+        return {}
+
+    client = RedisClient().client
+    if client is not None:
+        try:
+            _sync_db_changes(client)
+            _ensure_liked_set(client, user_id)
+            pipe = client.pipeline()
+            pipe.smismember(LIKED_SET_KEY.format(user_id=user_id), song_ids)
+            pipe.hmget(COUNTS_KEY, song_ids)
+            liked_flags, cached_counts = pipe.execute()
+            return {
+                song_id: (bool(is_liked), int(cached_count) if cached_count is not None else likes_counts[song_id])
+                for song_id, is_liked, cached_count in zip(song_ids, liked_flags, cached_counts)
+            }
+        except redis.RedisError as e:
+            logger.warning(f"读取 Redis 收藏状态失败: {e}")
+
+    liked = set(db.session.execute(
+        select(user_favorites.c.song_id)
+        .where(user_favorites.c.user_id == user_id, user_favorites.c.song_id.in_(song_ids))
+    ).scalars())
+    return {song_id: (song_id in liked, likes_counts[song_id]) for song_id in song_ids}
+
+
+def get_like_status(user_id: int, song_id: int) -> Optional[Tuple[bool, int]]:
+    """
+    获取收藏状态和收藏数，优先从 Redis 读取
+
+    Returns:
+        Optional[Tuple[bool, int]]: (是否已收藏, 收藏数)，歌曲不存在时返回 None
+    """
+    return get_like_statuses(user_id, [song_id]).get(song_id)
+
+
+def flush_pending_likes() -> int:
+    """
+    把 Redis 中待写入的收藏变更批量写入数据库
+
+    同一时间只有一个进程写入（Redis 锁）；收藏关系批量插入/删除，
+    收藏数按收藏关系重新计算，重复执行结果相同。
+
+    Returns:
+        int: 写入的收藏变更数
+    """
+    client = RedisClient().client
+    if client is None:
+        return 0
+
+    _sync_db_changes(client)
+    token = uuid.uuid4().hex
+    if not client.set(FLUSH_LOCK_KEY, token, nx=True, ex=60):
+        return 0
+
+    try:
+        items = client.eval(_TAKE_PENDING_SCRIPT, 2, PENDING_KEY, FLUSHING_KEY)
+        if not items:
+            return 0
+
+        liked_rows, unliked_keys = [], []
+        user_ids, song_ids = set(), set()
+        for field, value in zip(items[::2], items[1::2]):
+            user_id, song_id = (int(part) for part in field.split(':'))
+            state, timestamp = value.split(':')
+            user_ids.add(user_id)
+            song_ids.add(song_id)
+            if state == '1':
+                liked_rows.append({
+                    'user_id': user_id,
+                    'song_id': song_id,
+                    'created_at': datetime.utcfromtimestamp(int(timestamp))
+                })
+            else:
+                unliked_keys.append((user_id, song_id))
+
+        try:
+            if unliked_keys:
+                db.session.execute(
+                    delete(user_favorites)
+                    .where(tuple_(user_favorites.c.user_id, user_favorites.c.song_id).in_(unliked_keys))
+                )
+            upsert(user_favorites, liked_rows, ['user_id', 'song_id'])
+            _refresh_likes_count(song_ids)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        client.delete(FLUSHING_KEY)
+        for user_id in user_ids:
+            invalidate_count(f'favorites_total:{user_id}')
+        return len(items) // 2
+    finally:
+        client.eval(_RELEASE_LOCK_SCRIPT, 1, FLUSH_LOCK_KEY, token)
+
+
+def _flusher_loop(app) -> None:
+    interval = app.config.get('LIKES_FLUSH_INTERVAL', 5)
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            try:
+                flush_pending_likes()
+            except Exception as e:
+                logger.error(f"收藏数据写入数据库失败: {e}")
+
+
+def _ensure_flusher(app) -> None:
+    """在本进程中启动后台写入线程（只启动一次）"""
+    global _flusher_started
+    if _flusher_started:
+        return
+    with _flusher_lock:
+        if not _flusher_started:
+            threading.Thread(target=_flusher_loop, args=(app,), name='likes-flusher', daemon=True).start()
+            _flusher_started = True
+
+
+def init_app(app):
+    """注册收藏数据写入命令"""
+
+    @app.cli.command('flush-likes')
+    def flush_likes():
+        """立即把 Redis 中待写入的收藏变更写入数据库"""
+        click.echo(f'写入 {flush_pending_likes()} 条收藏变更')
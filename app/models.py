@@ -1,11 +1,12 @@
-import re
 from app import db
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
-from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, func
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
+from app.utils.lyrics import build_timeline, forget_song_timeline
+from app.utils.pagination import keyset_paginate
 
 Base = declarative_base()
 
@@ -19,7 +20,9 @@ song_artists = db.Table('song_artists',
 user_favorites = db.Table('user_favorites',
     db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
     db.Column('song_id', db.Integer, db.ForeignKey('songs.id'), primary_key=True),
-    db.Column('created_at', db.DateTime, default=datetime.utcnow)
+    db.Column('created_at', db.DateTime, default=datetime.utcnow),
+    # 收藏列表按收藏时间游标分页
+    db.Index('ix_user_favorites_user_created', 'user_id', 'created_at', 'song_id')
 )
 
 class User(UserMixin, db.Model):
@@ -51,28 +54,25 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
-    def like_song(self, song):
-        """添加歌曲到收藏"""
-        if not self.has_liked_song(song):
-            self.favorite_songs.append(song)
-            song.likes_count += 1
-            db.session.commit()
-
-    def unlike_song(self, song):
-        """取消收藏歌曲"""
-        if self.has_liked_song(song):
-            self.favorite_songs.remove(song)
-            song.likes_count = max(0, song.likes_count - 1)  # 确保不会小于0
-            db.session.commit()
-
     def has_liked_song(self, song):
-        """检查是否已收藏某首歌"""
-        return self.favorite_songs.filter_by(id=song.id).first() is not None
-
-    def get_favorite_songs(self, page=1, per_page=20):
-        """获取用户收藏的歌曲（分页）"""
-        return self.favorite_songs.order_by(user_favorites.c.created_at.desc()) \
-            .paginate(page=page, per_page=per_page)
+        """检查是否已收藏某首歌（收藏的增删见 app.likes.toggle_like）"""
+        from app.likes import get_like_status
+
+        status = get_like_status(self.id, song.id)
+        return bool(status and status[0])
+
+    def get_favorite_songs(self, cursor=None, per_page=20):
+        """获取用户收藏的歌曲（按收藏时间游标分页）"""
+        query = self.favorite_songs.add_columns(user_favorites.c.created_at.label('favorited_at'))
+        return keyset_paginate(
+            query,
+            user_favorites.c.created_at,
+            user_favorites.c.song_id,
+            cursor=cursor,
+            per_page=per_page,
+            row_key=lambda row: (row.favorited_at, row[0].id),
+            row_item=lambda row: row[0]
+        )
 
 class VerificationCode(db.Model):
     """验证码模型"""
@@ -83,6 +83,8 @@ class VerificationCode(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     expires_at = db.Column(db.DateTime, nullable=False)
     attempts = db.Column(db.Integer, default=0)
+    # 审计记录（VERIFICATION_CODE_AUDIT）只用于留档，不参与校验
+    audit = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
 
     def is_expired(self) -> bool:
         """检查是否过期"""
@@ -95,7 +97,7 @@ class VerificationCode(db.Model):
 class Artist(db.Model):
     __tablename__ = 'artists'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(255), nullable=False, index=True)
+    name = db.Column(db.String(255), nullable=False, index=True, unique=True)
     image_url = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -113,12 +115,17 @@ class Artist(db.Model):
 
 class Album(db.Model):
     __tablename__ = 'albums'
+    __table_args__ = (
+        # 批量导入时按 (专辑名, 艺术家) 去重
+        db.UniqueConstraint('name', 'artist_id', name='uq_albums_name_artist'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False, index=True)
     artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), nullable=False)
     release_year = db.Column(db.Integer)
     cover_image_path = db.Column(db.String(255))
     local_cover_path = db.Column(db.String(255))  # 新增本地存储路径
+    cover_thumbnails = db.Column(db.JSON)  # 封面缩略图 {尺寸: {格式: 路径}}
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -132,16 +139,27 @@ class Album(db.Model):
 
 class Song(db.Model):
     __tablename__ = 'songs'
+    __table_args__ = (
+        # 歌曲列表按 (created_at, id) 游标分页
+        db.Index('ix_songs_created_at_id', 'created_at', 'id'),
+        # Redis 不可用时排行榜直接按计数排序
+        db.Index('ix_songs_download_count', 'download_count'),
+        db.Index('ix_songs_likes_count', 'likes_count'),
+    )
     id = Column(Integer, primary_key=True)
     name = Column(String(255), nullable=False, index=True)
     album_id = Column(Integer, ForeignKey('albums.id'))
     duration = Column(Integer)
     image_url = Column(String(255))
     local_image_path = Column(String(255))
+    image_thumbnails = Column(JSON)  # 封面缩略图 {尺寸: {格式: 路径}}，路径相对于static目录
     file_path = Column(String(255))
     file_size = Column(Integer)
+    emixsong_id = Column(String(64), index=True, unique=True)  # 上游歌曲ID，用于下载前查重
+    content_hash = Column(String(64), index=True)  # 音频文件 SHA-256
     download_count = Column(Integer, default=0)
-    lyrics = Column(JSON)
+    lyrics = Column(JSON)  # 原始歌词（LRC）
+    lyrics_timeline = Column(JSON)  # 解析后的歌词 {'metadata': {}, 'times': [毫秒], 'lines': [歌词]}
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -154,39 +172,12 @@ class Song(db.Model):
     def __repr__(self):
         return f'<Song {self.name}>'
 
-    def parse_lyrics(self, lyrics_str):
-        """解析歌词字符串，包含元数据和时间戳歌词"""
-        lines = lyrics_str.strip().split('\r\n')
-        metadata = {}
-        lyrics_dict = {}
-
-        for line in lines:
-            # 解析元数据行 (以[开头但不含时间戳的行)
-            if line.startswith('[') and not re.match(r'\[\d{2}:', line):
-                meta_match = re.match(r'\[(\w+):([^]]+)]', line)
-                if meta_match:
-                    key, value = meta_match.groups()
-                    metadata[key] = value.strip()
-                continue
-
-            # 解析带时间戳的歌词行
-            timestamp_matches = re.finditer(r'\[(\d{2}):(\d{2}\.\d{2})\]', line)
-            lyric_text = re.sub(r'\[\d{2}:\d{2}\.\d{2}\]', '', line).strip()
-
-            # 一行可能有多个时间戳
-            for match in timestamp_matches:
-                minutes = int(match.group(1))
-                seconds = float(match.group(2))
-                timestamp = f"{minutes:02d}:{seconds:05.2f}"
-
-                if lyric_text:  # 只存储非空歌词
-                    lyrics_dict[timestamp] = lyric_text
-
-        # 存储完整的歌词数据结构
-        self.lyrics = {
-            'metadata': metadata,
-            'lyrics': lyrics_dict
-        }
+    def set_lyrics(self, lyrics_str):
+        """保存原始歌词，并预先解析出按时间排序的歌词时间轴"""
+        self.lyrics = lyrics_str
+        self.lyrics_timeline = build_timeline(lyrics_str)
+        if self.id is not None:
+            forget_song_timeline(self.id)
 
     @property
     def artist_names(self):
@@ -199,33 +190,29 @@ class Song(db.Model):
         return self.artists[0] if self.artists else None
 
     def increment_download_count(self):
-        """增加下载计数"""
-        self.download_count += 1
+        """增加下载计数（原子 UPDATE，不会丢失并发的增量）"""
+        self.download_count = func.coalesce(Song.download_count, 0) + 1
         db.session.commit()
 
     def get_file_path(self):
         """获取文件的相对路径（用于URL生成）"""
-        if self.file_path:
-            return self.file_path.replace('app/static/', '')
-        return None
+        return self.relative_file_path(self.file_path)
 
-    @property
-    def lyrics_dict(self):
-        """获取格式化的歌词数据，包含元数据和按时间排序的歌词"""
-        if not self.lyrics:
-            return {'metadata': {}, 'lyrics': {}}
-
-        lyrics_data = self.lyrics.get('lyrics', {})
-        return {
-            'metadata': self.lyrics.get('metadata', {}),
-            'lyrics': dict(sorted(lyrics_data.items(), key=lambda x: self.timestamp_to_seconds(x[0])))
-        }
+    def get_thumbnail_path(self, size=96, fmt='webp'):
+        """获取不小于 size 的最小缩略图（相对于static目录），没有缩略图时返回 None"""
+        if not self.image_thumbnails:
+            return None
+        sizes = sorted(self.image_thumbnails, key=int)
+        chosen = next((s for s in sizes if int(s) >= size), sizes[-1])
+        formats = self.image_thumbnails[chosen]
+        return formats.get(fmt) or next(iter(formats.values()), None)
 
     @staticmethod
-    def timestamp_to_seconds(timestamp):
-        """将时间戳字符串转换为秒数"""
-        minutes, seconds = timestamp.split(':')
-        return int(minutes) * 60 + float(seconds)
+    def relative_file_path(file_path):
+        """将存储的文件路径转换为相对于static目录的路径"""
+        if file_path:
+            return file_path.replace('app/static/', '')
+        return None
 
     @property
     def to_dict(self):
@@ -249,15 +236,50 @@ class Song(db.Model):
 
 class Download(db.Model):
     __tablename__ = 'downloads'
+
+    # 下载任务状态
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+
     id = db.Column(db.Integer, primary_key=True)
-    song_id = db.Column(db.Integer, db.ForeignKey('songs.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    download_time = db.Column(db.DateTime, default=datetime.utcnow)
+    song_id = db.Column(db.Integer, db.ForeignKey('songs.id'), nullable=True)  # 任务完成前为空
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # 匿名下载为空
+    download_time = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     source_url = db.Column(db.String(255))
     status = db.Column(db.String(20), default='pending')  # 新增状态字段
+    song_query = db.Column(db.String(255))  # 下载任务请求的歌曲名称
+    message = db.Column(db.String(255))  # 任务结果说明
+    bytes_downloaded = db.Column(db.BigInteger)  # 本次实际传输的字节数
+    transfer_seconds = db.Column(db.Float)  # 传输耗时（秒）
+    resume_count = db.Column(db.Integer, default=0)  # 断点续传次数
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     song = db.relationship('Song', back_populates='downloads')
     user = db.relationship('User', back_populates='downloads')
 
     def __repr__(self):
-        return f'<Download {self.id}>'
\ No newline at end of file
+        return f'<Download {self.id}>'
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_COMPLETED, self.STATUS_FAILED)
+
+    @property
+    def throughput(self):
+        """平均下载速度（字节/秒）"""
+        if not self.bytes_downloaded or not self.transfer_seconds:
+            return None
+        return int(self.bytes_downloaded / self.transfer_seconds)
+
+
+class DownloadStatsFlush(db.Model):
+    """已写入数据库的下载统计批次，与写入在同一事务中提交，保证每批只写入一次"""
+    __tablename__ = 'download_stats_flushes'
+
+    batch_id = db.Column(db.String(32), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<DownloadStatsFlush {self.batch_id}>'
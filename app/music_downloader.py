@@ -7,17 +7,45 @@ import requests
 import re
 import json
 import logging
-from typing import Tuple, Optional, List, Any
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Tuple, Optional, List, Any, Dict, NamedTuple
 from app.models import Artist, Album, Song, Download
 from app import db
 from flask import current_app
 from pathlib import Path
 from sqlalchemy.exc import SQLAlchemyError
+import redis
+from app.catalog_search import index_songs
+from app.catalog_upsert import upsert_song_infos
+from app.cover_art import schedule_covers
+from app.download_stats import record_download
+from app.utils.lru import TTLCache
+from app.utils.lyrics import build_timeline
+from app.utils.redis_client import RedisClient
+from app.utils.singleflight import SingleFlight
+from app.utils.http_client import upstream
+from app.utils.song_storage import HashingWriter, commit_song_file, existing_song_file, partial_path, STATIC_DIR
 
 # 配置 logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 搜索结果补全（查询歌曲详情）的并发数、单次请求超时和整体超时（秒）
+SEARCH_ENRICH_WORKERS = 8
+SEARCH_ENRICH_TIMEOUT = (3.05, 5)
+SEARCH_ENRICH_DEADLINE = 6
+
+_enrich_executor = ThreadPoolExecutor(max_workers=SEARCH_ENRICH_WORKERS, thread_name_prefix='search-enrich')
+
+# 搜索结果和歌曲详情缓存：进程内 LRU 在前，Redis 在后（秒）
+SEARCH_CACHE_TTL = 600
+SONG_INFO_CACHE_TTL = 3600
+LOCAL_CACHE_TTL = 60
+_search_cache = TTLCache(maxsize=1024, ttl=LOCAL_CACHE_TTL)
+_song_info_cache = TTLCache(maxsize=4096, ttl=LOCAL_CACHE_TTL)
+_single_flight = SingleFlight()
+
 
 def calculate_md5(data: str) -> str:
     """计算字符串的MD5值"""
@@ -97,7 +125,7 @@ def fetch_url(audio_id: str) -> Optional[str]:
     }
 
     try:
-        response = requests.get('https://wwwapi.kugou.com/play/songinfo', headers=headers, params=params_dict)
+        response = upstream.get('https://wwwapi.kugou.com/play/songinfo', headers=headers, params=params_dict)
         response.raise_for_status()
         jsurl = response.json()
         return jsurl['data']['play_url']
@@ -146,9 +174,10 @@ def audio_id_list(music_name: str) -> Optional[Tuple[List[str], List[str]]]:
     }
 
     try:
-        response = requests.get('https://complexsearch.kugou.com/v2/search/song',
+        response = upstream.get('https://complexsearch.kugou.com/v2/search/song',
                                 headers=headers,
-                                params=params_dict)
+                                params=params_dict,
+                                timeout=SEARCH_ENRICH_TIMEOUT)
         response.raise_for_status()
         callback_dict = re.findall('callback123\((.*)\)', response.text)[0]
         jsurl = json.loads(callback_dict)
@@ -162,7 +191,79 @@ def audio_id_list(music_name: str) -> Optional[Tuple[List[str], List[str]]]:
         return None
 
 
-def images_download(audio_id: str) -> Optional[requests.Response]:
+def normalize_query(music_name: str) -> str:
+    """规范化搜索词：全角转半角、去掉多余空白、转小写"""
+    return ' '.join(unicodedata.normalize('NFKC', music_name).split()).lower()
+
+
+def _cached_fetch(local_cache: TTLCache, key: str, loader, ttl: int):
+    """
+    两级缓存读取，未命中时通过 single-flight 调用 loader
+
+    同一个 key 的并发请求只会有一次上游调用；loader 返回 None 时不缓存。
+    缓存的值必须可以 JSON 序列化。
+    """
+    value = local_cache.get(key)
+    if value is not None:
+        return value
+
+    def load():
+        client = RedisClient().client
+        if client is not None:
+            try:
+                cached = client.get(key)
+                if cached is not None:
+                    value = json.loads(cached)
+                    local_cache.set(key, value)
+                    return value
+            except redis.RedisError as e:
+                logger.warning(f"读取缓存失败: {e}")
+                client = None
+
+        value = loader()
+        if value is not None:
+            local_cache.set(key, value)
+            if client is not None:
+                try:
+                    client.setex(key, ttl, json.dumps(value, ensure_ascii=False))
+                except redis.RedisError as e:
+                    logger.warning(f"写入缓存失败: {e}")
+        return value
+
+    return _single_flight.do(key, load)
+
+
+def search_audio_ids(music_name: str) -> Optional[Tuple[List[str], List[str]]]:
+    """带缓存的 audio_id_list，相同（规范化后）的搜索词只请求一次上游"""
+    query = normalize_query(music_name)
+    if not query:
+        return None
+
+    def load():
+        results = audio_id_list(query)
+        return list(results) if results else None
+
+    results = _cached_fetch(_search_cache, f'kugou:search:{query}', load, SEARCH_CACHE_TTL)
+    return tuple(results) if results else None
+
+
+def get_song_info(audio_id: str, timeout=None) -> Optional[dict]:
+    """带缓存的歌曲详情（songinfo 接口的 data 字段），按 EMixSongID 缓存"""
+
+    def load():
+        response = images_download(audio_id, timeout)
+        if not response or not response.ok:
+            return None
+        try:
+            return response.json().get('data') or None
+        except ValueError as e:
+            logger.error(f"解析歌曲信息失败: {e}")
+            return None
+
+    return _cached_fetch(_song_info_cache, f'kugou:songinfo:{audio_id}', load, SONG_INFO_CACHE_TTL)
+
+
+def images_download(audio_id: str, timeout=None) -> Optional[requests.Response]:
     """获取歌曲详细信息"""
     timestamp = int(time.time() * 1000)
     headers = {
@@ -183,9 +284,10 @@ def images_download(audio_id: str) -> Optional[requests.Response]:
         "signature": MD5_sign(timestamp, audio_id)
     }
     try:
-        response = requests.get('https://wwwapi.kugou.com/play/songinfo',
+        response = upstream.get('https://wwwapi.kugou.com/play/songinfo',
                                 params=params_dict,
-                                headers=headers)
+                                headers=headers,
+                                timeout=timeout)
         response.raise_for_status()
         return response
     except requests.RequestException as e:
@@ -193,139 +295,111 @@ def images_download(audio_id: str) -> Optional[requests.Response]:
         return None
 
 
-def save_image(url: str, name: str) -> Optional[str]:
+def search_songs(music_name: str, deadline: float = SEARCH_ENRICH_DEADLINE) -> Tuple[List[Dict[str, Any]], bool]:
     """
-    下载并保存图片
+    搜索歌曲并并发获取每首歌的详细信息
+
+    详情请求在线程池中并发执行，每个请求有独立的超时时间，
+    整体等待不超过 deadline 秒；超时或失败的结果被跳过，返回已完成的部分。
 
     Args:
-        url: 图片URL
-        name: 文件名（不包含扩展名）
+        music_name: 要搜索的歌曲名称
+        deadline: 等待详情请求的最长时间（秒）
 
     Returns:
-        Optional[str]: 成功则返回相对于static目录的路径，失败返回None
+        Tuple[List[Dict], bool]: (按搜索顺序排列的歌曲列表, 是否完整)
     """
-    try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-
-        image_dir = Path('app/static/music_images')
-        image_dir.mkdir(parents=True, exist_ok=True)
-
-        # 清理文件名中的非法字符
-        safe_name = "".join(c for c in name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-        image_path = image_dir / f'{safe_name}.jpg'
-        image_path.write_bytes(response.content)
-
-        return str(image_path.relative_to('app/static'))
+    results = search_audio_ids(music_name)
+    if not results:
+        return [], True
+
+    file_names, emixsong_ids = results
+    futures = [
+        _enrich_executor.submit(get_song_info, emixsong_id, SEARCH_ENRICH_TIMEOUT)
+        for emixsong_id in emixsong_ids
+    ]
+    done, not_done = wait(futures, timeout=deadline)
+    for future in not_done:
+        future.cancel()
+    if not_done:
+        logger.warning(f'搜索 {music_name} 有 {len(not_done)} 条详情请求超时，返回部分结果')
+
+    songs = []
+    complete = not not_done
+    for file_name, emixsong_id, future in zip(file_names, emixsong_ids, futures):
+        if future not in done:
+            continue
+        content = future.result()
+        if not content:
+            complete = False
+            continue
+        songs.append({
+            'title': content.get('audio_name', ''),
+            'artist': content.get('author_name', '未知艺术家'),
+            'album': content.get('album_name', '未知专辑'),
+            'duration': int(int(content.get('timelength', 0)) / 1000),
+            'image_url': content.get('img', ''),
+            'emixsong_id': emixsong_id,
+            'file_name': file_name
+        })
+
+    return songs, complete
+
+
+def parse_song_info(content: dict) -> Optional[Dict[str, Any]]:
+    """
+    从 songinfo 接口的 data 字段提取入库需要的字段
 
-    except Exception as e:
-        logger.error(f'保存图片失败: {url}, 错误: {e}')
+    Returns:
+        Optional[Dict]: 没有歌曲名称时返回 None
+    """
+    name = content.get('audio_name') if content else None
+    if not name:
         return None
+    return {
+        'name': name,
+        'duration': int(int(content.get('timelength', 0)) / 1000),
+        'image_url': content.get('img'),
+        'album_name': content.get('album_name', 'Unknown Album'),
+        'artist_names': [artist.strip() for artist in content.get('author_name', 'Unknown Artist').split('、')],
+        'lyrics': content.get('lyrics'),
+        'lyrics_timeline': build_timeline(content.get('lyrics'))
+    }
 
 
-def song_information_download(response: requests.Response) -> Optional[Song]:
+def song_information_download(content: dict, emixsong_id: Optional[str] = None) -> Optional[Song]:
     """
-    从API响应下载并保存歌曲信息到数据库
+    将歌曲信息保存到数据库
 
     Args:
-        response: API的响应对象
+        content: songinfo 接口返回的 data 字段（见 get_song_info）
+        emixsong_id: 上游歌曲ID（可选）
 
     Returns:
         Optional[Song]: 成功则返回歌曲对象，失败返回None
     """
-    if not response.ok:
-        logger.error(f'API 请求失败: {response.status_code}')
-        return None
-
     try:
-        content = response.json().get('data')
         if not content:
             logger.error('响应中没有数据字段')
             return None
 
         # 提取基本信息
-        name = content.get('audio_name')
-        if not name:
+        info = parse_song_info(content)
+        if not info:
             logger.error('未找到歌曲名称')
             return None
-
-        duration = int(int(content.get('timelength', 0)) / 1000)
-        images_url = content.get('img')
-        album_name = content.get('album_name', 'Unknown Album')
-        artist_names = [name.strip() for name in content.get('author_name', 'Unknown Artist').split('、')]
-        lyrics = content.get('lyrics')
+        if emixsong_id:
+            info['emixsong_id'] = emixsong_id
 
         try:
-            # 处理艺术家
-            artists = []
-            for artist_name in artist_names:
-                artist = Artist.query.filter_by(name=artist_name).first()
-                if not artist:
-                    artist = Artist(
-                        name=artist_name,
-                        image_url=images_url if artist_name == artist_names[0] else None
-                    )
-                    db.session.add(artist)
-                artists.append(artist)
-
-            db.session.flush()
-
-            # 处理专辑
-            album = Album.query.filter_by(
-                name=album_name,
-                artist_id=artists[0].id
-            ).first()
-
-            if not album:
-                album = Album(
-                    name=album_name,
-                    artist_id=artists[0].id,
-                    cover_image_path=images_url
-                )
-                if images_url:
-                    local_cover = save_image(images_url, f'album_{album_name}')
-                    if local_cover:
-                        album.local_cover_path = local_cover
-
-                db.session.add(album)
-                db.session.flush()
-
-            # 处理歌曲
-            song = Song.query.filter_by(
-                name=name,
-                album_id=album.id
-            ).first()
-
-            if not song:
-                song = Song(
-                    name=name,
-                    album_id=album.id,
-                    duration=duration,
-                    image_url=images_url,
-                    lyrics=lyrics,
-                    download_count=0,
-                    file_size=0
-                )
-                if images_url:
-                    local_image = save_image(images_url, f'song_{name}')
-                    if local_image:
-                        song.local_image_path = local_image
-
-                db.session.add(song)
-            else:
-                song.duration = duration
-                song.image_url = images_url
-                song.lyrics = lyrics
-                if images_url and not song.local_image_path:
-                    local_image = save_image(images_url, f'song_{name}')
-                    if local_image:
-                        song.local_image_path = local_image
-
-            # 更新艺术家关系
-            song.artists = artists
-
+            song_id = upsert_song_infos([info])[0]
             db.session.commit()
-            logger.info(f'歌曲信息已保存到数据库: {name}')
+            index_songs([song_id])
+            song = db.session.get(Song, song_id)
+            logger.info(f'歌曲信息已保存到数据库: {song.name}')
+
+            # 封面在后台下载，不阻塞入库
+            schedule_covers([song.id])
             return song
 
         except SQLAlchemyError as e:
@@ -338,47 +412,147 @@ def song_information_download(response: requests.Response) -> Optional[Song]:
         return None
 
 
-def download_url(file_name: str, url_mp3: str, song: Song) -> Optional[str]:
+def _expected_total(response: requests.Response, offset: int) -> Optional[int]:
+    """根据 Content-Range / Content-Length 计算文件总大小"""
+    content_range = response.headers.get('content-range', '')
+    if '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        return int(total) if total.isdigit() else None
+    content_length = response.headers.get('content-length')
+    if content_length and content_length.isdigit():
+        return offset + int(content_length)
+    return None
+
+
+def _stream_to_writer(url_mp3: str, writer: HashingWriter, chunk_size: int, max_resumes: int) -> int:
+    """
+    将音频写入 .part 文件，连接中断时用 Range 请求从断点继续
+
+    Returns:
+        int: 断点续传的次数
     """
-    下载MP3文件并更新数据库记录
+    resumes = 0
+    while True:
+        headers = {'Range': f'bytes={writer.size}-'} if writer.size else {}
+        try:
+            response = upstream.get(url_mp3, stream=True, headers=headers)
+
+            if response.status_code == 416:
+                # .part 文件已经完整（上次下载完但没来得及保存），否则从头下载
+                content_range = response.headers.get('content-range', '')
+                if content_range == f'bytes */{writer.size}':
+                    return resumes
+                writer.truncate()
+                continue
+
+            response.raise_for_status()
+            if writer.size and response.status_code != 206:
+                # 服务器不支持 Range，重新下载
+                writer.truncate()
+
+            total = _expected_total(response, writer.size)
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    writer.write(chunk)
+
+            if total is None or writer.size >= total:
+                return resumes
+            raise requests.ConnectionError(f'连接提前关闭: {writer.size}/{total}')
+
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            if resumes >= max_resumes:
+                raise
+            resumes += 1
+            logger.warning(f"下载中断，从 {writer.size} 字节处继续（第 {resumes} 次）: {e}")
+
+
+class AudioFile(NamedTuple):
+    """下载完成并存入内容寻址存储的音频文件"""
+    path: Path
+    size: int
+    content_hash: str
+    bytes_downloaded: int
+    transfer_seconds: float
+    resume_count: int
+
+    @property
+    def relative_path(self) -> str:
+        return self.path.relative_to(STATIC_DIR).as_posix()
+
+
+def fetch_audio_file(file_name: str, url_mp3: str, key: str,
+                     chunk_size: int = 256 * 1024, max_resumes: int = 5) -> AudioFile:
+    """
+    下载音频到 songs/ 目录，不访问数据库，可以在线程池中调用
+
+    数据先写入 key 对应的固定 .part 文件，连接中断时用 Range 请求续传，
+    网络错误时保留 .part 文件，下次下载同一首歌时从断点继续。
+    下载时同时计算 SHA-256，完成后原子地存入内容寻址存储，
+    相同内容的歌曲共享同一份文件（硬链接）。
+
+    Raises:
+        requests.RequestException: 重试后仍然下载失败
+    """
+    writer = HashingWriter(partial_path(key), buffer_size=chunk_size * 4)
+    try:
+        initial_size = writer.size
+        started = time.monotonic()
+        resumes = _stream_to_writer(url_mp3, writer, chunk_size, max_resumes)
+        transfer_seconds = round(time.monotonic() - started, 3)
+        file_path = commit_song_file(writer, sanitize_filename(file_name))
+    except requests.RequestException:
+        writer.close()
+        writer.release()
+        raise
+    except Exception:
+        writer.discard()
+        raise
+
+    return AudioFile(
+        path=file_path,
+        size=writer.size,
+        content_hash=writer.hexdigest,
+        bytes_downloaded=writer.size - initial_size,
+        transfer_seconds=transfer_seconds,
+        resume_count=resumes + (1 if initial_size else 0)
+    )
+
+
+def apply_audio_file(song: Song, audio: AudioFile, download: Optional[Download] = None) -> None:
+    """把下载结果写入歌曲记录（和下载任务的传输统计），不提交事务"""
+    song.file_path = audio.relative_path
+    song.file_size = audio.size
+    song.content_hash = audio.content_hash
+    if download is not None:
+        download.bytes_downloaded = audio.bytes_downloaded
+        download.transfer_seconds = audio.transfer_seconds
+        download.resume_count = audio.resume_count
+
+
+def download_url(file_name: str, url_mp3: str, song: Song, download: Optional[Download] = None) -> Optional[str]:
+    """
+    下载MP3文件并更新数据库记录（见 fetch_audio_file）
 
     Args:
         file_name: 文件名
         url_mp3: 下载链接
         song: Song模型实例
+        download: 下载任务记录（可选），用于记录传输字节数、耗时和续传次数
 
     Returns:
         Optional[str]: 成功返回相对于static目录的路径，失败返回None
     """
     try:
-        response = requests.get(url_mp3, stream=True)
-        response.raise_for_status()
-
-        # 获取文件大小
-        file_size = int(response.headers.get('content-length', 0))
-
-        # 确保目录存在
-        upload_folder = Path('app/static/songs')
-        upload_folder.mkdir(parents=True, exist_ok=True)
-
-        # 生成安全的文件名
-        safe_name = "".join(c for c in file_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-        file_path = upload_folder / f"{safe_name}.mp3"
-
-        # 下载文件
-        with open(file_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-
-        # 更新数据库中的文件信息
-        relative_path = str(file_path.relative_to('app/static'))
-        song.file_path = relative_path
-        song.file_size = file_size
+        audio = fetch_audio_file(
+            file_name, url_mp3, song.emixsong_id or f'song-{song.id}',
+            chunk_size=current_app.config.get('DOWNLOAD_CHUNK_SIZE', 256 * 1024),
+            max_resumes=current_app.config.get('DOWNLOAD_MAX_RESUMES', 5)
+        )
+        apply_audio_file(song, audio, download)
         db.session.commit()
 
-        logger.info(f'{file_name} - 下载成功，文件路径: {relative_path}')
-        return relative_path
+        logger.info(f'{file_name} - 下载成功，文件路径: {audio.relative_path}')
+        return audio.relative_path
 
     except requests.RequestException as e:
         logger.error(f"下载失败: {e}")
@@ -398,72 +572,81 @@ def download_song(music_name: str, user_id: Optional[int] = None) -> Tuple[bool,
     Returns:
         Tuple[bool, str]: (是否成功, 消息)
     """
+    success, message, _ = run_download_pipeline(music_name, user_id)
+    return success, message
+
+
+def run_download_pipeline(music_name: str, user_id: Optional[int] = None,
+                          download: Optional[Download] = None) -> Tuple[bool, str, Optional[Song]]:
+    """
+    执行完整的下载流程：搜索 -> 歌曲信息 -> 下载链接 -> 音频文件
+
+    Args:
+        music_name: 歌曲名称
+        user_id: 用户ID（可选）
+        download: 下载任务记录（可选），用于记录传输统计
+
+    Returns:
+        Tuple[bool, str, Optional[Song]]: (是否成功, 消息, 歌曲对象)
+    """
     try:
         # 获取歌曲ID列表
-        audio_id = audio_id_list(music_name)
+        audio_id = search_audio_ids(music_name)
         if audio_id is None:
-            return False, "未找到该歌曲"
+            return False, "未找到该歌曲", None
 
         file_names, emixsong_ids = audio_id
         if not file_names or not emixsong_ids:
-            return False, "搜索结果为空"
+            return False, "搜索结果为空", None
 
         file_name = file_names[0]
         emixsong_id = emixsong_ids[0]
 
+        # 已经下载过的歌曲直接复用，不再请求歌曲信息和音频文件
+        song = Song.query.filter_by(emixsong_id=emixsong_id).first()
+        if song and existing_song_file(song.file_path):
+            return True, f"歌曲已存在: {song.file_path}", song
+
         # 获取歌曲信息
-        response = images_download(emixsong_id)
-        if not response:
-            return False, "获取歌曲信息失败"
+        song_info = get_song_info(emixsong_id)
+        if not song_info:
+            return False, "获取歌曲信息失败", None
 
         # 保存歌曲信息到数据库
-        song = song_information_download(response)
+        song = song_information_download(song_info, emixsong_id)
         if not song:
-            return False, "保存歌曲信息失败"
+            return False, "保存歌曲信息失败", None
 
 
         # 记录下载历史
         if user_id:
-            download = Download(
-                song_id=song.id,
-                user_id=user_id,
-                status='completed',
-                source_url=song.file_path
-            )
-            db.session.add(download)
-            song.download_count += 1
-            db.session.commit()
+            record_download(song.id, user_id, song.file_path)
+            return True, f"歌曲已存在: {song.file_path}", song
 
-            return True, f"歌曲已存在: {song.file_path}"
+        # 同一首歌（按名称和专辑匹配）已有音频文件时不再重复下载
+        if existing_song_file(song.file_path):
+            return True, f"歌曲已存在: {song.file_path}", song
 
         # 获取下载链接
         time.sleep(2)  # 避免频繁请求
         url_mp3 = fetch_url(emixsong_id)
-        if url_mp3 == '':
-            return False, "获取下载链接失败"
+        if not url_mp3:
+            return False, "获取下载链接失败", None
 
         # 下载文件
-        result = download_url(file_name, url_mp3, song)
+        result = download_url(file_name, url_mp3, song, download)
         if not result:
-            return False, "下载失败"
+            return False, "下载失败", None
 
         # 更新下载计数并记录下载历史
         if user_id:
-            download = Download(
-                song_id=song.id,
-                user_id=user_id,
-                status='completed',
-                source_url=url_mp3
-            )
-            db.session.add(download)
-            song.download_count += 1
-            db.session.commit()
+            record_download(song.id, user_id, url_mp3)
 
-        return True, f"下载成功: {result}"
+        return True, f"下载成功: {result}", song
 
     except Exception as e:
         logger.exception(f"下载过程中发生错误: {e}")
-        return False, f"发生错误: {str(e)}"
+        return False, f"发生错误: {str(e)}", None
 
 # 实用工具函数
 def sanitize_filename(filename: str) -> str:
@@ -0,0 +1,404 @@
+# app/rankings.py
+
+import heapq
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+import click
+import redis
+from flask import current_app
+from sqlalchemy import func, select
+
+from app import db
+from app.models import Download, DownloadStatsFlush, Song, user_favorites
+from app.utils.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+# 排行榜类型 -> Redis 有序集合（成员为歌曲ID）
+CHART_KEYS = {
+    'downloads': 'charts:downloads',
+    'likes': 'charts:likes',
+    'trending': 'charts:trending',
+}
+# 热门榜分数的基准时间
+TRENDING_EPOCH_KEY = 'charts:trending:epoch'
+# 下载榜和收藏榜已从数据库重建的标记，过期后由后台线程重新校准
+READY_KEY = 'charts:ready'
+# 排行榜至少重建过一次的标记，之前读取排行榜时查询数据库
+BUILT_KEY = 'charts:built'
+REBUILD_LOCK_KEY = 'charts:rebuild_lock'
+# 重建期间的事件同时记入日志，替换排行榜时合并，不会丢失
+REBUILDING_KEY = 'charts:rebuilding'
+JOURNAL_KEYS = {
+    'downloads': 'charts:journal:downloads',
+    'likes': 'charts:journal:likes',
+    'trending': 'charts:journal:trending',
+}
+
+# 下载和收藏计数尚未写入数据库的增量（见 download_stats、likes）
+_PENDING_DOWNLOAD_KEY = 'downloads:counts'
+_FLUSHING_DOWNLOAD_KEY = 'downloads:counts:flushing'
+_FLUSHING_BATCH_KEY = 'downloads:flushing:batch'
+_DOWNLOAD_FLUSH_LOCK_KEY = 'downloads:flush_lock'
+_LIKES_COUNTS_KEY = 'likes:counts'
+
+READY_TTL = 24 * 3600
+REBUILD_TTL = 300
+# 热门榜的事件权重
+DOWNLOAD_WEIGHT = 1
+LIKE_WEIGHT = 3
+# 热门榜只保留分数最高的歌曲
+TRENDING_MAX_SIZE = 1000
+# 重建热门榜时统计的天数
+TRENDING_WINDOW_DAYS = 7
+
+# 热门分数按指数衰减：事件在时间 t 贡献 weight * 2^((t - epoch) / 半衰期)，
+# 分数只增不减即可得到衰减后的排序；指数过大时整体缩放并更新基准时间。
+# KEYS: 热门榜, 基准时间, 重建标记, 热门榜日志; ARGV: 歌曲ID, 权重, 当前时间, 半衰期, 最大长度
+_TRENDING_SCRIPT = """
+local now = tonumber(ARGV[3])
+local half_life = tonumber(ARGV[4])
+local epoch = tonumber(redis.call('GET', KEYS[2]))
+if not epoch then
+    epoch = now
+    redis.call('SET', KEYS[2], now)
+end
+if (now - epoch) / half_life > 50 then
+    redis.call('ZUNIONSTORE', KEYS[1], 1, KEYS[1], 'WEIGHTS', 2 ^ (-(now - epoch) / half_life))
+    redis.call('SET', KEYS[2], now)
+    epoch = now
+end
+local increment = tonumber(ARGV[2]) * 2 ^ ((now - epoch) / half_life)
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    redis.call('ZINCRBY', KEYS[4], increment, ARGV[1])
+end
+local score = tonumber(redis.call('ZINCRBY', KEYS[1], increment, ARGV[1]))
+if score <= 0 then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+end
+local size = tonumber(ARGV[5])
+if redis.call('ZCARD', KEYS[1]) > size * 2 then
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -(size + 1))
+end
+return score
+"""
+
+# KEYS: 下载榜, 重建标记, 下载榜日志; ARGV: 歌曲ID
+_DOWNLOAD_EVENT_SCRIPT = """
+redis.call('ZINCRBY', KEYS[1], 1, ARGV[1])
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('ZINCRBY', KEYS[3], 1, ARGV[1])
+end
+"""
+
+# KEYS: 收藏榜, 重建标记, 收藏榜日志; ARGV: 歌曲ID, 收藏数
+_LIKE_EVENT_SCRIPT = """
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('HSET', KEYS[3], ARGV[1], ARGV[2])
+end
+"""
+
+# 开始重建：清空日志并设置重建标记，同时读取 Redis 中的计数，之后的事件都进入日志
+# KEYS: 重建标记, 下载榜日志, 收藏榜日志, 热门榜日志, 下载增量, 写入中的下载增量, 写入中的批次ID,
+#       收藏数, 热门榜基准时间
+# ARGV: 重建标记的有效期, 当前时间
+_BEGIN_REBUILD_SCRIPT = """
+redis.call('DEL', KEYS[2], KEYS[3], KEYS[4])
+redis.call('SET', KEYS[1], '1', 'EX', ARGV[1])
+redis.call('SET', KEYS[9], ARGV[2], 'NX')
+return {
+    redis.call('HGETALL', KEYS[5]), redis.call('HGETALL', KEYS[6]), redis.call('GET', KEYS[7]) or false,
+    redis.call('HGETALL', KEYS[8]), redis.call('GET', KEYS[9])
+}
+"""
+
+# 用重建的临时集合替换排行榜，先合并重建期间的事件
+# KEYS: 下载榜, 收藏榜, 热门榜, 对应的三个临时集合, 对应的三个日志, 重建标记
+# ARGV: 是否替换热门榜(1/0)
+_FINISH_REBUILD_SCRIPT = """
+redis.call('ZUNIONSTORE', KEYS[4], 2, KEYS[4], KEYS[7])
+local likes = redis.call('HGETALL', KEYS[8])
+for i = 1, #likes, 2 do
+    redis.call('ZADD', KEYS[5], likes[i + 1], likes[i])
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[5], '-inf', 0)
+local charts = 2
+if ARGV[1] == '1' then
+    redis.call('ZUNIONSTORE', KEYS[6], 2, KEYS[6], KEYS[9])
+    redis.call('ZREMRANGEBYSCORE', KEYS[6], '-inf', 0)
+    charts = 3
+end
+for i = 1, charts do
+    if redis.call('EXISTS', KEYS[i + 3]) == 1 then
+        redis.call('RENAME', KEYS[i + 3], KEYS[i])
+    else
+        redis.call('DEL', KEYS[i])
+    end
+end
+redis.call('DEL', KEYS[6], KEYS[7], KEYS[8], KEYS[9], KEYS[10])
+"""
+
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_rebuilder_started = False
+_rebuilder_lock = threading.Lock()
+
+
+def _half_life() -> float:
+    return current_app.config.get('TRENDING_HALF_LIFE', 24 * 3600)
+
+
+def _update_trending(pipe, song_id: int, weight: float) -> None:
+    pipe.eval(
+        _TRENDING_SCRIPT, 4, CHART_KEYS['trending'], TRENDING_EPOCH_KEY, REBUILDING_KEY, JOURNAL_KEYS['trending'],
+        song_id, weight, time.time(), _half_life(), TRENDING_MAX_SIZE
+    )
+
+
+def record_download_event(song_id: int) -> None:
+    """下载榜加一，热门榜加上下载权重；Redis 不可用时忽略（重建时从数据库校准）"""
+    client = RedisClient().client
+    if client is None:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.eval(_DOWNLOAD_EVENT_SCRIPT, 3, CHART_KEYS['downloads'], REBUILDING_KEY, JOURNAL_KEYS['downloads'],
+                  song_id)
+        _update_trending(pipe, song_id, DOWNLOAD_WEIGHT)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"更新下载排行失败: {e}")
+
+
+def record_like_event(song_id: int, is_liked: bool, likes_count: int) -> None:
+    """收藏榜更新为最新收藏数，热门榜按收藏/取消收藏加减权重"""
+    client = RedisClient().client
+    if client is None:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.eval(_LIKE_EVENT_SCRIPT, 3, CHART_KEYS['likes'], REBUILDING_KEY, JOURNAL_KEYS['likes'],
+                  song_id, likes_count)
+        _update_trending(pipe, song_id, LIKE_WEIGHT if is_liked else -LIKE_WEIGHT)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"更新收藏排行失败: {e}")
+
+
+def _trending_scores(epoch: float) -> Dict[int, float]:
+    """
+    按最近的下载记录和收藏计算热门分数，与 _TRENDING_SCRIPT 的计分相同
+
+    Args:
+        epoch: 基准时间（Unix 时间戳）
+    """
+    half_life = _half_life()
+    since = datetime.utcnow() - timedelta(days=TRENDING_WINDOW_DAYS)
+    events = (
+        (select(Download.song_id, Download.download_time)
+         .where(Download.download_time >= since, Download.song_id.isnot(None)), DOWNLOAD_WEIGHT),
+        (select(user_favorites.c.song_id, user_favorites.c.created_at)
+         .where(user_favorites.c.created_at >= since), LIKE_WEIGHT),
+    )
+    scores = {}
+    for query, weight in events:
+        for song_id, happened_at in db.session.execute(query):
+            happened = (happened_at - datetime(1970, 1, 1)).total_seconds()
+            scores[song_id] = scores.get(song_id, 0) + weight * 2 ** ((happened - epoch) / half_life)
+    return scores
+
+
+def _write_zset(client, key: str, scores: Dict[int, float], chunk_size: int = 1000) -> None:
+    client.delete(key)
+    items = [(song_id, score) for song_id, score in scores.items() if score > 0]
+    for start in range(0, len(items), chunk_size):
+        client.zadd(key, dict(items[start:start + chunk_size]))
+
+
+def _begin_rebuild(client):
+    """
+    读取数据库中的计数，并开始在 Redis 中记录重建期间的事件
+
+    读取期间持有下载统计的写入锁，增量不会在读取数据库之后、读取 Redis 之前被写入数据库
+    （否则这部分增量两边都读不到）。锁被占用时返回 None，稍后重试。
+    """
+    token = uuid.uuid4().hex
+    if not client.set(_DOWNLOAD_FLUSH_LOCK_KEY, token, nx=True, ex=60):
+        return None
+    try:
+        downloads = dict(db.session.execute(
+            select(Song.id, Song.download_count).where(Song.download_count > 0)
+        ).all())
+        likes = dict(db.session.execute(
+            select(Song.id, Song.likes_count).where(Song.likes_count > 0)
+        ).all())
+        keys = (
+            REBUILDING_KEY, JOURNAL_KEYS['downloads'], JOURNAL_KEYS['likes'], JOURNAL_KEYS['trending'],
+            _PENDING_DOWNLOAD_KEY, _FLUSHING_DOWNLOAD_KEY, _FLUSHING_BATCH_KEY, _LIKES_COUNTS_KEY, TRENDING_EPOCH_KEY
+        )
+        pending, flushing, batch_id, cached_likes, epoch = client.eval(
+            _BEGIN_REBUILD_SCRIPT, len(keys), *keys, REBUILD_TTL, time.time()
+        )
+    finally:
+        client.eval(_RELEASE_LOCK_SCRIPT, 1, _DOWNLOAD_FLUSH_LOCK_KEY, token)
+
+    # 已写入数据库、但尚未从 Redis 删除的批次不再重复计入（见 download_stats）
+    if batch_id and db.session.get(DownloadStatsFlush, batch_id) is not None:
+        flushing = []
+    for items in (pending, flushing):
+        for song_id, delta in zip(items[::2], items[1::2]):
+            downloads[int(song_id)] = downloads.get(int(song_id), 0) + int(delta)
+    likes.update({int(song_id): int(count) for song_id, count in zip(cached_likes[::2], cached_likes[1::2])})
+    return downloads, likes, float(epoch)
+
+
+def rebuild_rankings(client, rebuild_trending: bool = False) -> bool:
+    """
+    从数据库重建下载榜和收藏榜，热门榜不存在或 rebuild_trending 时按最近的记录重新生成
+
+    数据库中尚未写入的下载增量和 Redis 中的收藏数一并计入；重建期间排行榜照常读写，
+    期间的事件记入日志，替换时合并。
+
+    Returns:
+        bool: 是否已重建（下载统计正在写入数据库时返回 False）
+    """
+    rebuild_trending = rebuild_trending or not client.exists(CHART_KEYS['trending'])
+    snapshot = _begin_rebuild(client)
+    if snapshot is None:
+        return False
+    downloads, likes, epoch = snapshot
+
+    temp_keys = tuple(f'{CHART_KEYS[kind]}:rebuild' for kind in ('downloads', 'likes', 'trending'))
+    _write_zset(client, temp_keys[0], downloads)
+    _write_zset(client, temp_keys[1], likes)
+    if rebuild_trending:
+        _write_zset(client, temp_keys[2], _trending_scores(epoch))
+
+    keys = (
+        CHART_KEYS['downloads'], CHART_KEYS['likes'], CHART_KEYS['trending'], *temp_keys,
+        JOURNAL_KEYS['downloads'], JOURNAL_KEYS['likes'], JOURNAL_KEYS['trending'], REBUILDING_KEY
+    )
+    client.eval(_FINISH_REBUILD_SCRIPT, len(keys), *keys, int(rebuild_trending))
+    client.set(BUILT_KEY, '1')
+    client.set(READY_KEY, '1', ex=READY_TTL)
+    return True
+
+
+def refresh_rankings(force: bool = False) -> bool:
+    """
+    排行榜未建立或需要校准时重建（同一时间只有一个进程重建）
+
+    Args:
+        force: 不论是否需要都重建，热门榜也重新生成
+
+    Returns:
+        bool: 是否已重建
+    """
+    client = RedisClient().client
+    if client is None or (not force and client.exists(READY_KEY)):
+        return False
+    token = uuid.uuid4().hex
+    if not client.set(REBUILD_LOCK_KEY, token, nx=True, ex=REBUILD_TTL):
+        return False
+    try:
+        return rebuild_rankings(client, rebuild_trending=force)
+    finally:
+        client.eval(_RELEASE_LOCK_SCRIPT, 1, REBUILD_LOCK_KEY, token)
+
+
+def _rebuilder_loop(app) -> None:
+    interval = app.config.get('RANKINGS_REFRESH_INTERVAL', 60)
+    while True:
+        with app.app_context():
+            try:
+                refresh_rankings()
+            except Exception as e:
+                logger.error(f"重建排行榜失败: {e}")
+            finally:
+                db.session.remove()
+        time.sleep(interval)
+
+
+def _ensure_rebuilder(app) -> None:
+    """在本进程中启动后台重建线程（只启动一次）"""
+    global _rebuilder_started
+    if _rebuilder_started:
+        return
+    with _rebuilder_lock:
+        if not _rebuilder_started:
+            threading.Thread(target=_rebuilder_loop, args=(app,), name='rankings-rebuilder', daemon=True).start()
+            _rebuilder_started = True
+
+
+def _database_chart(kind: str, limit: int) -> List[Tuple[int, float]]:
+    """Redis 不可用或排行榜尚未建立时直接查询数据库"""
+    if kind == 'trending':
+        scores = _trending_scores(time.time())
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+    if kind == 'downloads':
+        query = select(Song.id, Song.download_count).where(Song.download_count > 0) \
+            .order_by(Song.download_count.desc())
+    else:
+        query = select(Song.id, Song.likes_count).where(Song.likes_count > 0) \
+            .order_by(Song.likes_count.desc())
+    return [(song_id, float(score)) for song_id, score in db.session.execute(query.limit(limit))]
+
+
+def get_chart(kind: str, limit: int = 20) -> List[Tuple[int, float]]:
+    """
+    获取排行榜
+
+    排行榜由后台线程建立和定期校准，不在请求中重建；尚未建立时查询数据库。
+
+    Args:
+        kind: downloads / likes / trending
+        limit: 返回的歌曲数
+
+    Returns:
+        List[Tuple[int, float]]: 按分数从高到低的 (歌曲ID, 分数)
+    """
+    if kind not in CHART_KEYS:
+        raise ValueError(f'未知的排行榜: {kind}')
+
+    client = RedisClient().client
+    if client is not None:
+        try:
+            _ensure_rebuilder(current_app._get_current_object())
+            if client.exists(BUILT_KEY):
+                return [(int(song_id), score)
+                        for song_id, score in client.zrevrange(CHART_KEYS[kind], 0, limit - 1, withscores=True)]
+        except redis.RedisError as e:
+            logger.warning(f"读取 Redis 排行榜失败: {e}")
+
+    return _database_chart(kind, limit)
+
+
+def get_chart_songs(kind: str, limit: int = 20) -> List[Tuple[Song, float]]:
+    """获取排行榜中的歌曲对象（一次 IN 查询），已删除的歌曲不在结果中"""
+    chart = get_chart(kind, limit)
+    songs = {song.id: song for song in Song.query.filter(Song.id.in_([song_id for song_id, _ in chart]))}
+    return [(songs[song_id], score) for song_id, score in chart if song_id in songs]
+
+
+def init_app(app):
+    """注册排行榜重建命令"""
+
+    @app.cli.command('rankings-rebuild')
+    def rankings_rebuild():
+        """从数据库重建 Redis 中的排行榜"""
+        RedisClient().get_client()
+        if refresh_rankings(force=True):
+            click.echo('排行榜已重建')
+        else:
+            click.echo('其他进程正在重建排行榜或写入下载统计，请稍后再试')
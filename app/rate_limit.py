@@ -0,0 +1,311 @@
+# app/rate_limit.py
+
+import inspect
+import logging
+import math
+import threading
+import time
+import uuid
+from functools import wraps
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import click
+import redis
+from flask import current_app, jsonify, request
+from flask_login import current_user
+
+from app.utils.lru import TTLCache
+from app.utils.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'rate_limit'
+
+# 滑动窗口日志：每个键是请求时间的有序集合，所有键都未超限时才记录本次请求
+# KEYS: 各限制的键; ARGV: 当前时间(毫秒), 请求ID, 然后每个键依次为 上限, 窗口(毫秒)
+_SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local allowed = 1
+local remaining = -1
+local retry_after = 0
+for i = 1, #KEYS do
+    local limit = tonumber(ARGV[i * 2 + 1])
+    local window = tonumber(ARGV[i * 2 + 2])
+    redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', now - window)
+    local count = redis.call('ZCARD', KEYS[i])
+    if count >= limit then
+        allowed = 0
+        -- 等到第 count - limit + 1 早的请求移出窗口
+        local oldest = redis.call('ZRANGE', KEYS[i], count - limit, count - limit, 'WITHSCORES')
+        local wait = tonumber(oldest[2]) + window - now
+        if wait > retry_after then
+            retry_after = wait
+        end
+    elseif remaining < 0 or limit - count - 1 < remaining then
+        remaining = limit - count - 1
+    end
+end
+if allowed == 1 then
+    for i = 1, #KEYS do
+        redis.call('ZADD', KEYS[i], now, ARGV[2])
+        redis.call('PEXPIRE', KEYS[i], ARGV[i * 2 + 2])
+    end
+else
+    remaining = 0
+end
+return {allowed, remaining, math.ceil(retry_after)}
+"""
+
+# 令牌桶：容量为上限，每个周期补满；所有桶都有令牌时才扣除
+# KEYS: 各限制的键; ARGV: 当前时间(毫秒), 消耗的令牌数, 然后每个键依次为 容量, 补满周期(毫秒)
+_TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local allowed = 1
+local retry_after = 0
+local tokens = {}
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[i * 2 + 1])
+    local rate = capacity / tonumber(ARGV[i * 2 + 2])
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local available = tonumber(state[1]) or capacity
+    local last = tonumber(state[2]) or now
+    available = math.min(capacity, available + math.max(0, now - last) * rate)
+    if available < cost then
+        allowed = 0
+        local wait = (cost - available) / rate
+        if wait > retry_after then
+            retry_after = wait
+        end
+    end
+    tokens[i] = available
+end
+local remaining = -1
+for i = 1, #KEYS do
+    if allowed == 1 then
+        tokens[i] = tokens[i] - cost
+    end
+    redis.call('HSET', KEYS[i], 'tokens', tostring(tokens[i]), 'ts', ARGV[1])
+    redis.call('PEXPIRE', KEYS[i], ARGV[i * 2 + 2])
+    if remaining < 0 or tokens[i] < remaining then
+        remaining = tokens[i]
+    end
+end
+return {allowed, math.floor(remaining), math.ceil(retry_after)}
+"""
+
+_SCRIPTS = {
+    'sliding_window': _SLIDING_WINDOW_SCRIPT,
+    'token_bucket': _TOKEN_BUCKET_SCRIPT,
+}
+
+
+class Decision(NamedTuple):
+    """限流结果，retry_after 为需要等待的秒数"""
+    allowed: bool
+    remaining: int
+    retry_after: int
+
+
+class RateLimiter:
+    """
+    基于 Redis Lua 脚本的限流器
+
+    一次请求的所有限制（如按 IP 和按邮箱）在一个 EVALSHA 中原子地检查和记录。
+    """
+
+    def __init__(self):
+        self._scripts = {}
+
+    def _script(self, client, algorithm: str):
+        # register_script 使用 EVALSHA，脚本不存在时自动 SCRIPT LOAD
+        key = (id(client), algorithm)
+        script = self._scripts.get(key)
+        if script is None:
+            script = self._scripts[key] = client.register_script(_SCRIPTS[algorithm])
+        return script
+
+    def hit(self, client, algorithm: str, limits: Sequence[Tuple[str, int, float]], cost: int = 1) -> Decision:
+        """
+        记录一次请求并判断是否允许
+
+        Args:
+            client: Redis 客户端
+            algorithm: sliding_window 或 token_bucket
+            limits: (键, 上限, 周期秒数) 列表
+            cost: 令牌桶一次消耗的令牌数
+        """
+        if not limits:
+            return Decision(True, -1, 0)
+        now_ms = int(time.time() * 1000)
+        args = [now_ms, uuid.uuid4().hex if algorithm == 'sliding_window' else cost]
+        for _, limit, period in limits:
+            args.extend((limit, int(period * 1000)))
+        allowed, remaining, retry_after_ms = self._script(client, algorithm)(
+            keys=[key for key, _, _ in limits], args=args
+        )
+        return Decision(bool(allowed), int(remaining), math.ceil(int(retry_after_ms) / 1000))
+
+
+class LocalRateLimiter:
+    """
+    Redis 不可用时使用的进程内限流器
+
+    两种算法都按 GCRA 计算：每个键只保存一个"理论到达时间"，判定为 O(1)；
+    状态存放在容量固定的 LRU 中，不论有多少个不同的 IP，内存占用都有上限，
+    被淘汰或已过期的键相当于重新开始计数。限制按进程生效。
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self._state = TTLCache(maxsize=maxsize, ttl=None)
+        self._lock = threading.Lock()
+
+    def configure(self, maxsize: int) -> None:
+        self._state.maxsize = maxsize
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def hit(self, limits: Sequence[Tuple[str, int, float]], cost: int = 1) -> Decision:
+        """与 RateLimiter.hit 相同，所有限制都满足时才记录"""
+        if not limits:
+            return Decision(True, -1, 0)
+        now = time.monotonic()
+        with self._lock:
+            allowed = True
+            retry_after = 0.0
+            remaining = None
+            updates = []
+            for key, limit, period in limits:
+                interval = period / limit
+                arrival = max(self._state.get(key, now), now) + interval * cost
+                if arrival - now > period:
+                    allowed = False
+                    retry_after = max(retry_after, arrival - period - now)
+                else:
+                    left = int((period - (arrival - now)) / interval + 1e-9)
+                    remaining = left if remaining is None else min(remaining, left)
+                updates.append((key, arrival))
+
+            if not allowed:
+                return Decision(False, 0, math.ceil(retry_after))
+            for key, arrival in updates:
+                # 到达时间过去后状态与新键相同，可以直接过期
+                self._state.set(key, arrival, ttl=arrival - now)
+            return Decision(True, remaining, 0)
+
+
+limiter = RateLimiter()
+local_limiter = LocalRateLimiter()
+
+
+def _identity(kind: str) -> Optional[str]:
+    """限流维度对应的值：ip、user（未登录时按 IP）、email（请求体中的邮箱）"""
+    if kind == 'ip':
+        return request.remote_addr or 'unknown'
+    if kind == 'user':
+        if current_user.is_authenticated:
+            return str(current_user.id)
+        return f'ip:{request.remote_addr}'
+    if kind == 'email':
+        data = request.get_json(silent=True) if request.is_json else request.form
+        email = (data or {}).get('email')
+        return email.strip().lower() if isinstance(email, str) and email.strip() else None
+    raise ValueError(f'未知的限流维度: {kind}')
+
+
+def policy_limits(name: str, policy: dict) -> List[Tuple[str, int, float]]:
+    """按策略生成本次请求的 (键, 上限, 周期) 列表，取不到值的维度跳过"""
+    limits = []
+    for kind, limit, period in policy['limits']:
+        value = _identity(kind)
+        if value is not None:
+            limits.append((f'{KEY_PREFIX}:{name}:{kind}:{value}', limit, period))
+    return limits
+
+
+def check_rate_limit(name: str) -> Optional[Decision]:
+    """
+    按 RATE_LIMITS[name] 检查当前请求，策略不存在或不适用于当前请求方法时返回 None
+
+    Redis 不可用或出错时使用进程内限流（见 LocalRateLimiter）。
+    """
+    policy = current_app.config.get('RATE_LIMITS', {}).get(name)
+    if not policy or request.method not in policy.get('methods', (request.method,)):
+        return None
+
+    limits = policy_limits(name, policy)
+    client = RedisClient().client
+    if client is not None:
+        try:
+            return limiter.hit(client, policy.get('algorithm', 'sliding_window'), limits)
+        except redis.RedisError as e:
+            logger.warning(f"Redis 限流检查失败，使用进程内限流: {e}")
+    return local_limiter.hit(limits)
+
+
+def _too_many_requests(decision: Decision):
+    response = jsonify({
+        'success': False,
+        'message': '请求过于频繁，请稍后再试',
+        'retry_after': decision.retry_after
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(decision.retry_after, 1))
+    return response
+
+
+def rate_limit(name: str):
+    """
+    按 Config.RATE_LIMITS 中的策略限流的视图装饰器
+
+    超限时返回 429 和 Retry-After；支持 async 视图。
+    """
+
+    def decorator(f):
+        if inspect.iscoroutinefunction(f):
+            @wraps(f)
+            async def async_wrapped(*args, **kwargs):
+                decision = check_rate_limit(name)
+                if decision is not None and not decision.allowed:
+                    return _too_many_requests(decision)
+                return await f(*args, **kwargs)
+
+            return async_wrapped
+
+        @wraps(f)
+        def wrapped(*args, **kwargs):
+            decision = check_rate_limit(name)
+            if decision is not None and not decision.allowed:
+                return _too_many_requests(decision)
+            return f(*args, **kwargs)
+
+        return wrapped
+
+    return decorator
+
+
+def init_app(app):
+    """设置进程内限流的容量，注册限流压测命令"""
+    local_limiter.configure(app.config.get('RATE_LIMIT_LOCAL_MAX_KEYS', 10000))
+
+    @app.cli.command('rate-limit-bench')
+    @click.option('--algorithm', '-a', type=click.Choice(sorted(_SCRIPTS)), default='sliding_window', show_default=True)
+    @click.option('--requests', '-n', 'count', default=10000, show_default=True, help='判定次数')
+    @click.option('--identities', '-i', default=1000, show_default=True, help='不同的限流键数量')
+    def rate_limit_bench(algorithm, count, identities):
+        """测量当前 Redis 上每秒能做出的限流判定次数"""
+        client = RedisClient().get_client()
+        prefix = f'{KEY_PREFIX}:bench:{uuid.uuid4().hex[:8]}'
+        allowed = 0
+        started = time.perf_counter()
+        for i in range(count):
+            limits = [(f'{prefix}:ip:{i % identities}', 10, 60), (f'{prefix}:email:{i % identities}', 5, 60)]
+            allowed += limiter.hit(client, algorithm, limits).allowed
+        elapsed = time.perf_counter() - started
+
+        keys = list(client.scan_iter(f'{prefix}:*'))
+        if keys:
+            client.delete(*keys)
+        click.echo(f'{algorithm}: {count} 次判定，放行 {allowed} 次，'
+                   f'{count / elapsed:.0f} 次/秒，平均 {elapsed / count * 1e6:.0f} 微秒')
@@ -1,32 +1,46 @@
-from functools import wraps
 from urllib.parse import urlparse, urljoin
 from flask_admin.helpers import is_safe_url
 from flask_wtf.csrf import generate_csrf
 from .email_service import EmailService
 from alembic.util import status
 from flask import Blueprint, render_template, request, jsonify, current_app, redirect, url_for, flash, \
-    send_from_directory, abort, send_file
+    send_from_directory, abort, send_file, stream_with_context
 from flask_login import login_user, login_required, logout_user, current_user
 from retrying import retry
+from sqlalchemy import select
 from sqlalchemy.orm import joinedload
 from werkzeug.datastructures import FileStorage
-from app.models import User, VerificationCode, Song
+from app.models import User, VerificationCode, Song, Download
 from app import db, mail
 from flask_mail import Message
+import math
 import random
 import string
 from datetime import datetime, timedelta
 import re
+import json
 from PIL import Image
 import os
 import logging
 from app.forms import RegistrationForm, RequestResetForm, ResetPasswordForm, LoginForm, ProfileForm
 import time
 from pytz import timezone
-from app.music_downloader import download_song, audio_id_list, images_download
+from app.music_downloader import search_songs
+from app.download_jobs import enqueue_download
+from app.catalog_search import search_catalog
+from app.catalog_suggest import suggest
+from app.likes import get_like_status, get_like_statuses, toggle_like
+from app.rankings import CHART_KEYS, get_chart_songs
+from app.verification_codes import check_code, discard_code, issue_code
+from app.utils.lyrics import load_song_timeline, lyric_window
 from typing import Optional, Tuple
-from .utils.redis_client import RedisHelper, RateLimit
-import redis
+from .utils.redis_client import RedisHelper
+from .rate_limit import rate_limit
+from .utils.pagination import keyset_paginate, cached_count, invalidate_count, InvalidCursor, decode_cursor, \
+    encode_cursor
+from .utils.catalog import get_catalog_version, iter_catalog_rows, catalog_cache
+from .utils.http_client import upstream
+from .utils.audio_stream import resolve_song_path, forget_song_path, build_audio_response, audio_mimetype
 from flask_wtf.csrf import CSRFProtect
 
 csrf = CSRFProtect()
@@ -34,31 +48,41 @@ main = Blueprint('main', __name__)
 china_tz = timezone('Asia/Shanghai')
 redis_helper = RedisHelper()
 auth = Blueprint('auth', __name__)
-redis_client = redis.Redis(host='localhost', port=6379, db=0)
 
-def login_rate_limit(f):
-    """登录请求速率限制装饰器"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        key = f'login_attempts:{request.remote_addr}'
-        attempts = redis_client.get(key)
 
-        # 检查是否超过限制(5分钟内最多5次)
-        if attempts and int(attempts) >= 5:
-            return jsonify({
-                'success': False,
-                'message': '登录尝试次数过多，请5分钟后再试'
-            }), 429
+def song_list_data(song):
+    """歌曲列表项的序列化格式"""
+    thumbnail = song.get_thumbnail_path()
+    return {
+        'id': song.id,
+        'name': song.name,
+        'artist': ', '.join(song.artist_names),
+        'album': song.album.name if song.album else 'Unknown Album',
+        'image_url': song.image_url,
+        'thumbnail_url': url_for('static', filename=thumbnail) if thumbnail else None,
+        'duration': song.duration,
+        'file_path': song.get_file_path()
+    }
+
 
-        # 更新尝试次数
-        pipe = redis_client.pipeline()
-        pipe.incr(key)
-        pipe.expire(key, 300)  # 5分钟过期
-        pipe.execute()
+# 批量查询收藏状态时一次最多的歌曲数
+MAX_LIKE_STATUS_IDS = 100
 
-        return f(*args, **kwargs)
 
-    return decorated_function
+def with_like_status(songs):
+    """
+    include_liked=1 且用户已登录时，为歌曲列表附加 is_liked 和 likes_count
+
+    列表本身按目录版本缓存，这里复制后再附加，不修改缓存中的数据。
+    """
+    if not (request.args.get('include_liked', type=int) and current_user.is_authenticated):
+        return songs
+    statuses = get_like_statuses(current_user.id, [song['id'] for song in songs])
+    result = []
+    for song in songs:
+        is_liked, likes_count = statuses.get(song['id'], (False, 0))
+        result.append(dict(song, is_liked=is_liked, likes_count=likes_count))
+    return result
 
 @main.route('/')
 def welcome():
@@ -71,6 +95,7 @@ def index():
 
 
 @main.route('/login', methods=['GET', 'POST'])
+@rate_limit('login')
 def login():
     """登录页面和登录处理"""
     # 如果用户已登录，重定向到首页
@@ -148,7 +173,7 @@ def login():
 
 
 @main.route('/verification_login', methods=['POST'])
-@login_rate_limit
+@rate_limit('verification_login')
 def verification_login():
     """验证码登录处理"""
     try:
@@ -216,82 +241,121 @@ def verification_login():
 
 @main.route('/api/songs', methods=['GET'])
 def get_songs():
-    songs = Song.query.options(
-        joinedload(Song.artists),  # 使用新的多对多关系
-        joinedload(Song.album)
-    ).order_by(Song.created_at.desc()).limit(8).all()
-
-    songs_data = [{
-        'id': song.id,
-        'name': song.name,
-        'artist': ', '.join(song.artist_names),  # 使用新添加的属性方法
-        'album': song.album.name if song.album else 'Unknown Album',
-        'image_url': song.image_url,
-        'duration': song.duration,
-        'file_path': song.get_file_path()  # 使用新添加的方法
-    } for song in songs]
+    def load_latest():
+        songs = Song.query.options(
+            joinedload(Song.artists),  # 使用新的多对多关系
+            joinedload(Song.album)
+        ).order_by(Song.created_at.desc()).limit(8).all()
+        return [song_list_data(song) for song in songs]
 
-    return jsonify(songs_data)
+    return jsonify(with_like_status(catalog_cache.get_or_load('songs:latest:8', load_latest)))
 
 
 @main.route('/api/songsLoading')
 def load_more_songs():
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 8, type=int)
+    """歌曲列表游标分页，cursor 为上一页返回的 next_cursor"""
+    cursor = request.args.get('cursor') or None
+    per_page = min(max(request.args.get('per_page', 8, type=int), 1), 50)
 
-    # 计算偏移量
-    offset = (page - 1) * per_page
+    def load_page():
+        query = Song.query.options(
+            joinedload(Song.artists),
+            joinedload(Song.album)
+        )
+        page = keyset_paginate(query, Song.created_at, Song.id, cursor=cursor, per_page=per_page)
+        return {
+            'songs': [song_list_data(song) for song in page.items],
+            'has_more': page.has_more,
+            'next_cursor': page.next_cursor
+        }
 
-    # 查询歌曲
-    songs = Song.query.options(
-        joinedload(Song.artists),
-        joinedload(Song.album)
-    ).order_by(Song.created_at.desc()).offset(offset).limit(per_page).all()
+    try:
+        cache_cursor = cacheable_song_cursor(cursor)
+        if cache_cursor is None:
+            data = load_page()
+        else:
+            data = catalog_cache.get_or_load(f'songs:page:{per_page}:{cache_cursor}', load_page)
+    except InvalidCursor:
+        return jsonify({'error': '无效的分页游标', 'status': 'error'}), 400
 
-    # 获取总数
-    total_songs = Song.query.count()
-    total_loaded = min(offset + per_page, total_songs)
+    return jsonify(dict(data, songs=with_like_status(data['songs']), total=catalog_song_total()))
 
-    songs_data = [{
-        'id': song.id,
-        'name': song.name,
-        'artist': ', '.join(song.artist_names),
-        'album': song.album.name if song.album else 'Unknown Album',
-        'image_url': song.image_url,
-        'duration': song.duration,
-        'file_path': song.get_file_path()
-    } for song in songs]
 
-    return jsonify({
-        'songs': songs_data,
-        'has_more': total_loaded < total_songs,
-        'total_loaded': total_loaded,
-        'total': total_songs
-    })
+def cacheable_song_cursor(cursor: Optional[str]) -> Optional[str]:
+    """
+    可以缓存的游标：第一页为空字符串，指向现存歌曲的游标为其规范编码，其他返回 None
+
+    游标来自客户端，只有指向真实歌曲的游标才进入缓存，否则任何人都能制造无限多的缓存键。
+    """
+    if cursor is None:
+        return ''
+    created_at, song_id = decode_cursor(cursor)
+    if db.session.execute(select(Song.created_at).where(Song.id == song_id)).scalar() != created_at:
+        return None
+    return encode_cursor(created_at, song_id)
+
+
+def catalog_song_total():
+    """歌曲总数，随目录版本缓存"""
+    return catalog_cache.get_or_load('songs:total', lambda: Song.query.count())
 
 @main.route('/api/all_songs', methods=['GET'])
 def get_all_songs():
-    songs = Song.query.options(
-        joinedload(Song.artists),
-        joinedload(Song.album)
-    ).order_by(Song.created_at.desc()).all()
+    """
+    流式返回全部歌曲
 
-    songs_data = [{
-        'id': song.id,
-        'name': song.name,
-        'artist': ', '.join(song.artist_names),
-        'album': song.album.name if song.album else 'Unknown Album',
-        'image_url': song.image_url,
-        'duration': song.duration,
-        'file_path': song.get_file_path()
-    } for song in songs]
+    默认返回与之前相同的 JSON 数组，format=ndjson 时每行一首歌曲。
+    响应带有基于目录版本号的 ETag，目录未变化时返回 304。
+    """
+    output_format = request.args.get('format', 'json')
+    if output_format not in ('json', 'ndjson'):
+        return jsonify({'error': '不支持的格式', 'status': 'error'}), 400
 
-    return jsonify(songs_data)
+    etag = f'catalog-{get_catalog_version()}-{output_format}'
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        rows = iter_catalog_rows()
+        if output_format == 'ndjson':
+            body = (json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+            mimetype = 'application/x-ndjson'
+        else:
+            body = _stream_json_array(rows)
+            mimetype = 'application/json'
+        response = current_app.response_class(stream_with_context(body), mimetype=mimetype)
+
+    response.set_etag(etag)
+    # 客户端可以缓存，但每次使用前都需要用 If-None-Match 重新验证
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _stream_json_array(rows):
+    """逐条输出 JSON 数组"""
+    yield '['
+    for i, row in enumerate(rows):
+        yield (',' if i else '') + json.dumps(row, ensure_ascii=False)
+    yield ']'
+
+@main.route('/api/charts/<kind>', methods=['GET'])
+def get_chart_songs_api(kind):
+    """排行榜：downloads 下载最多，likes 收藏最多，trending 近期热门"""
+    if kind not in CHART_KEYS:
+        abort(404)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    return jsonify({
+        'status': 'success',
+        'kind': kind,
+        'songs': with_like_status([
+            dict(song_list_data(song), rank=rank, score=score)
+            for rank, (song, score) in enumerate(get_chart_songs(kind, limit), start=1)
+        ])
+    })
 
 @main.route('/api/songs/total', methods=['GET'])
 def get_total_songs():
     try:
-        total = Song.query.count()
+        total = catalog_song_total()
         return jsonify({
             'total': total,
             'status': 'success'
@@ -302,6 +366,24 @@ def get_total_songs():
             'status': 'error'
         }), 500
 
+@main.route('/api/catalog/cache-stats', methods=['GET'])
+@login_required
+def get_catalog_cache_stats():
+    """歌曲目录缓存命中统计（当前进程）"""
+    return jsonify({
+        'status': 'success',
+        'stats': catalog_cache.get_stats()
+    })
+
+@main.route('/api/upstream/stats', methods=['GET'])
+@login_required
+def get_upstream_stats():
+    """上游接口调用统计（当前进程）"""
+    return jsonify({
+        'status': 'success',
+        'stats': upstream.get_stats()
+    })
+
 @main.route('/api/play/<int:song_id>')
 def play_song(song_id):
     """
@@ -311,128 +393,199 @@ def play_song(song_id):
         song_id: 歌曲ID
 
     Returns:
-        成功时返回音频文件流，失败时返回错误信息和状态码
+        成功时返回音频文件流（支持 Range 请求），失败时返回错误信息和状态码
     """
-    try:
-        # 使用 joined load 优化查询，减少数据库查询次数
-        song = Song.query.options(
-            joinedload(Song.artists),
-            joinedload(Song.album)
-        ).get_or_404(song_id)
-
-        if not song.file_path:
-            abort(404, description="Song file not found")
-
-        # 获取文件路径
-        filename = os.path.basename(song.file_path)
-        file_directory = os.path.join(current_app.config['UPLOAD_FOLDER'], 'songs')
-        file_path = os.path.join(file_directory, filename)
-
-        if not os.path.exists(file_path):
-            abort(404, description="Audio file not found")
-
-        # 根据文件扩展名确定MIME类型
-        mime_type = {
-            'mp3': 'audio/mpeg',
-            'wav': 'audio/wav',
-            'ogg': 'audio/ogg',
-            'm4a': 'audio/mp4'
-        }.get(filename.rsplit('.', 1)[1].lower(), 'application/octet-stream')
-
-        return send_from_directory(
-            file_directory,
-            filename,
-            mimetype=mime_type,
-            as_attachment=False
-        )
+    file_path = resolve_song_path(song_id)
+    if not file_path:
+        abort(404, description="Song file not found")
 
-    except Exception as e:
+    try:
+        return build_audio_response(file_path, audio_mimetype(file_path))
+    except FileNotFoundError:
+        forget_song_path(song_id)
+        abort(404, description="Audio file not found")
+    except OSError as e:
+        current_app.logger.error(f"音频文件读取失败: {str(e)}", exc_info=True)
         abort(500, description="Internal server error")
 
 
 @main.route('/api/songs/<int:song_id>/like', methods=['POST'])
 @login_required
 def toggle_like_song(song_id):
-    song = Song.query.get_or_404(song_id)
-    user = current_user
-
-    if user.has_liked_song(song):
-        user.unlike_song(song)
-        is_liked = False
-    else:
-        user.like_song(song)
-        is_liked = True
+    result = toggle_like(current_user.id, song_id)
+    if result is None:
+        abort(404)
+    is_liked, likes_count = result
+    invalidate_count(f'favorites_total:{current_user.id}')
 
     return jsonify({
         'status': 'success',
         'is_liked': is_liked,
-        'likes_count': song.likes_count
+        'likes_count': likes_count
+    })
+
+@main.route('/api/songs/like-status', methods=['GET'])
+@login_required
+def get_songs_like_status():
+    """批量查询收藏状态，ids 为逗号分隔的歌曲ID，不存在的歌曲不在结果中"""
+    try:
+        song_ids = [int(song_id) for song_id in request.args.get('ids', '').split(',') if song_id.strip()]
+    except ValueError:
+        return jsonify({'status': 'error', 'message': '无效的歌曲ID'}), 400
+    if len(song_ids) > MAX_LIKE_STATUS_IDS:
+        return jsonify({'status': 'error', 'message': f'一次最多查询 {MAX_LIKE_STATUS_IDS} 首歌曲'}), 400
+
+    statuses = get_like_statuses(current_user.id, song_ids)
+    return jsonify({
+        'status': 'success',
+        'songs': {
+            str(song_id): {'is_liked': is_liked, 'likes_count': likes_count}
+            for song_id, (is_liked, likes_count) in statuses.items()
+        }
     })
 
 @main.route('/api/songs/<int:song_id>/like-status', methods=['GET'])
 @login_required
 def get_song_like_status(song_id):
-    song = Song.query.get_or_404(song_id)
+    result = get_like_status(current_user.id, song_id)
+    if result is None:
+        abort(404)
+    is_liked, likes_count = result
     return jsonify({
         'status': 'success',
-        'is_liked': current_user.has_liked_song(song),
-        'likes_count': song.likes_count
+        'is_liked': is_liked,
+        'likes_count': likes_count
     })
 
 
 @main.route('/api/me/favorites', methods=['GET'])
 @login_required
 def get_my_favorites():
-    page = request.args.get('page', 1, type=int)
-    favorites = current_user.get_favorite_songs(page=page)
+    cursor = request.args.get('cursor') or None
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 50)
+    try:
+        favorites = current_user.get_favorite_songs(cursor=cursor, per_page=per_page)
+    except InvalidCursor:
+        return jsonify({'status': 'error', 'message': '无效的分页游标'}), 400
+
+    total = cached_count(f'favorites_total:{current_user.id}', lambda: current_user.favorite_songs.count())
 
     return jsonify({
         'status': 'success',
-        'total': favorites.total,
+        'total': total,
+        'has_more': favorites.has_more,
+        'next_cursor': favorites.next_cursor,
         'songs': [song.to_dict for song in favorites.items]
     })
 
 @main.route('/api/download', methods=['POST'])
+@rate_limit('download')
 def download():
-    """下载歌曲"""
+    """创建后台下载任务，返回任务ID，通过 /api/download/<job_id> 查询进度"""
     data = request.json
     song_name = data.get('song')
 
     if not song_name:
         return jsonify({'success': False, 'message': '歌曲名称不能为空'})
 
-    # 不传入用户ID进行下载
-    success, message = download_song(song_name)
-
-    if success:
-        # 查找最新下载的歌曲
-        song = Song.query.filter_by(name=song_name).first()
-        if song:
-            song_data = {
-                'id': song.id,
-                'name': song.name,
-                'artist': ', '.join(song.artist_names),
-                'album': song.album.name if song.album else 'Unknown Album',
-                'image_url': song.image_url,
-                'duration': song.duration,
-                'file_path': song.get_file_path()
-            }
-            return jsonify({
-                'success': True,
-                'message': '下载成功',
-                'song': song_data
-            })
+    user_id = current_user.id if current_user.is_authenticated else None
+    job = enqueue_download(song_name, user_id)
 
-    return jsonify({'success': False, 'message': message})
+    return jsonify({
+        'success': True,
+        'message': '已加入下载队列',
+        'job_id': job.id,
+        'status': job.status
+    }), 202
+
+
+@main.route('/api/download/<int:job_id>', methods=['GET'])
+def get_download_status(job_id):
+    """查询下载任务状态"""
+    job = db.session.get(Download, job_id)
+    if job is None or (job.user_id is not None and
+                       (not current_user.is_authenticated or current_user.id != job.user_id)):
+        return jsonify({'success': False, 'message': '下载任务不存在'}), 404
+
+    response_data = {
+        'success': job.status != Download.STATUS_FAILED,
+        'job_id': job.id,
+        'status': job.status,
+        'finished': job.is_finished,
+        'message': job.message
+    }
+    if job.status == Download.STATUS_COMPLETED and job.song:
+        response_data['song'] = song_list_data(job.song)
+        response_data['bytes_downloaded'] = job.bytes_downloaded
+        response_data['throughput'] = job.throughput
+    return jsonify(response_data)
 
 
 @main.route('/api/songs/<int:song_id>/lyrics')
 def get_song_lyrics(song_id):
-    song = Song.query.get_or_404(song_id)
-    song.parse_lyrics(song.lyrics)
-    if not song.lyrics:
-        return jsonify({'lyrics': []})
-    return jsonify({'lyrics': song.lyrics['lyrics']})
+    """
+    获取歌曲歌词
+
+    返回入库时预先解析好的时间轴：times（毫秒）与 lines 一一对应并按时间排序。
+    响应带 ETag 和较长的缓存时间，歌词不变时返回 304。
+    """
+    timeline = load_song_timeline(song_id)
+    if timeline is None:
+        abort(404)
+
+    if timeline['times']:
+        response = jsonify({
+            'lyrics': {'times': timeline['times'], 'lines': timeline['lines']},
+            'metadata': timeline['metadata']
+        })
+    else:
+        response = jsonify({'lyrics': None})
+
+    response.add_etag()
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get('LYRICS_CACHE_MAX_AGE', 86400)
+    return response.make_conditional(request)
+
+
+@main.route('/api/songs/<int:song_id>/lyrics/window')
+def get_lyrics_window(song_id):
+    """
+    获取播放位置附近的几行歌词
+
+    参数：
+        position: 播放位置（秒）
+        count: 当前行之后返回的行数，默认 5，最多 50
+        until: 可选，返回到该位置（秒）为止的歌词
+
+    返回的 index 为当前行在整首歌词中的下标（还没到第一行时为 -1），
+    start 为返回的第一行的下标，客户端拖动进度条后只需请求一小段歌词。
+    """
+    try:
+        position = float(request.args.get('position', 0))
+        count = min(max(int(request.args.get('count', 5)), 1), 50)
+        until = request.args.get('until', type=float)
+    except ValueError:
+        return jsonify({'error': '参数格式错误'}), 400
+    # float() 接受 inf、nan，转换为毫秒时会出错
+    if not math.isfinite(position) or position < 0 or (until is not None and not math.isfinite(until)):
+        return jsonify({'error': '参数格式错误'}), 400
+
+    timeline = load_song_timeline(song_id)
+    if timeline is None:
+        abort(404)
+
+    times = timeline['times']
+    active, start, stop = lyric_window(
+        times, int(position * 1000), count,
+        int(until * 1000) if until is not None else None
+    )
+    return jsonify({
+        'index': active,
+        'start': start,
+        'times': times[start:stop],
+        'lines': timeline['lines'][start:stop],
+        'total': len(times)
+    })
 
 
 
@@ -445,6 +598,7 @@ def logout():
 
 
 @main.route('/register', methods=['GET', 'POST'])
+@rate_limit('register')
 def register():
     form = RegistrationForm()
     if current_user.is_authenticated:
@@ -498,7 +652,7 @@ def send_email(subject, recipient, body):
         current_app.extensions['mail'].send(msg)
 
 @main.route('/send_verification_code', methods=['POST'])
- # 5分钟内最多5次请求
+@rate_limit('send_verification_code')
 async def send_verification_code():
     """发送验证码"""
     try:
@@ -562,6 +716,7 @@ async def send_verification_code():
         }), 500
 
 @main.route('/verify_code', methods=['POST'])
+@rate_limit('verify_code')
 async def verify_code():
     """验证验证码"""
     try:
@@ -658,32 +813,65 @@ def reset_password():
         return render_template('reset_password.html', form=form)
 
 
+@main.route('/api/catalog/search')
+def search_catalog_api():
+    """搜索本地歌曲目录（歌曲名、艺术家、专辑，支持拼音）"""
+    query = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    songs = search_catalog(query, limit) if query else []
+    return jsonify({
+        'status': 'success',
+        'songs': with_like_status([song_list_data(song) for song in songs])
+    })
+
+
+@main.route('/api/suggest')
+def suggest_api():
+    """输入补全：歌曲名、艺术家、专辑（支持拼音和首字母），按热度排序"""
+    query = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 8, type=int), 1), 20)
+    return jsonify({
+        'status': 'success',
+        'suggestions': suggest(query, limit) if query else []
+    })
+
+
+def local_search_result(song):
+    """本地歌曲转换为与在线搜索结果相同的格式，附带歌曲ID"""
+    return {
+        'id': song.id,
+        'title': song.name,
+        'artist': ', '.join(song.artist_names),
+        'album': song.album.name if song.album else '未知专辑',
+        'duration': song.duration or 0,
+        'image_url': song.image_url or '',
+        'emixsong_id': song.emixsong_id,
+        'file_name': None,
+        'local': True
+    }
+
+
 @main.route('/api/search')
+@rate_limit('search')
 def search():
-    """搜索在线歌曲"""
+    """搜索歌曲：先搜索本地目录，本地结果不足时再搜索在线歌曲"""
     query = request.args.get('q', '')
     if not query:
         return jsonify([])
 
-    results = audio_id_list(query)
-    songs = []
-    if results:
-        file_names, emixsong_ids = results
-        for i, emixsong_id in enumerate(emixsong_ids):
-            response = images_download(emixsong_id)
-            if response and response.ok:
-                content = response.json().get('data', {})
-                songs.append({
-                    'title': content.get('audio_name', ''),
-                    'artist': content.get('author_name', '未知艺术家'),
-                    'album': content.get('album_name', '未知专辑'),
-                    'duration': int(int(content.get('timelength', 0)) / 1000),
-                    'image_url': content.get('img', ''),
-                    'emixsong_id': emixsong_id,
-                    'file_name': file_names[i]
-                })
-
-    return jsonify(songs)
+    local_songs = search_catalog(query)
+    results = [local_search_result(song) for song in local_songs]
+    if len(results) >= current_app.config.get('SEARCH_LOCAL_SUFFICIENT', 10):
+        return jsonify(results)
+
+    songs, complete = search_songs(query)
+    known = {song.emixsong_id for song in local_songs if song.emixsong_id}
+    results.extend(song for song in songs if song['emixsong_id'] not in known)
+    response = jsonify(results)
+    if not complete:
+        # 部分详情请求超时或失败，结果不完整
+        response.headers['X-Search-Partial'] = '1'
+    return response
 
 @main.route('/profile', methods=['GET', 'POST'])
 @login_required
@@ -815,13 +1003,6 @@ def is_strong_password(password):
     return len(password) >= 8
 
 
-def clean_expired_verification_codes():
-    expired_codes = VerificationCode.query.filter(VerificationCode.expires_at < datetime.utcnow()).all()
-    for code in expired_codes:
-        db.session.delete(code)
-    db.session.commit()
-
-
 def save_avatar(file, user):
     """保存头像文件并返回文件名"""
     if not file:
@@ -852,22 +1033,9 @@ class RegistrationService:
         self.logger = current_app.logger
 
     def verify_registration_code(self, email: str, code: str) -> Tuple[bool, Optional[str]]:
-        """验证注册验证码"""
-        pending_code = VerificationCode.query.filter_by(
-            email=email,
-            purpose='registration'
-        ).first()
-
-        if not pending_code:
-            return False, "请先获取验证码"
-
-        if pending_code.is_expired():
-            return False, "验证码已过期，请重新获取"
-
-        if pending_code.code != code:
-            return False, "验证码错误"
-
-        return True, None
+        """验证注册验证码（注册成功后才删除）"""
+        valid, message = check_code(email, code, 'registration')
+        return valid, None if valid else message
 
     def check_email_availability(self, email: str) -> Tuple[bool, Optional[str]]:
         """检查邮箱是否可用"""
@@ -948,17 +1116,12 @@ class RegistrationService:
 
                 new_user.avatar_url = avatar_filename
 
-                # 删除验证码
-                pending_code = VerificationCode.query.filter_by(
-                    email=form_data['email'],
-                    purpose='registration'
-                ).first()
-                if pending_code:
-                    self.db.session.delete(pending_code)
-
             # 提交事务
             self.db.session.commit()
 
+            # 删除验证码
+            discard_code(form_data['email'], 'registration')
+
             return True, None, {
                 'user_id': new_user.id,
                 'username': new_user.username,
@@ -992,80 +1155,20 @@ class VerificationService:
         self.email_service = EmailService()
 
     def create_or_update_code(self, email: str, purpose: str = 'registration') -> Tuple[bool, str, Optional[int]]:
-        """创建或更新验证码"""
+        """创建或更新验证码（保存在 Redis 中，见 app.verification_codes）"""
         try:
-            current_time = datetime.utcnow()
-            existing_code = VerificationCode.query.filter_by(
-                email=email,
-                purpose=purpose
-            ).first()
-
-            # 检查冷却时间
-            if existing_code:
-                time_since_last = (current_time - existing_code.created_at).total_seconds()
-                if time_since_last < 120:  # 2分钟冷却时间
-                    return False, '请稍后再试', int(120 - time_since_last)
-
-            # 生成新验证码
-            verification_code = self._generate_code()
-            expires_at = current_time + timedelta(minutes=10)
-
-            if existing_code:
-                existing_code.code = verification_code
-                existing_code.expires_at = expires_at
-                existing_code.created_at = current_time
-            else:
-                new_code = VerificationCode(
-                    email=email,
-                    code=verification_code,
-                    expires_at=expires_at,
-                    created_at=current_time,
-                    purpose=purpose,
-                    attempts=0
-                )
-                self.db.session.add(new_code)
-
-            self.db.session.commit()
-            return True, verification_code, None
-
+            return issue_code(email, purpose, self._generate_code())
         except Exception as e:
             self.db.session.rollback()
             current_app.logger.error(f"验证码创建错误: {str(e)}", exc_info=True)
             raise
 
     def verify_code(self, email: str, code: str, purpose: str) -> Tuple[bool, str, Optional[dict]]:
-        """验证验证码"""
+        """验证验证码，注册验证码验证成功后删除"""
         try:
-            verification = VerificationCode.query.filter_by(
-                email=email,
-                purpose=purpose
-            ).first()
-
-            if not verification:
-                return False, '验证码不存在', None
-
-            if verification.is_expired():
-                return False, '验证码已过期', None
-
-            # 检查尝试次数
-            if verification.attempts >= 5:
-                return False, '尝试次数过多，请重新获取验证码', None
-
-            verification.attempts += 1
-            self.db.session.commit()
-
-            if verification.code != code:
-                return False, '验证码错误', None
-
-            # 验证成功后，如果是注册验证码，直接删除
-            if purpose == 'registration':
-                self.db.session.delete(verification)
-                self.db.session.commit()
-
-            return True, '验证成功', None
-
+            success, message = check_code(email, code, purpose, consume=purpose == 'registration')
+            return success, message, None
         except Exception as e:
-            self.db.session.rollback()
             current_app.logger.error(f"验证码验证错误: {str(e)}", exc_info=True)
             raise
 
@@ -1087,95 +1190,7 @@ class VerificationService:
             current_app.logger.error(f"发送验证码邮件失败: {str(e)}", exc_info=True)
             return False
 
-def simple_rate_limit(limit=10, period=60):
-    """简化版速率限制装饰器"""
-
-    def decorator(f):
-        if not hasattr(simple_rate_limit, 'request_history'):
-            simple_rate_limit.request_history = {}
-
-        @wraps(f)
-        def wrapped(*args, **kwargs):
-            key = f"{request.remote_addr}:{request.endpoint}"
-            now = time.time()
-
-            # 获取该IP的请求历史
-            request_times = simple_rate_limit.request_history.get(key, [])
-
-            # 清理过期的记录
-            request_times = [t for t in request_times if t > now - period]
-
-            # 检查是否超过限制
-            if len(request_times) >= limit:
-                return jsonify({
-                    'success': False,
-                    'message': '请求过于频繁，请稍后再试'
-                }), 429
-
-            # 添加新的请求时间
-            request_times.append(now)
-            simple_rate_limit.request_history[key] = request_times
-
-            return f(*args, **kwargs)
-
-        return wrapped
-
-    return decorator
-
-
 def is_safe_url(target):
     ref_url = urlparse(request.host_url)
     test_url = urlparse(urljoin(request.host_url, target))
     return test_url.scheme in ('http', 'https') and ref_url.netloc == test_url.netloc
-
-
-def ratelimit(limit=5, window=60):
-    def decorator(f):
-        @wraps(f)
-        def wrapped(*args, **kwargs):
-            # 获取客户端IP
-            ip = request.remote_addr
-            key = f'login_attempts:{ip}'
-
-            # 检查是否超过限制
-            attempts = redis_client.get(key)
-            if attempts and int(attempts) >= limit:
-                return jsonify({'error': '尝试次数过多，请稍后再试'}), 429
-
-            # 更新尝试次数
-            pipe = redis_client.pipeline()
-            pipe.incr(key)
-            pipe.expire(key, window)
-            pipe.execute()
-
-            return f(*args, **kwargs)
-
-        return wrapped
-
-    return decorator
-
-
-def login_rate_limit(f):
-    """登录请求速率限制装饰器"""
-
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        key = f'login_attempts:{request.remote_addr}'
-        attempts = redis_client.get(key)
-
-        # 检查是否超过限制(5分钟内最多5次)
-        if attempts and int(attempts) >= 5:
-            return jsonify({
-                'success': False,
-                'message': '登录尝试次数过多，请5分钟后再试'
-            }), 429
-
-        # 更新尝试次数
-        pipe = redis_client.pipeline()
-        pipe.incr(key)
-        pipe.expire(key, 300)  # 5分钟过期
-        pipe.execute()
-
-        return f(*args, **kwargs)
-
-    return decorated_function
\ No newline at end of file
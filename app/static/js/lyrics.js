@@ -18,8 +18,8 @@ class LyricsManager {
     }
 
     setLyrics(lyricsData) {
-    // 假设 lyricsData 是一个字典，格式为 { '00:00.00': '歌词文本', ... }
-    // 将其转换为数组格式 [{ text: '歌词文本', timestamp: '00:00.00' }, ...]
+    // lyricsData 为 { times: [毫秒, ...], lines: ['歌词文本', ...] }（旧格式为 { '00:00.00': '歌词文本', ... }）
+    // 将其转换为数组格式 [{ text: '歌词文本', timestamp: 秒数 }, ...]
 
     this.lyrics = this.convertLyricsFormat(lyricsData);
     // 调用更新显示的函数
@@ -30,6 +30,14 @@ class LyricsManager {
             return [];
         }
 
+        // 服务端已按时间排序
+        if (Array.isArray(lyricsDict.times)) {
+            return lyricsDict.times.map((ms, index) => ({
+                timestamp: ms / 1000,
+                text: lyricsDict.lines[index]
+            }));
+        }
+
         // 将字典格式转换为数组格式
         return Object.entries(lyricsDict)
             .map(([timestamp, text]) => ({
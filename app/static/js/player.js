@@ -63,6 +63,8 @@ class PlayerController {
         this.playlist = [];
         this.isPlayingFromPlaylist = false;
         this.currentPlaylistIndex = -1;
+        // 收藏状态缓存：歌曲ID -> { is_liked, likes_count }
+        this.likeStatuses = new Map();
 
         // 初始化各个组件
         this.initializeTimeDisplay();
@@ -275,8 +277,9 @@ class PlayerController {
     async fetchSongs() {
     try {
     // 获取显示的歌曲（用于界面展示）
-    const displayResponse = await fetch('/api/songs');
+    const displayResponse = await fetch('/api/songs?include_liked=1');
     this.displayedSongs = await displayResponse.json();
+    this.rememberLikeStatuses(this.displayedSongs);
     this.initializeSongList();
 
     // 获取所有歌曲（用于播放控制）
@@ -645,6 +648,7 @@ class PlayerController {
             console.log("Like response:", data);
 
             if (data.status === 'success') {
+                this.likeStatuses.set(song.id, { is_liked: data.is_liked, likes_count: data.likes_count });
                 this.updateLikeButton(data.is_liked, data.likes_count);
                 // 更新列表中的对应按钮
                 this.updateSongListLikeButton(song.id, data.is_liked, data.likes_count);
@@ -653,13 +657,43 @@ class PlayerController {
             console.error('Error toggling like:', error);
         }
     }
+    // 记录带有 is_liked 的歌曲列表（include_liked=1 的返回结果）中的收藏状态
+    rememberLikeStatuses(songs) {
+        songs.forEach(song => {
+            if (song.is_liked !== undefined) {
+                this.likeStatuses.set(song.id, { is_liked: song.is_liked, likes_count: song.likes_count });
+            }
+        });
+    }
+
+    // 批量查询收藏状态，每次最多 100 首（与服务端 MAX_LIKE_STATUS_IDS 一致）
+    async fetchLikeStatuses(songIds) {
+        for (let start = 0; start < songIds.length; start += 100) {
+            const ids = songIds.slice(start, start + 100);
+            const response = await fetch(`/api/songs/like-status?ids=${ids.join(',')}`);
+            if (!response.ok) return;
+            const data = await response.json();
+            if (data.status !== 'success') return;
+            Object.entries(data.songs).forEach(([songId, status]) => {
+                this.likeStatuses.set(Number(songId), status);
+            });
+        }
+    }
+
     async loadLikeStatus(songId) {
         try {
-            const response = await fetch(`/api/songs/${songId}/like-status`);
-            const data = await response.json();
+            if (!this.likeStatuses.has(songId)) {
+                // 连同后面将要播放的歌曲一起查询，顺序播放时不再逐首请求
+                const index = this.allSongs.findIndex(s => s.id === songId);
+                const nextIds = this.allSongs.slice(index + 1, index + 50)
+                    .map(s => s.id)
+                    .filter(id => !this.likeStatuses.has(id));
+                await this.fetchLikeStatuses([songId, ...nextIds]);
+            }
 
-            if (data.status === 'success') {
-                this.updateLikeButton(data.is_liked, data.likes_count);
+            const status = this.likeStatuses.get(songId);
+            if (status) {
+                this.updateLikeButton(status.is_liked, status.likes_count);
             }
         } catch (error) {
             console.error('Error loading like status:', error);
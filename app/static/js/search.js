@@ -52,8 +52,8 @@ class SearchManager {
         }
 
         try {
-            const songs = await this.fetchSearchResults(query);
-            this.showSuggestions(songs);
+            const suggestions = await this.fetchSuggestions(query);
+            this.showSuggestions(suggestions);
             this.updateContentVisibility();
         } catch (error) {
             console.error('搜索建议错误:', error);
@@ -129,7 +129,14 @@ class SearchManager {
             });
 
             const result = await response.json();
-            this.showNotification(result.success ? '下载成功！' : result.message || '下载失败');
+            if (!result.success) {
+                this.showNotification(result.message || '下载失败');
+                return;
+            }
+
+            // 下载在后台执行，轮询任务状态直到完成
+            const job = await this.waitForDownload(result.job_id);
+            this.showNotification(job.status === 'completed' ? '下载成功！' : job.message || '下载失败');
         } catch (error) {
             console.error('下载错误:', error);
             this.showNotification('下载失败，请稍后重试', 'error');
@@ -138,16 +145,36 @@ class SearchManager {
         }
     }
 
+    async waitForDownload(jobId, interval = 1500, maxAttempts = 120) {
+        for (let attempt = 0; attempt < maxAttempts; attempt++) {
+            await new Promise(resolve => setTimeout(resolve, interval));
+            const response = await fetch(`/api/download/${jobId}`);
+            if (!response.ok) throw new Error('查询下载状态失败');
+            const job = await response.json();
+            if (job.finished) return job;
+        }
+        throw new Error('下载超时');
+    }
+
+    async fetchSuggestions(query) {
+        const response = await fetch(`/api/suggest?q=${encodeURIComponent(query)}`);
+        if (!response.ok) throw new Error('搜索建议请求失败');
+        const data = await response.json();
+        return data.suggestions;
+    }
+
     async fetchSearchResults(query) {
         const response = await fetch(`/api/search?q=${encodeURIComponent(query)}`);
         if (!response.ok) throw new Error('搜索请求失败');
         return response.json();
     }
 
-    showSuggestions(songs) {
-        this.elements.suggestions.innerHTML = songs.length ?
-            this.createSuggestionsHTML(songs) :
-            '<div class="no-results">未找到相关歌曲</div>';
+    showSuggestions(suggestions) {
+        if (!suggestions.length) {
+            this.hideSuggestions();
+            return;
+        }
+        this.elements.suggestions.innerHTML = this.createSuggestionsHTML(suggestions);
         this.elements.suggestions.style.display = 'block';
     }
 
@@ -158,13 +185,14 @@ class SearchManager {
             '<div class="no-results">未找到相关歌曲</div>';
     }
 
-    createSuggestionsHTML(songs) {
-        return songs.map(song => `
-            <div class="suggestion-item" data-song-id="${song.id}">
-                <img src="${song.image_url || '/static/images/default-album.png'}" alt="${song.title}">
+    createSuggestionsHTML(suggestions) {
+        const icons = { song: 'fa-music', artist: 'fa-user', album: 'fa-compact-disc' };
+        return suggestions.map(item => `
+            <div class="suggestion-item" data-type="${item.type}" data-id="${item.id}">
+                <i class="fas ${icons[item.type] || 'fa-search'}"></i>
                 <div class="suggestion-info">
-                    <div class="suggestion-title">${song.title}</div>
-                    <div class="suggestion-artist">${song.artist}</div>
+                    <div class="suggestion-title">${item.text}</div>
+                    <div class="suggestion-artist">${item.subtitle || ''}</div>
                 </div>
             </div>
         `).join('');
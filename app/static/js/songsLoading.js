@@ -1,7 +1,8 @@
 class SongLoader {
     constructor() {
         // 初始化状态变量
-        this.currentPage = 1;
+        this.nextCursor = null;
+        this.loadedCount = 0;
         this.isLoading = false;
         this.hasMore = true;
         this.isExpanded = false;
@@ -94,7 +95,7 @@ class SongLoader {
     };
 
     songElement.innerHTML = `
-        <img src="${escapedSong.image_url}" alt="${escapedSong.name}" 
+        <img src="${escapedSong.thumbnail_url || escapedSong.image_url}" alt="${escapedSong.name}" 
             onerror="this.src='/static/images/default-album.png'">
         <div class="song-info">
             <h4>${escapedSong.name}</h4>
@@ -164,11 +165,19 @@ class SongLoader {
         return JSON.stringify(obj).replace(/[<>]/g, '');
     }
 
+    // 列表返回的收藏状态交给播放器缓存，播放时不再单独查询
+    rememberLikeStatuses(songs) {
+        if (window.player) {
+            window.player.rememberLikeStatuses(songs);
+        }
+    }
+
     // 加载初始歌曲
     async loadInitialSongs() {
         try {
-            const response = await fetch('/api/songs');
-            const songs = await response.json();
+            const response = await fetch('/api/songsLoading?per_page=8&include_liked=1');
+            const data = await response.json();
+            const songs = data.songs;
 
             if (songs && songs.length > 0) {
                 this.container.innerHTML = '';
@@ -177,12 +186,13 @@ class SongLoader {
                     fragment.appendChild(this.createSongElement(song));
                 });
                 this.container.appendChild(fragment);
-                this.updateStatus(songs.length);
+                this.rememberLikeStatuses(songs);
+                this.loadedCount = songs.length;
+                this.updateStatus(this.loadedCount);
 
-                // 检查是否需要显示加载更多按钮
-                const totalSongsResponse = await fetch('/api/songs/total');
-                const { total } = await totalSongsResponse.json();
-                this.hasMore = songs.length < total;
+                // 记录下一页游标，判断是否需要显示加载更多按钮
+                this.nextCursor = data.next_cursor;
+                this.hasMore = data.has_more;
 
                 if (!this.hasMore) {
                     this.loadMoreWrapper.style.display = 'none';
@@ -212,7 +222,11 @@ class SongLoader {
         this.updateButtonState();
 
         try {
-            const response = await fetch(`/api/songsLoading?page=${this.currentPage + 1}&per_page=8`);
+            const params = new URLSearchParams({ per_page: 8, include_liked: 1 });
+            if (this.nextCursor) {
+                params.set('cursor', this.nextCursor);
+            }
+            const response = await fetch(`/api/songsLoading?${params}`);
             const data = await response.json();
 
             if (data.songs && data.songs.length > 0) {
@@ -221,14 +235,16 @@ class SongLoader {
                     fragment.appendChild(this.createSongElement(song));
                 });
                 this.container.appendChild(fragment);
-                this.currentPage++;
-
-                // 更新总数和加载状态
-                this.updateStatus(data.total_loaded, data.total);
+                this.rememberLikeStatuses(data.songs);
+                this.loadedCount += data.songs.length;
+                this.nextCursor = data.next_cursor;
 
                 // 检查是否还有更多歌曲
                 this.hasMore = data.has_more;
 
+                // 更新总数和加载状态
+                this.updateStatus(this.hasMore ? this.loadedCount : data.total, data.total);
+
                 // 如果没有更多歌曲，隐藏相关元素
                 if (!this.hasMore) {
                     this.loadMoreWrapper.style.display = 'none';
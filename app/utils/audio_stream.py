@@ -0,0 +1,157 @@
+# utils/audio_stream.py
+import os
+from datetime import datetime, timezone
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from flask import current_app, request
+from werkzeug.wsgi import wrap_file
+
+from .lru import TTLCache
+
+AUDIO_MIME_TYPES = {
+    'mp3': 'audio/mpeg',
+    'wav': 'audio/wav',
+    'ogg': 'audio/ogg',
+    'm4a': 'audio/mp4'
+}
+
+# song_id -> 音频文件绝对路径
+_path_cache = TTLCache(maxsize=4096, ttl=300)
+
+
+def resolve_song_path(song_id: int) -> Optional[str]:
+    """
+    根据歌曲ID获取音频文件的绝对路径
+
+    结果按歌曲ID缓存，只查询 file_path 一列；文件不存在时返回 None。
+    """
+    path = _path_cache.get(song_id)
+    if path is not None:
+        return path
+
+    from app import db
+    from app.models import Song
+
+    file_path = db.session.query(Song.file_path).filter(Song.id == song_id).scalar()
+    if not file_path:
+        return None
+
+    filename = os.path.basename(file_path)
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'songs', filename)
+    _path_cache.set(song_id, path)
+    return path
+
+
+def forget_song_path(song_id: int) -> None:
+    """文件路径失效后清除缓存"""
+    _path_cache.pop(song_id)
+
+
+def audio_mimetype(filename: str) -> str:
+    """根据文件扩展名确定MIME类型"""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return AUDIO_MIME_TYPES.get(extension, 'application/octet-stream')
+
+
+def make_etag(stat_result: os.stat_result) -> str:
+    """根据文件大小和修改时间生成强 ETag"""
+    return f'{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}'
+
+
+def _requested_range(etag: str, size: int) -> Tuple[Optional[Tuple[int, int]], bool]:
+    """
+    解析 Range / If-Range 请求头
+
+    Returns:
+        ((start, stop), satisfiable)，没有有效 Range 时第一个值为 None
+    """
+    if request.range is None or request.range.units != 'bytes':
+        return None, True
+
+    # If-Range 与当前文件不一致时，按完整文件返回
+    if_range = request.if_range
+    if if_range.etag is not None and if_range.etag != etag:
+        return None, True
+    if if_range.date is not None:
+        return None, True
+
+    byte_range = request.range.range_for_length(size)
+    if byte_range is None:
+        return None, False
+    return byte_range, True
+
+
+def _read_range(file, length: int, chunk_size: int) -> Iterator[bytes]:
+    """从文件当前位置读取 length 字节"""
+    try:
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def build_audio_response(path: str, mimetype: str):
+    """
+    构建支持 Range/206 的音频响应
+
+    - 强 ETag（文件大小 + 修改时间），命中 If-None-Match 时返回 304
+    - 配置 AUDIO_SENDFILE_MODE 为 'x-accel' 或 'x-sendfile' 时由 nginx/apache
+      直接发送文件，应用只返回响应头
+    - 否则当请求范围一直到文件末尾时（播放器拖动进度条的常见请求），
+      使用 wsgi.file_wrapper 发送，gunicorn 等服务器会用 os.sendfile 零拷贝发送
+    """
+    config = current_app.config
+    stat_result = os.stat(path)
+    size = stat_result.st_size
+    etag = make_etag(stat_result)
+    last_modified = datetime.fromtimestamp(stat_result.st_mtime, tz=timezone.utc)
+
+    response = current_app.response_class(mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.accept_ranges = 'bytes'
+    response.cache_control.public = True
+    response.cache_control.max_age = config.get('AUDIO_CACHE_MAX_AGE', 86400)
+
+    if request.if_none_match.contains(etag):
+        response.status_code = 304
+        return response
+
+    sendfile_mode = config.get('AUDIO_SENDFILE_MODE')
+    if sendfile_mode == 'x-accel':
+        # nginx 自己处理 Range 和条件请求
+        prefix = config.get('AUDIO_ACCEL_PREFIX', '/protected/songs').rstrip('/')
+        response.headers['X-Accel-Redirect'] = f'{prefix}/{quote(os.path.basename(path))}'
+        return response
+    if sendfile_mode == 'x-sendfile':
+        response.headers['X-Sendfile'] = path
+        return response
+
+    byte_range, satisfiable = _requested_range(etag, size)
+    if not satisfiable:
+        response.status_code = 416
+        response.headers['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, stop = byte_range if byte_range else (0, size)
+    length = stop - start
+    chunk_size = config.get('AUDIO_STREAM_CHUNK_SIZE', 64 * 1024)
+
+    file = open(path, 'rb')
+    file.seek(start)
+    if stop == size:
+        response.response = wrap_file(request.environ, file, buffer_size=chunk_size)
+    else:
+        response.response = _read_range(file, length, chunk_size)
+    response.direct_passthrough = True
+    response.content_length = length
+
+    if byte_range:
+        response.status_code = 206
+        response.content_range = f'bytes {start}-{stop - 1}/{size}'
+    return response
@@ -0,0 +1,278 @@
+# utils/catalog.py
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional
+
+import redis
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from .lru import TTLCache
+from .redis_client import RedisClient
+
+CATALOG_VERSION_KEY = 'catalog_version'
+
+# 键不存在时用新的起始值创建，否则递增；KEYS: 版本号; ARGV: 起始值
+_BUMP_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCR', KEYS[1])
+end
+redis.call('SET', KEYS[1], ARGV[1])
+return tonumber(ARGV[1])
+"""
+
+# 只修改这些字段不影响歌曲目录的展示内容，不需要升级目录版本
+COUNTER_FIELDS = {'likes_count', 'download_count', 'updated_at'}
+
+_MISS = object()
+
+# 属于歌曲目录的模型，由 init_catalog_events 设置
+_catalog_models = ()
+
+
+def _changed_fields(obj) -> set:
+    """获取对象在本次 flush 中被修改的字段名"""
+    state = inspect(obj)
+    return {attr.key for attr in state.attrs if attr.history.has_changes()}
+
+
+def _touches_catalog(session, catalog_models) -> bool:
+    """判断本次 flush 是否修改了歌曲目录"""
+    for obj in itertools.chain(session.new, session.deleted):
+        if isinstance(obj, catalog_models):
+            return True
+    for obj in session.dirty:
+        if isinstance(obj, catalog_models) and _changed_fields(obj) - COUNTER_FIELDS:
+            return True
+    return False
+
+
+def get_catalog_version() -> str:
+    """
+    获取当前歌曲目录版本号
+
+    版本号保存在 Redis 中，每次目录提交变更后递增；
+    Redis 不可用时退化为根据数据库行数和最后更新时间计算。
+    """
+    client = RedisClient().client
+    if client is not None:
+        try:
+            return _redis_catalog_version(client)
+        except redis.RedisError as e:
+            print(f"Catalog version error: {e}")
+
+    return _database_catalog_version()
+
+
+def _version_seed() -> int:
+    """
+    版本号键的起始值（毫秒时间戳）
+
+    键丢失（FLUSHDB、故障切换、淘汰）后重新创建时不能从 1 开始，
+    否则客户端手里的旧 ETag 会在几次递增后重新变得"有效"。
+    """
+    return int(time.time() * 1000)
+
+
+def _redis_catalog_version(client) -> str:
+    version = client.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # SET NX 保证多个进程只初始化一次
+        client.set(CATALOG_VERSION_KEY, _version_seed(), nx=True)
+        version = client.get(CATALOG_VERSION_KEY)
+    return f'r{version}'
+
+
+def _database_catalog_version() -> str:
+    """根据歌曲、专辑、艺术家表的行数和最后更新时间计算版本号"""
+    from app import db
+    from app.models import Song, Album, Artist
+
+    parts = []
+    for model in (Song, Album, Artist):
+        count, last_updated = db.session.execute(
+            select(func.count(model.id), func.max(model.updated_at))
+        ).one()
+        parts.append(f'{count}.{last_updated.timestamp() if last_updated else 0:.0f}')
+    return 'd' + '-'.join(parts)
+
+
+def bump_catalog_version() -> Optional[int]:
+    """目录发生变化后递增版本号"""
+    client = RedisClient().client
+    if client is None:
+        return None
+    try:
+        return client.eval(_BUMP_SCRIPT, 1, CATALOG_VERSION_KEY, _version_seed())
+    except redis.RedisError as e:
+        print(f"Catalog version error: {e}")
+        return None
+
+
+class CatalogCache:
+    """
+    歌曲目录读缓存
+
+    两级缓存：进程内 LRU（带 TTL）在前，Redis 在后，都未命中时才查询数据库。
+    缓存键带有目录版本号，目录变更提交后版本号递增，旧键自然失效；
+    本进程内的 LRU 同时被直接清空。Redis 不可用时只使用进程内缓存，
+    其他进程的变更最多在 TTL 之后可见。
+    """
+
+    KEY_PREFIX = 'catalog_cache'
+
+    def __init__(self, maxsize: int = 512, local_ttl: int = 30, redis_ttl: int = 600):
+        self.local = TTLCache(maxsize=maxsize, ttl=local_ttl)
+        self.redis_ttl = redis_ttl
+        self._local_generation = 0
+        self._lock = threading.Lock()
+        self.stats = {'local_hits': 0, 'redis_hits': 0, 'misses': 0, 'errors': 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _namespace(self, client) -> str:
+        """当前缓存命名空间，Redis 可用时使用共享的目录版本号"""
+        if client is not None:
+            return _redis_catalog_version(client)
+        return f'l{self._local_generation}'
+
+    def get_or_load(self, name: str, loader: Callable[[], Any], ttl: Optional[int] = None) -> Any:
+        """
+        读取缓存，未命中时调用 loader 并写入缓存
+
+        Args:
+            name: 缓存名（不含版本号），如 "songs:latest:8"
+            loader: 返回可 JSON 序列化数据的加载函数
+            ttl: Redis 中的过期时间（秒），默认使用 redis_ttl
+        """
+        client = RedisClient().client
+        try:
+            namespace = self._namespace(client)
+        except redis.RedisError as e:
+            print(f"Catalog cache error: {e}")
+            self._count('errors')
+            client = None
+            namespace = self._namespace(None)
+
+        key = f'{self.KEY_PREFIX}:{namespace}:{name}'
+        value = self.local.get(key, _MISS)
+        if value is not _MISS:
+            self._count('local_hits')
+            return value
+
+        if client is not None:
+            try:
+                cached = client.get(key)
+                if cached is not None:
+                    value = json.loads(cached)
+                    self.local.set(key, value)
+                    self._count('redis_hits')
+                    return value
+            except redis.RedisError as e:
+                print(f"Catalog cache error: {e}")
+                self._count('errors')
+                client = None
+
+        self._count('misses')
+        value = loader()
+        self.local.set(key, value)
+        if client is not None:
+            try:
+                client.setex(key, ttl or self.redis_ttl, json.dumps(value, ensure_ascii=False))
+            except redis.RedisError as e:
+                print(f"Catalog cache error: {e}")
+                self._count('errors')
+        return value
+
+    def invalidate_local(self) -> None:
+        """清空本进程缓存"""
+        with self._lock:
+            self._local_generation += 1
+        self.local.clear()
+
+    def get_stats(self) -> dict:
+        """命中统计（本进程）"""
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats['local_hits'] + stats['redis_hits'] + stats['misses']
+        stats['hit_rate'] = round((lookups - stats['misses']) / lookups, 4) if lookups else 0.0
+        stats['local_entries'] = len(self.local)
+        stats['pid'] = os.getpid()
+        return stats
+
+
+catalog_cache = CatalogCache()
+
+
+def iter_catalog_rows(yield_per: int = 500) -> Iterator[dict]:
+    """
+    逐条生成歌曲目录数据
+
+    只查询需要的列而不是完整的 ORM 对象，并通过 yield_per 分批读取，
+    目录再大也不会一次性加载到内存中。每首歌可能有多位艺术家，
+    查询结果按歌曲排序后在这里合并成一条记录。
+    """
+    from app import db
+    from app.models import Song, Album, Artist, song_artists
+
+    stmt = (
+        select(
+            Song.id,
+            Song.name,
+            Song.image_url,
+            Song.duration,
+            Song.file_path,
+            Album.name.label('album_name'),
+            Artist.name.label('artist_name'),
+        )
+        .outerjoin(Album, Song.album_id == Album.id)
+        .outerjoin(song_artists, song_artists.c.song_id == Song.id)
+        .outerjoin(Artist, song_artists.c.artist_id == Artist.id)
+        .order_by(Song.created_at.desc(), Song.id.desc())
+        .execution_options(yield_per=yield_per)
+    )
+
+    rows = db.session.execute(stmt)
+    for _, song_rows in itertools.groupby(rows, key=lambda row: row.id):
+        song_rows = list(song_rows)
+        first = song_rows[0]
+        yield {
+            'id': first.id,
+            'name': first.name,
+            'artist': ', '.join(row.artist_name for row in song_rows if row.artist_name),
+            'album': first.album_name or 'Unknown Album',
+            'image_url': first.image_url,
+            'duration': first.duration,
+            'file_path': Song.relative_file_path(first.file_path)
+        }
+
+
+def mark_catalog_changed(session) -> None:
+    """标记会话修改了歌曲目录（用于绕过 ORM flush 的批量 SQL），提交后递增版本号"""
+    session.info['catalog_changed'] = True
+
+
+def _mark_catalog_changed(session, flush_context):
+    if _touches_catalog(session, _catalog_models):
+        mark_catalog_changed(session)
+
+
+def _bump_on_commit(session):
+    if session.info.pop('catalog_changed', False):
+        bump_catalog_version()
+        catalog_cache.invalidate_local()
+
+
+def init_catalog_events(catalog_models) -> None:
+    """注册 SQLAlchemy 事件，目录变更提交后递增版本号"""
+    global _catalog_models
+    _catalog_models = tuple(catalog_models)
+
+    if not event.contains(Session, 'after_flush', _mark_catalog_changed):
+        event.listen(Session, 'after_flush', _mark_catalog_changed)
+        event.listen(Session, 'after_commit', _bump_on_commit)
@@ -0,0 +1,216 @@
+# utils/http_client.py
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class CircuitOpenError(requests.RequestException):
+    """上游主机熔断中，请求被直接拒绝"""
+
+
+class CircuitBreaker:
+    """
+    单个主机的熔断器
+
+    连续失败 failure_threshold 次后熔断 reset_timeout 秒，期间请求直接失败；
+    之后放行一个试探请求，成功则恢复，失败则继续熔断。
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class EndpointStats:
+    """单个上游接口的调用统计"""
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.rejected = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def to_dict(self) -> dict:
+        completed = self.requests - self.rejected
+        return {
+            'requests': self.requests,
+            'failures': self.failures,
+            'rejected': self.rejected,
+            'failure_rate': round(self.failures / self.requests, 4) if self.requests else 0.0,
+            'avg_latency_ms': round(self.total_latency / completed * 1000, 1) if completed else 0.0,
+            'max_latency_ms': round(self.max_latency * 1000, 1)
+        }
+
+
+class UpstreamClient:
+    """
+    访问上游接口（kugou 等）的共享 HTTP 客户端
+
+    - 共享连接池，复用 keep-alive 连接
+    - 默认的连接/读取超时
+    - GET 请求对连接错误和 429/5xx 做有限次数的退避重试
+    - 每个主机一个熔断器
+    - 按接口（主机 + 路径）统计请求数、失败率和耗时
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self):
+        self.connect_timeout = 3.05
+        self.read_timeout = 10
+        self.max_retries = 2
+        self.backoff_factor = 0.3
+        self.pool_maxsize = 16
+        self.breaker_threshold = 5
+        self.breaker_reset = 30
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._stats: Dict[str, EndpointStats] = {}
+        self._lock = threading.Lock()
+        self.session = self._build_session()
+
+    def init_app(self, app):
+        """从应用配置读取超时、重试和熔断参数"""
+        config = app.config
+        self.connect_timeout = config.get('UPSTREAM_CONNECT_TIMEOUT', self.connect_timeout)
+        self.read_timeout = config.get('UPSTREAM_READ_TIMEOUT', self.read_timeout)
+        self.max_retries = config.get('UPSTREAM_MAX_RETRIES', self.max_retries)
+        self.backoff_factor = config.get('UPSTREAM_BACKOFF_FACTOR', self.backoff_factor)
+        self.pool_maxsize = config.get('UPSTREAM_POOL_MAXSIZE', self.pool_maxsize)
+        self.breaker_threshold = config.get('UPSTREAM_BREAKER_THRESHOLD', self.breaker_threshold)
+        self.breaker_reset = config.get('UPSTREAM_BREAKER_RESET', self.breaker_reset)
+        self.session = self._build_session()
+
+    def _build_session(self) -> requests.Session:
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=self.max_retries,
+            status=self.max_retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=self.pool_maxsize, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _breaker(self, host: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+                self._breakers[host] = breaker
+            return breaker
+
+    def _endpoint_stats(self, endpoint: str) -> EndpointStats:
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = EndpointStats()
+            return stats
+
+    def request(self, method: str, url: str, timeout=None, **kwargs) -> requests.Response:
+        """
+        发送请求
+
+        Args:
+            method: HTTP 方法
+            url: 请求地址
+            timeout: (连接超时, 读取超时) 或单个数值，默认使用客户端配置
+
+        Raises:
+            CircuitOpenError: 主机处于熔断状态
+            requests.RequestException: 重试后仍然失败
+        """
+        parts = urlsplit(url)
+        endpoint = f'{parts.netloc}{parts.path}'
+        breaker = self._breaker(parts.netloc)
+        stats = self._endpoint_stats(endpoint)
+
+        if not breaker.allow_request():
+            with self._lock:
+                stats.requests += 1
+                stats.rejected += 1
+            raise CircuitOpenError(f'上游服务熔断中: {parts.netloc}')
+
+        start = time.monotonic()
+        failed = True
+        try:
+            response = self.session.request(
+                method, url,
+                timeout=timeout or (self.connect_timeout, self.read_timeout),
+                **kwargs
+            )
+            failed = response.status_code >= 500
+            return response
+        finally:
+            latency = time.monotonic() - start
+            with self._lock:
+                stats.requests += 1
+                stats.failures += int(failed)
+                stats.total_latency += latency
+                stats.max_latency = max(stats.max_latency, latency)
+            if failed:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def get_stats(self) -> dict:
+        """各接口调用统计和各主机熔断状态"""
+        with self._lock:
+            endpoints = {name: stats.to_dict() for name, stats in self._stats.items()}
+            breakers = dict(self._breakers)
+        return {
+            'endpoints': endpoints,
+            'circuit_breakers': {host: breaker.state for host, breaker in breakers.items()}
+        }
+
+
+upstream = UpstreamClient()
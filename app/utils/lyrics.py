@@ -0,0 +1,165 @@
+# utils/lyrics.py
+import re
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+from .lru import TTLCache
+
+# 行首的 [..] 标签；时间标签为 [mm:ss]、[mm:ss.x]、[mm:ss.xx]、[mm:ss.xxx]（小数点也可以是冒号）
+_TAG = re.compile(r'\[([^\]]*)\]')
+_TIME = re.compile(r'(\d+):(\d{1,2})(?:[.:](\d{1,3}))?')
+_METADATA = re.compile(r'([A-Za-z]\w*):(.*)', re.S)
+
+
+def _tag_ms(tag: str) -> Optional[int]:
+    """时间标签转换为毫秒，不是时间标签时返回 None"""
+    match = _TIME.fullmatch(tag)
+    if match is None:
+        return None
+    minutes, seconds, fraction = match.groups()
+    ms = (int(minutes) * 60 + int(seconds)) * 1000
+    if fraction:
+        ms += int(fraction.ljust(3, '0'))
+    return ms
+
+
+def parse_lrc(text: str) -> Dict[str, Any]:
+    """
+    解析 LRC 歌词
+
+    - 支持 \n、\r\n 换行，一行多个时间标签，最多 3 位小数（毫秒）
+    - [offset:毫秒] 整体调整时间（正数表示歌词提前），结果不小于 0
+    - 相同时间的歌词以最后一行为准，没有文字的时间行被忽略
+
+    Returns:
+        Dict: {'metadata': {标签: 值}, 'times': [毫秒], 'lines': [歌词]}，
+        times 与 lines 一一对应并按时间排序
+    """
+    metadata = {}
+    timed = {}
+    tag_match = _TAG.match
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line.startswith('['):
+            continue
+
+        stamps = []
+        position = 0
+        match = tag_match(line)
+        while match is not None:
+            ms = _tag_ms(match.group(1))
+            if ms is None:
+                break
+            stamps.append(ms)
+            position = match.end()
+            match = tag_match(line, position)
+
+        if not stamps:
+            # 元数据行，如 [ti:标题]、[offset:500]
+            meta_match = _METADATA.fullmatch(match.group(1)) if match else None
+            if meta_match:
+                key, value = meta_match.groups()
+                metadata[key] = value.strip()
+            continue
+
+        lyric_text = line[position:].strip()
+        if lyric_text:
+            for ms in stamps:
+                timed[ms] = lyric_text
+
+    offset = _offset(metadata.get('offset'))
+    times = sorted(timed)
+    return {
+        'metadata': metadata,
+        'times': [max(ms - offset, 0) for ms in times],
+        'lines': [timed[ms] for ms in times]
+    }
+
+
+def _offset(value: Optional[str]) -> int:
+    try:
+        return int(value) if value else 0
+    except ValueError:
+        return 0
+
+
+def _timeline_from_legacy(data: Dict[str, Any]) -> Dict[str, Any]:
+    """转换旧的 {'metadata': ..., 'lyrics': {'mm:ss.xx': 歌词}} 格式"""
+    timed = {}
+    for timestamp, lyric_text in (data.get('lyrics') or {}).items():
+        minutes, seconds = timestamp.split(':')
+        timed[int(minutes) * 60000 + round(float(seconds) * 1000)] = lyric_text
+    times = sorted(timed)
+    return {
+        'metadata': data.get('metadata') or {},
+        'times': times,
+        'lines': [timed[ms] for ms in times]
+    }
+
+
+def build_timeline(lyrics) -> Optional[Dict[str, Any]]:
+    """根据 Song.lyrics 中保存的原始歌词（LRC 文本或旧的字典格式）生成时间轴"""
+    if isinstance(lyrics, str) and lyrics.strip():
+        return parse_lrc(lyrics)
+    if isinstance(lyrics, dict):
+        return _timeline_from_legacy(lyrics)
+    return None
+
+
+# song_id -> 歌词时间轴，供歌词窗口查询使用
+_timeline_cache = TTLCache(maxsize=1024, ttl=300)
+
+
+def load_song_timeline(song_id: int) -> Optional[Dict[str, Any]]:
+    """
+    获取歌曲的歌词时间轴，结果按歌曲ID缓存在进程内
+
+    Returns:
+        Optional[Dict]: 歌曲不存在时返回 None；没有歌词时 times 和 lines 为空
+    """
+    timeline = _timeline_cache.get(song_id)
+    if timeline is not None:
+        return timeline
+
+    from app import db
+    from app.models import Song
+
+    row = db.session.query(Song.lyrics_timeline).filter(Song.id == song_id).first()
+    if row is None:
+        return None
+
+    timeline = row.lyrics_timeline
+    if timeline is None:
+        # 尚未回填时间轴的旧数据，临时解析
+        timeline = build_timeline(db.session.query(Song.lyrics).filter(Song.id == song_id).scalar())
+    timeline = timeline or {'metadata': {}, 'times': [], 'lines': []}
+    _timeline_cache.set(song_id, timeline)
+    return timeline
+
+
+def forget_song_timeline(song_id: int) -> None:
+    """歌词修改后清除本进程的缓存（其他进程在缓存过期后更新）"""
+    _timeline_cache.pop(song_id)
+
+
+def lyric_window(times: List[int], position_ms: int, count: int,
+                 until_ms: Optional[int] = None) -> Tuple[int, int, int]:
+    """
+    用二分查找定位播放位置对应的歌词行
+
+    Args:
+        times: 按时间排序的歌词时间（毫秒）
+        position_ms: 播放位置（毫秒）
+        count: 当前行之后最多返回的行数
+        until_ms: 给定时返回到该位置为止的所有行（仍不超过 count 行）
+
+    Returns:
+        Tuple[int, int, int]: (当前行下标，还没到第一行时为 -1, 窗口起始下标, 窗口结束下标（不含）)
+    """
+    active = bisect_right(times, position_ms) - 1
+    start = max(active, 0)
+    stop = start + 1 + count
+    if until_ms is not None:
+        stop = min(stop, max(bisect_right(times, until_ms), start + 1))
+    return active, start, min(stop, len(times))
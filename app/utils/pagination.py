@@ -0,0 +1,124 @@
+# utils/pagination.py
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple
+
+import redis
+from sqlalchemy import and_, or_
+
+from .redis_client import RedisClient
+
+
+class InvalidCursor(ValueError):
+    """游标格式错误"""
+
+
+def encode_cursor(created_at: datetime, item_id: int) -> str:
+    """将 (created_at, id) 编码为不透明的游标字符串"""
+    payload = json.dumps([created_at.isoformat(), item_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析游标字符串，格式错误时抛出 InvalidCursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise InvalidCursor(f'无效的游标: {cursor}') from e
+
+
+class CursorPage:
+    """一页游标分页结果"""
+
+    def __init__(self, items: List[Any], next_cursor: Optional[str]):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_more(self) -> bool:
+        return self.next_cursor is not None
+
+
+def keyset_paginate(query, created_column, id_column, cursor: Optional[str] = None, per_page: int = 20,
+                    row_key: Optional[Callable[[Any], Tuple[datetime, int]]] = None,
+                    row_item: Optional[Callable[[Any], Any]] = None) -> CursorPage:
+    """
+    基于 (created_at, id) 的倒序游标分页
+
+    不使用 OFFSET，每一页都通过复合索引直接定位到上一页最后一行之后，
+    因此翻到第几页的耗时都是一样的。
+
+    Args:
+        query: 待分页的查询（不要预先排序）
+        created_column: 排序用的时间列
+        id_column: 用于打破时间并列的主键列
+        cursor: 上一页返回的 next_cursor，None 表示第一页
+        per_page: 每页数量
+        row_key: 从结果行取出 (created_at, id)，默认读取 row.created_at / row.id
+        row_item: 从结果行取出返回给调用方的对象，默认返回行本身
+
+    Returns:
+        CursorPage: 当前页数据以及下一页游标
+    """
+    row_key = row_key or (lambda row: (row.created_at, row.id))
+    row_item = row_item or (lambda row: row)
+
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor)
+        # 前面的 created <= 上次的值 是索引上的范围条件，单独的 OR 条件会让部分数据库放弃索引
+        query = query.filter(and_(
+            created_column <= last_created_at,
+            or_(created_column < last_created_at, id_column < last_id)
+        ))
+
+    # 多取一行用来判断是否还有下一页，避免额外的 COUNT 查询
+    rows = query.order_by(created_column.desc(), id_column.desc()).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor(*row_key(rows[-1]))
+
+    return CursorPage([row_item(row) for row in rows], next_cursor)
+
+
+def cached_count(cache_key: str, count_func: Callable[[], int], ttl: int = 60) -> int:
+    """
+    获取缓存的总数（近似值）
+
+    总数只用于展示"已加载 x / y"，允许在 ttl 秒内不精确；
+    Redis 不可用时直接执行 count_func。
+    """
+    client = RedisClient().client
+    if client is None:
+        return count_func()
+
+    try:
+        cached = client.get(cache_key)
+        if cached is not None:
+            return int(cached)
+    except redis.RedisError as e:
+        print(f"Count cache error: {e}")
+        return count_func()
+
+    total = count_func()
+    try:
+        client.setex(cache_key, ttl, total)
+    except redis.RedisError as e:
+        print(f"Count cache error: {e}")
+    return total
+
+
+def invalidate_count(cache_key: str) -> None:
+    """数据变化后清除缓存的总数"""
+    client = RedisClient().client
+    if client is None:
+        return
+    try:
+        client.delete(cache_key)
+    except redis.RedisError as e:
+        print(f"Count cache error: {e}")
@@ -1,8 +1,6 @@
 # utils/redis_client.py
 from flask import current_app
 import redis
-from functools import wraps
-import time
 
 
 class RedisClient:
@@ -37,44 +35,10 @@ class RedisClient:
         return self.client
 
 
-class RateLimit:
-    """速率限制装饰器"""
-
-    def __init__(self, key_prefix, limit=5, period=60):
-        self.key_prefix = key_prefix
-        self.limit = limit
-        self.period = period
-        self.redis_client = RedisClient()
-
-    def __call__(self, f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            try:
-                client = self.redis_client.get_client()
-                key = f"{self.key_prefix}:{time.time() // self.period}"
-
-                # 使用管道来保证操作的原子性
-                pipe = client.pipeline()
-                pipe.incr(key)
-                pipe.expire(key, self.period)
-                current_requests = pipe.execute()[0]
-
-                if current_requests > self.limit:
-                    return {'error': '请求过于频繁，请稍后再试'}, 429
-
-                return f(*args, **kwargs)
-            except Exception as e:
-                print(f"Rate limit error: {e}")
-                # 如果 Redis 出错，允许请求通过
-                return f(*args, **kwargs)
-
-        return decorated_function
-
-
 # Redis 键的前缀常量
 class RedisKeys:
     # 验证码相关
-    VERIFICATION_CODE = "verification_code:{email}:{purpose}"  # 验证码存储
+    VERIFICATION_CODE = "verification_code:{email}:{purpose}"  # 验证码哈希（见 app.verification_codes）
     VERIFICATION_SEND_LIMIT = "verification_send_limit:{email}"  # 发送频率限制
 
     # 登录相关
@@ -115,18 +79,6 @@ class RedisHelper:
     def __init__(self):
         self.redis_client = RedisClient()
 
-    def set_verification_code(self, email, code, purpose='login', expire=300):
-        """设置验证码，默认5分钟过期"""
-        client = self.redis_client.get_client()
-        key = RedisKeys.get_verification_code_key(email, purpose)
-        client.setex(key, expire, code)
-
-    def get_verification_code(self, email, purpose='login'):
-        """获取验证码"""
-        client = self.redis_client.get_client()
-        key = RedisKeys.get_verification_code_key(email, purpose)
-        return client.get(key)
-
     def check_send_limit(self, email, limit_seconds=60):
         """检查发送频率限制"""
         client = self.redis_client.get_client()
@@ -0,0 +1,163 @@
+# utils/search_index.py
+import logging
+import math
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Set, Tuple
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:  # 未安装 pypinyin 时不生成拼音索引（见 README 中的可选依赖）
+    lazy_pinyin = None
+
+logger = logging.getLogger(__name__)
+
+_pinyin_warned = False
+
+# 连续的中日韩文字，或连续的字母数字
+_TOKEN_PATTERN = re.compile(r'([㐀-䶿一-鿿豈-﫿]+)|([0-9a-z]+)')
+
+
+def normalize(text: str) -> str:
+    """全角转半角、统一大小写"""
+    return unicodedata.normalize('NFKC', text or '').casefold()
+
+
+def warn_if_pinyin_missing() -> None:
+    """未安装 pypinyin 时记录一次警告（构建索引时调用）"""
+    global _pinyin_warned
+    if lazy_pinyin is None and not _pinyin_warned:
+        _pinyin_warned = True
+        logger.warning('未安装 pypinyin，搜索和输入补全不支持拼音及首字母查询')
+
+
+def pinyin_keys(run: str) -> List[str]:
+    """中文的拼音索引词：每个音节、完整拼音、首字母（如 周杰伦 -> zhou jie lun zhoujielun zjl）"""
+    if lazy_pinyin is None:
+        return []
+    syllables = [syllable for syllable in lazy_pinyin(run) if syllable.isalpha()]
+    if not syllables:
+        return []
+    return syllables + [''.join(syllables), ''.join(syllable[0] for syllable in syllables)]
+
+
+def index_terms(text: str) -> Set[str]:
+    """文档的索引词：中文按单字和相邻两字切分并附带拼音，其他文字按单词切分"""
+    terms = set()
+    for cjk, word in _TOKEN_PATTERN.findall(normalize(text)):
+        if word:
+            terms.add(word)
+            continue
+        terms.update(cjk)
+        terms.update(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        terms.update(pinyin_keys(cjk))
+    return terms
+
+
+def query_terms(text: str) -> Set[str]:
+    """查询词：中文按相邻两字切分（单个字时用单字），其他文字按单词切分"""
+    terms = set()
+    for cjk, word in _TOKEN_PATTERN.findall(normalize(text)):
+        if word:
+            terms.add(word)
+        elif len(cjk) == 1:
+            terms.add(cjk)
+        else:
+            terms.update(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    return terms
+
+
+class SearchIndex:
+    """
+    线程安全的进程内倒排索引
+
+    每个文档由若干字段组成（如歌曲名、艺术家、专辑），字段有不同的权重；
+    查询时要求所有查询词都命中，按 idf * 字段权重排序。
+    """
+
+    def __init__(self, field_weights: Dict[str, float]):
+        self.field_weights = field_weights
+        # 索引词 -> {文档ID: 命中字段的最大权重}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # 文档ID -> (索引词, 规范化后的第一个字段)
+        self._documents: Dict[int, Tuple[Tuple[str, ...], str]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self._documents
+
+    def add(self, doc_id: int, fields: Dict[str, str]) -> None:
+        """添加或替换文档"""
+        weights = {}
+        for field, text in fields.items():
+            weight = self.field_weights.get(field, 1)
+            for term in index_terms(text):
+                weights[term] = max(weights.get(term, 0), weight)
+        primary = normalize(next(iter(fields.values()), ''))
+
+        with self._lock:
+            self._remove(doc_id)
+            for term, weight in weights.items():
+                self._postings.setdefault(term, {})[doc_id] = weight
+            self._documents[doc_id] = (tuple(weights), primary)
+
+    def remove(self, doc_id: int) -> None:
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: int) -> None:
+        document = self._documents.pop(doc_id, None)
+        if document is None:
+            return
+        for term in document[0]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def replace_all(self, documents: Iterable[Tuple[int, Dict[str, str]]]) -> None:
+        """用新文档集合替换整个索引（构建完成后一次性切换）"""
+        fresh = SearchIndex(self.field_weights)
+        for doc_id, fields in documents:
+            fresh.add(doc_id, fields)
+        with self._lock:
+            self._postings, self._documents = fresh._postings, fresh._documents
+
+    def search(self, query: str, limit: int = 20) -> List[int]:
+        """
+        搜索文档
+
+        Returns:
+            List[int]: 按相关度从高到低的文档ID
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+        normalized = normalize(query).strip()
+
+        with self._lock:
+            postings = [self._postings.get(term) for term in terms]
+            if not all(postings):
+                return []
+            # 从最短的倒排表开始求交集
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    return []
+
+            total = len(self._documents)
+            scores = {}
+            for doc_id in candidates:
+                score = sum(posting[doc_id] * math.log(1 + total / len(posting)) for posting in postings)
+                if self._documents[doc_id][1] == normalized:
+                    score *= 2  # 歌曲名完全匹配
+                scores[doc_id] = score
+
+        return sorted(scores, key=lambda doc_id: (-scores[doc_id], -doc_id))[:limit]
@@ -0,0 +1,194 @@
+# utils/song_storage.py
+import hashlib
+import itertools
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 上没有 flock，断点续传文件不加锁，每次下载使用独立的临时文件
+    fcntl = None
+
+STATIC_DIR = Path('app/static')
+SONGS_DIR = STATIC_DIR / 'songs'
+# 按内容哈希存储的音频文件，songs/ 下的文件是指向这里的硬链接
+OBJECTS_DIR = SONGS_DIR / '.objects'
+
+
+class HashingWriter:
+    """
+    写入临时文件的同时计算 SHA-256
+
+    指定 path 时用作断点续传的 .part 文件：已有内容会先读入哈希，之后的数据追加写入。
+    写入期间持有 .part 文件的排他锁（直到 release）；其他下载正在使用同一个 .part 文件时，
+    改用独立的临时文件，不续传。
+    """
+
+    def __init__(self, path: Optional[Path] = None, directory: Path = SONGS_DIR, buffer_size: int = 1024 * 1024):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self._lock_fd = _lock_partial(Path(path)) if path is not None else None
+        if self._lock_fd is None:
+            fd, path = tempfile.mkstemp(dir=directory, suffix='.part')
+            self.path = Path(path)
+            self.file = os.fdopen(fd, 'wb', buffering=buffer_size)
+        else:
+            self.path = Path(path)
+            if self.path.exists():
+                with open(self.path, 'rb') as existing:
+                    for block in iter(lambda: existing.read(buffer_size), b''):
+                        self.hash.update(block)
+                        self.size += len(block)
+            self.file = open(self.path, 'ab', buffering=buffer_size)
+
+    def write(self, chunk: bytes) -> None:
+        self.file.write(chunk)
+        self.hash.update(chunk)
+        self.size += len(chunk)
+
+    def truncate(self) -> None:
+        """丢弃已写入的内容，从头开始"""
+        self.file.seek(0)
+        self.file.truncate()
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+    def discard(self) -> None:
+        self.file.close()
+        self.path.unlink(missing_ok=True)
+        self.release()
+
+    def release(self) -> None:
+        """释放 .part 文件的锁（文件已移走或删除之后调用）"""
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    @property
+    def hexdigest(self) -> str:
+        return self.hash.hexdigest()
+
+
+def partial_path(key: str) -> Path:
+    """断点续传使用的 .part 文件路径，同一首歌的多次下载使用同一个文件（由 HashingWriter 加锁）"""
+    safe_key = ''.join(c for c in key if c.isalnum() or c in ('-', '_'))
+    return SONGS_DIR / f'.{safe_key}.part'
+
+
+def _lock_partial(path: Path) -> Optional[int]:
+    """
+    以非阻塞方式锁定 .part 文件，返回持有锁的文件描述符；已被其他下载锁定时返回 None
+
+    .part 文件下载完成后会被移走，加锁之后确认路径仍指向同一个文件，否则重试，
+    避免锁住已经移走的旧文件。
+    """
+    if fcntl is None:
+        return None
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        try:
+            if os.path.samestat(os.fstat(fd), os.stat(path)):
+                return fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+
+
+def object_path(content_hash: str, suffix: str = '.mp3') -> Path:
+    """内容哈希对应的存储路径"""
+    return OBJECTS_DIR / content_hash[:2] / f'{content_hash}{suffix}'
+
+
+def _link_exclusive(source: Path, target: Path) -> None:
+    """
+    让 target 指向 source 的内容，target 已存在时抛出 FileExistsError，不覆盖已有文件
+
+    优先使用硬链接（不占用额外磁盘），文件系统不支持时退化为复制（同样以独占方式创建）。
+    """
+    try:
+        os.link(source, target)
+        return
+    except FileExistsError:
+        raise
+    except OSError:
+        pass
+
+    with open(source, 'rb') as src, open(target, 'xb') as dst:
+        try:
+            shutil.copyfileobj(src, dst)
+        except BaseException:
+            dst.close()
+            target.unlink(missing_ok=True)
+            raise
+
+
+def _same_file(path: Path, content_hash: str) -> bool:
+    """判断已有文件是否就是该哈希对应的对象"""
+    stored = object_path(content_hash, path.suffix)
+    try:
+        return os.path.samefile(path, stored)
+    except OSError:
+        return False
+
+
+def commit_song_file(writer: HashingWriter, safe_name: str, suffix: str = '.mp3') -> Path:
+    """
+    将下载完成的临时文件存入内容寻址存储，并在 songs/ 下创建可读的文件名
+
+    - 相同内容只保存一份：对象已存在时直接丢弃临时文件
+    - 文件名已被其他内容占用时，在文件名后加哈希前缀（仍冲突时再加序号），不覆盖已有文件；
+      文件名以独占方式创建，并发下载同名歌曲也不会互相覆盖
+
+    Returns:
+        Path: songs/ 下的文件路径
+    """
+    writer.close()
+    content_hash = writer.hexdigest
+    stored = object_path(content_hash, suffix)
+    stored.parent.mkdir(parents=True, exist_ok=True)
+
+    try:
+        # 对象已存在时不覆盖，同一内容始终只有一个 inode
+        os.link(writer.path, stored)
+    except FileExistsError:
+        pass
+    except OSError:
+        if not stored.exists():
+            os.replace(writer.path, stored)
+    writer.path.unlink(missing_ok=True)
+    writer.release()
+
+    for attempt in itertools.count():
+        name = safe_name if attempt == 0 else f'{safe_name}-{content_hash[:8]}'
+        if attempt > 1:
+            name = f'{name}-{attempt}'
+        target = SONGS_DIR / f'{name}{suffix}'
+        try:
+            _link_exclusive(stored, target)
+            return target
+        except FileExistsError:
+            if _same_file(target, content_hash):
+                return target
+
+
+def existing_song_file(file_path: Optional[str]) -> Optional[Path]:
+    """歌曲记录中的文件（相对于 static 目录）存在时返回其路径"""
+    if not file_path:
+        return None
+    path = STATIC_DIR / file_path
+    return path if path.is_file() else None
@@ -0,0 +1,218 @@
+# utils/suggest_index.py
+import bisect
+import heapq
+import json
+import os
+import re
+import tempfile
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .search_index import lazy_pinyin, normalize
+
+_CJK_PATTERN = re.compile(r'[㐀-䶿一-鿿豈-﫿]')
+_NON_ALNUM = re.compile(r'[^0-9a-z㐀-䶿一-鿿豈-﫿]+')
+# 比任何字符都大，prefix + _MAX_CHAR 是前缀范围的上界
+_MAX_CHAR = '\U0010ffff'
+
+
+def suggestion_keys(text: str) -> List[str]:
+    """
+    补全的前缀键：完整名称、去掉空格的名称、从每个单词开始的后缀，
+    含中文时附带完整拼音和首字母（如 七里香 -> qilixiang、qlx）
+    """
+    normalized = ' '.join(normalize(text).split())
+    if not normalized:
+        return []
+    keys = {normalized, normalized.replace(' ', '')}
+    for match in re.finditer(r' (?=\S)', normalized):
+        keys.add(normalized[match.end():])
+
+    if lazy_pinyin is not None and _CJK_PATTERN.search(normalized):
+        parts = [_NON_ALNUM.sub('', part) for part in lazy_pinyin(normalized)]
+        parts = [part for part in parts if part]
+        if parts:
+            keys.add(''.join(parts))
+            keys.add(''.join(part[0] for part in parts))
+    return sorted(keys)
+
+
+class PrefixIndex:
+    """
+    有序数组上的前缀查找
+
+    keys 有序，前缀的所有匹配是一段连续区间，用 bisect 定位；
+    匹配数超过 scan_limit 的前缀在构建时预先算好前 top_k 个结果，查询不需要扫描大区间。
+    scores 为 引用 -> 分数 的映射（只用到 get）。
+    """
+
+    def __init__(self, keys: List[str], refs: List[str], scores,
+                 top_k: int = 20, scan_limit: int = 256):
+        self.keys = keys
+        self.refs = refs
+        self.top_k = top_k
+        self.scan_limit = scan_limit
+        self._top: Dict[str, List[str]] = {}
+        self._precompute(scores)
+
+    @classmethod
+    def build(cls, pairs: Iterable[Tuple[str, str]], scores, **kwargs) -> 'PrefixIndex':
+        pairs = sorted(set(pairs))
+        return cls([key for key, _ in pairs], [ref for _, ref in pairs], scores, **kwargs)
+
+    def pairs(self) -> List[Tuple[str, str]]:
+        return list(zip(self.keys, self.refs))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _range(self, prefix: str, lo: int = 0, hi: Optional[int] = None) -> Tuple[int, int]:
+        hi = len(self.keys) if hi is None else hi
+        start = bisect.bisect_left(self.keys, prefix, lo, hi)
+        return start, bisect.bisect_left(self.keys, prefix + _MAX_CHAR, start, hi)
+
+    def _best(self, lo: int, hi: int, scores, k: int) -> List[str]:
+        return heapq.nlargest(k, set(self.refs[lo:hi]), key=lambda ref: (scores.get(ref, 0), ref))
+
+    def _precompute(self, scores) -> None:
+        """从短到长找出匹配数超过 scan_limit 的前缀，记录其前 top_k 个结果"""
+        stack = [('', 0, len(self.keys))]
+        while stack:
+            prefix, lo, hi = stack.pop()
+            if hi - lo <= self.scan_limit:
+                continue
+            if prefix:
+                self._top[prefix] = self._best(lo, hi, scores, self.top_k)
+            # 按下一个字符划分子区间
+            depth = len(prefix)
+            i = lo
+            while i < hi:
+                key = self.keys[i]
+                if len(key) <= depth:
+                    i += 1
+                    continue
+                child = key[:depth + 1]
+                child_lo, child_hi = self._range(child, i, hi)
+                stack.append((child, child_lo, child_hi))
+                i = child_hi
+
+    def lookup(self, prefix: str, scores, k: int) -> List[str]:
+        """以 prefix 开头的键对应的前 k 个结果（按分数从高到低）"""
+        if k <= self.top_k and prefix in self._top:
+            return self._top[prefix][:k]
+        lo, hi = self._range(prefix)
+        return self._best(lo, hi, scores, k) if hi > lo else []
+
+
+class _ScoreView:
+    """按引用读取条目分数，不复制整个分数字典"""
+
+    def __init__(self, entries: Dict[str, dict]):
+        self._entries = entries
+
+    def get(self, ref: str, default: float = 0) -> float:
+        entry = self._entries.get(ref)
+        return entry['score'] if entry is not None else default
+
+
+class SuggestIndex:
+    """
+    输入补全索引
+
+    entries 为 引用 -> {'type', 'text', 'subtitle', 'id', 'score'}；
+    新增的条目先放进小的增量索引，超过 merge_threshold 后合并进主索引。
+    改名或删除的条目在主索引中的键已经过时，查询时忽略它们在主索引中的匹配，合并时丢弃。
+    """
+
+    def __init__(self, entries: Dict[str, dict], main: PrefixIndex, merge_threshold: int = 2000):
+        self.entries = entries
+        self.merge_threshold = merge_threshold
+        self._main = main
+        self._delta = PrefixIndex([], [], {})
+        # 主索引中的键已经过时的引用，当前的键在增量索引中
+        self._stale = frozenset()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, entries: Dict[str, dict], **kwargs) -> 'SuggestIndex':
+        pairs = ((key, ref) for ref, entry in entries.items() for key in suggestion_keys(entry['text']))
+        return cls(entries, PrefixIndex.build(pairs, _ScoreView(entries)), **kwargs)
+
+    def add(self, entries: Dict[str, dict], removed: Iterable[str] = ()) -> None:
+        """添加或更新条目，改名的条目按新名称重新建键；删除 removed 中的条目"""
+        with self._lock:
+            merged = dict(self.entries, **entries)
+            rekeyed = {ref for ref, entry in entries.items()
+                       if ref in self.entries and self.entries[ref]['text'] != entry['text']}
+            for ref in removed:
+                if merged.pop(ref, None) is not None:
+                    rekeyed.add(ref)
+            pairs = [(key, ref) for key, ref in self._delta.pairs() if ref not in rekeyed] + [
+                (key, ref) for ref, entry in entries.items() if ref in merged for key in suggestion_keys(entry['text'])
+            ]
+            stale = self._stale | rekeyed
+            if len(pairs) > self.merge_threshold:
+                main_pairs = [(key, ref) for key, ref in self._main.pairs() if ref not in stale]
+                self._main = PrefixIndex.build(main_pairs + pairs, _ScoreView(merged))
+                self._delta = PrefixIndex([], [], {})
+                self._stale = frozenset()
+            else:
+                self._delta = PrefixIndex.build(pairs, _ScoreView(merged))
+                self._stale = frozenset(stale)
+            self.entries = merged
+
+    def suggest(self, query: str, k: int = 8) -> List[dict]:
+        """返回以 query 开头的前 k 个补全（按分数从高到低）"""
+        normalized = ' '.join(normalize(query).split())
+        if not normalized:
+            return []
+
+        main, delta, entries, stale = self._main, self._delta, self.entries, self._stale
+        scores = _ScoreView(entries)
+        refs = set()
+        for prefix in {normalized, normalized.replace(' ', '')}:
+            # 多取 len(stale) 个，去掉过时的匹配后仍有 k 个
+            refs.update(ref for ref in main.lookup(prefix, scores, k + len(stale)) if ref not in stale)
+            if len(delta):
+                refs.update(delta.lookup(prefix, scores, k))
+        best = heapq.nlargest(k, (ref for ref in refs if ref in entries), key=lambda ref: (scores.get(ref), ref))
+        return [dict(entries[ref], ref=ref) for ref in best]
+
+    def to_snapshot(self) -> dict:
+        with self._lock:
+            main_pairs = [(key, ref) for key, ref in self._main.pairs() if ref not in self._stale]
+            pairs = sorted(set(main_pairs + self._delta.pairs()))
+            return {
+                'entries': self.entries,
+                'keys': [key for key, _ in pairs],
+                'refs': [ref for _, ref in pairs]
+            }
+
+    @classmethod
+    def from_snapshot(cls, data: dict, **kwargs) -> 'SuggestIndex':
+        entries = data['entries']
+        return cls(entries, PrefixIndex(data['keys'], data['refs'], _ScoreView(entries)), **kwargs)
+
+
+def write_snapshot(index: SuggestIndex, path: str, meta: dict) -> None:
+    """原子地写入快照文件（先写临时文件再 rename）"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(dict(index.to_snapshot(), meta=meta), f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+def read_snapshot(path: str) -> Optional[Tuple[SuggestIndex, dict]]:
+    """读取快照，文件不存在或损坏时返回 None"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return SuggestIndex.from_snapshot(data), data.get('meta', {})
+    except (OSError, ValueError, KeyError):
+        return None
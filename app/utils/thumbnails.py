@@ -0,0 +1,52 @@
+# utils/thumbnails.py
+import os
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+try:
+    from PIL import Image
+except ImportError:  # 未安装 Pillow 时只保存原图，不生成缩略图（见 README 中的可选依赖）
+    Image = None
+
+FORMAT_SUFFIXES = {
+    'webp': '.webp',
+    'jpeg': '.jpg'
+}
+
+
+def thumbnails_available() -> bool:
+    """是否安装了 Pillow"""
+    return Image is not None
+
+
+def make_thumbnails(source: str, sizes: Sequence[int], formats: Sequence[str],
+                    quality: int = 80) -> Optional[Dict[str, Dict[str, str]]]:
+    """
+    为图片生成多种尺寸、多种格式的缩略图，保存在原图旁边
+
+    只依赖文件路径，可以在进程池中执行；已存在的缩略图不会重新生成。
+
+    Returns:
+        Optional[Dict]: {尺寸: {格式: 缩略图路径}}；未安装 Pillow 时返回 None，
+        调用方不记录缩略图，安装后仍会重试
+    """
+    if Image is None:
+        return None
+
+    source = Path(source)
+    thumbnails = {}
+    with Image.open(source) as image:
+        image = image.convert('RGB')
+        for size in sizes:
+            resized = None
+            for fmt in formats:
+                target = source.with_name(f'{source.stem}_{size}{FORMAT_SUFFIXES[fmt]}')
+                if not target.exists():
+                    if resized is None:
+                        resized = image.copy()
+                        resized.thumbnail((size, size), Image.LANCZOS)
+                    temp = target.with_name(f'.{target.name}.{os.getpid()}.tmp')
+                    resized.save(temp, fmt.upper(), quality=quality)
+                    os.replace(temp, target)
+                thumbnails.setdefault(str(size), {})[fmt] = str(target)
+    return thumbnails
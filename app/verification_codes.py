@@ -0,0 +1,221 @@
+# app/verification_codes.py
+
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+import click
+import redis
+from flask import current_app
+from sqlalchemy import delete
+
+from app import db
+from app.models import VerificationCode
+from app.utils.redis_client import RedisClient, RedisKeys
+
+logger = logging.getLogger(__name__)
+
+# 验证码保存在哈希 verification_code:{email}:{purpose} 中（code, attempts, created_at），
+# 过期由 Redis 的 TTL 处理
+
+# KEYS: 验证码哈希; ARGV: 当前时间(秒), 验证码, 有效期(秒), 冷却时间(秒)
+# 返回 {1, 0} 表示已生成；{0, 剩余冷却秒数} 表示仍在冷却中
+_ISSUE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cooldown = tonumber(ARGV[4])
+local created = tonumber(redis.call('HGET', KEYS[1], 'created_at'))
+if created and now - created < cooldown then
+    return {0, cooldown - (now - created)}
+end
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], 'code', ARGV[2], 'attempts', 0, 'created_at', ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return {1, 0}
+"""
+
+# KEYS: 验证码哈希; ARGV: 提交的验证码, 最大尝试次数, 验证成功后是否删除(1/0)
+# 返回 CHECK_* 之一
+_CHECK_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'code', 'attempts')
+if not state[1] then
+    return 0
+end
+if tonumber(state[2]) >= tonumber(ARGV[2]) then
+    return 1
+end
+redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+if state[1] ~= ARGV[1] then
+    return 2
+end
+if ARGV[3] == '1' then
+    redis.call('DEL', KEYS[1])
+end
+return 3
+"""
+
+CHECK_MISSING, CHECK_TOO_MANY, CHECK_WRONG, CHECK_OK = range(4)
+
+_CHECK_MESSAGES = {
+    CHECK_MISSING: '验证码不存在或已过期',
+    CHECK_TOO_MANY: '尝试次数过多，请重新获取验证码',
+    CHECK_WRONG: '验证码错误',
+    CHECK_OK: '验证成功',
+}
+
+
+def _settings() -> Tuple[int, int, int]:
+    """(有效期, 冷却时间, 最大尝试次数)"""
+    config = current_app.config
+    return (config.get('VERIFICATION_CODE_EXPIRE', 600), config.get('VERIFICATION_SEND_LIMIT', 120),
+            config.get('VERIFICATION_CODE_MAX_ATTEMPTS', 5))
+
+
+def _latest_row(email: str, purpose: str, lock: bool = False) -> Optional[VerificationCode]:
+    """最新的可校验验证码（不含审计记录），lock 时加行锁直到事务结束"""
+    query = VerificationCode.query.filter_by(email=email, purpose=purpose, audit=False) \
+        .order_by(VerificationCode.id.desc())
+    if lock:
+        query = query.with_for_update()
+    return query.first()
+
+
+def _add_row(email: str, purpose: str, code: str, expire: int, audit: bool = False) -> None:
+    now = datetime.utcnow()
+    db.session.add(VerificationCode(email=email, code=code, purpose=purpose, attempts=0, audit=audit,
+                                    created_at=now, expires_at=now + timedelta(seconds=expire)))
+    db.session.commit()
+
+
+def _audit(email: str, purpose: str, code: str, expire: int) -> None:
+    """VERIFICATION_CODE_AUDIT 开启时把发出的验证码记入数据库，失败不影响发送"""
+    if not current_app.config.get('VERIFICATION_CODE_AUDIT'):
+        return
+    try:
+        _add_row(email, purpose, code, expire, audit=True)
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"记录验证码失败: {e}")
+
+
+def _issue_in_db(email: str, purpose: str, code: str) -> Tuple[bool, str, Optional[int]]:
+    expire, cooldown, _ = _settings()
+    existing = _latest_row(email, purpose)
+    if existing is not None:
+        elapsed = (datetime.utcnow() - existing.created_at).total_seconds()
+        if elapsed < cooldown:
+            return False, '请稍后再试', int(cooldown - elapsed)
+    _add_row(email, purpose, code, expire)
+    return True, code, None
+
+
+def issue_code(email: str, purpose: str, code: str) -> Tuple[bool, str, Optional[int]]:
+    """
+    保存新验证码（重置尝试次数）
+
+    验证码保存在 Redis 中，冷却检查和写入在一个脚本中完成；Redis 不可用时写数据库。
+
+    Returns:
+        Tuple[bool, str, Optional[int]]: (是否成功, 验证码或错误信息, 剩余冷却秒数)
+    """
+    expire, cooldown, _ = _settings()
+    client = RedisClient().client
+    if client is not None:
+        try:
+            issued, wait = client.eval(
+                _ISSUE_SCRIPT, 1, RedisKeys.get_verification_code_key(email, purpose),
+                int(time.time()), code, expire, cooldown
+            )
+            if not issued:
+                return False, '请稍后再试', int(wait)
+            _audit(email, purpose, code, expire)
+            return True, code, None
+        except redis.RedisError as e:
+            logger.warning(f"Redis 保存验证码失败，写入数据库: {e}")
+
+    return _issue_in_db(email, purpose, code)
+
+
+def _check_in_db(email: str, code: str, purpose: str, consume: bool) -> int:
+    """锁住验证码行后再计数，并发校验不会丢失尝试次数"""
+    _, _, max_attempts = _settings()
+    row = _latest_row(email, purpose, lock=True)
+    if row is None or row.is_expired():
+        db.session.rollback()
+        return CHECK_MISSING
+    if (row.attempts or 0) >= max_attempts:
+        db.session.rollback()
+        return CHECK_TOO_MANY
+    row.attempts = (row.attempts or 0) + 1
+    if row.code != code:
+        db.session.commit()
+        return CHECK_WRONG
+    if consume:
+        db.session.delete(row)
+    db.session.commit()
+    return CHECK_OK
+
+
+def check_code(email: str, code: str, purpose: str, consume: bool = False) -> Tuple[bool, str]:
+    """
+    校验验证码，每次校验计入尝试次数，超过 VERIFICATION_CODE_MAX_ATTEMPTS 后需要重新获取
+
+    Args:
+        consume: 验证成功后是否删除验证码
+
+    Returns:
+        Tuple[bool, str]: (是否通过, 提示信息)
+    """
+    _, _, max_attempts = _settings()
+    client = RedisClient().client
+    result = None
+    if client is not None:
+        try:
+            result = client.eval(
+                _CHECK_SCRIPT, 1, RedisKeys.get_verification_code_key(email, purpose),
+                code, max_attempts, int(consume)
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Redis 校验验证码失败，查询数据库: {e}")
+
+    if result is None:
+        try:
+            result = _check_in_db(email, code, purpose, consume)
+        except Exception:
+            db.session.rollback()
+            raise
+    return result == CHECK_OK, _CHECK_MESSAGES[result]
+
+
+def discard_code(email: str, purpose: str) -> None:
+    """删除验证码（如注册成功后）"""
+    client = RedisClient().client
+    if client is not None:
+        try:
+            client.delete(RedisKeys.get_verification_code_key(email, purpose))
+            return
+        except redis.RedisError as e:
+            logger.warning(f"Redis 删除验证码失败: {e}")
+
+    row = _latest_row(email, purpose)
+    if row is not None:
+        db.session.delete(row)
+        db.session.commit()
+
+
+def purge_expired_codes() -> int:
+    """删除数据库中已过期的验证码记录（审计记录和 Redis 不可用时写入的记录）"""
+    result = db.session.execute(
+        delete(VerificationCode).where(VerificationCode.expires_at < datetime.utcnow())
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def init_app(app):
+    """注册验证码清理命令"""
+
+    @app.cli.command('verification-codes-purge')
+    def verification_codes_purge():
+        """删除数据库中已过期的验证码记录"""
+        click.echo(f'已删除 {purge_expired_codes()} 条过期验证码')
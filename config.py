@@ -20,19 +20,103 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max-limit
     # ... 其他配置 ...
 
+    # 音频播放配置
+    AUDIO_SENDFILE_MODE = None  # None: 应用直接发送；'x-accel': nginx；'x-sendfile': apache/lighttpd
+    AUDIO_ACCEL_PREFIX = '/protected/songs'  # nginx internal location，对应 app/static/songs
+    AUDIO_STREAM_CHUNK_SIZE = 64 * 1024  # 读取文件的块大小（字节）
+    AUDIO_CACHE_MAX_AGE = 86400  # 浏览器缓存时间（秒）
+
+    # 上游接口（kugou）请求配置
+    UPSTREAM_CONNECT_TIMEOUT = 3.05  # 连接超时（秒）
+    UPSTREAM_READ_TIMEOUT = 10  # 读取超时（秒）
+    UPSTREAM_MAX_RETRIES = 2  # 连接错误和 429/5xx 的重试次数
+    UPSTREAM_BACKOFF_FACTOR = 0.3  # 重试退避系数
+    UPSTREAM_POOL_MAXSIZE = 16  # 每个主机的连接池大小
+    UPSTREAM_BREAKER_THRESHOLD = 5  # 连续失败多少次后熔断
+    UPSTREAM_BREAKER_RESET = 30  # 熔断持续时间（秒）
+
+    # 歌曲下载配置
+    DOWNLOAD_CHUNK_SIZE = 256 * 1024  # 每次读取的块大小（字节）
+    DOWNLOAD_MAX_RESUMES = 5  # 连接中断后断点续传的最大次数
+
+    # 收藏变更由后台线程批量写入数据库的间隔（秒）
+    LIKES_FLUSH_INTERVAL = 5
+
+    # 下载计数和下载历史由后台线程批量写入数据库的间隔（秒）
+    DOWNLOAD_STATS_FLUSH_INTERVAL = 5
+
+    # 热门榜分数的半衰期（秒）
+    TRENDING_HALF_LIFE = 24 * 3600
+
+    # 后台线程检查排行榜是否需要重建的间隔（秒）
+    RANKINGS_REFRESH_INTERVAL = 60
+
+    # 本地歌曲搜索：索引完整重建的间隔（秒），本地结果达到该数量时不再请求上游搜索
+    SEARCH_INDEX_REBUILD_INTERVAL = 3600
+    SEARCH_LOCAL_SUFFICIENT = 10
+
+    # 输入补全索引：完整重建（刷新热度）的间隔（秒），以及磁盘快照路径
+    SUGGEST_REBUILD_INTERVAL = 3600
+    SUGGEST_SNAPSHOT_PATH = os.path.join(basedir, 'instance', 'suggest_index.json')
+
+    # 歌词接口的浏览器缓存时间（秒），响应带 ETag
+    LYRICS_CACHE_MAX_AGE = 86400
+
+    # 封面缩略图配置
+    COVER_THUMBNAIL_SIZES = (96, 300)  # 缩略图边长（像素），列表用小图，详情用大图
+    COVER_THUMBNAIL_FORMATS = ('webp', 'jpeg')
+    COVER_THUMBNAIL_QUALITY = 80
+    COVER_THUMBNAIL_PROCESSES = 2  # 生成缩略图的进程数
+
     # Redis 配置
     REDIS_HOST = 'localhost'  # Redis 服务器地址
     REDIS_PORT = 6379  # Redis 端口
     REDIS_DB = 0  # Redis 数据库编号
 
     # 速率限制配置
-    RATE_LIMIT_DEFAULT_LIMIT = 5  # 默认限制次数
-    RATE_LIMIT_DEFAULT_PERIOD = 60  # 默认限制时间（秒）
+    RATE_LIMIT_LOCAL_MAX_KEYS = 10000  # Redis 不可用时进程内限流最多记录的键数
+    # 各接口的限流策略：algorithm 为 sliding_window（滑动窗口日志）或 token_bucket（令牌桶），
+    # limits 为 (维度, 上限, 周期秒数)，维度可以是 ip、user（未登录时按 IP）、email，所有限制都满足才放行；
+    # methods 省略时对所有请求方法生效
+    RATE_LIMITS = {
+        'login': {
+            'algorithm': 'sliding_window',
+            'methods': ('POST',),
+            'limits': [('ip', 20, 300), ('email', 5, 300)],
+        },
+        'verification_login': {
+            'algorithm': 'sliding_window',
+            'limits': [('ip', 5, 300), ('email', 5, 300)],
+        },
+        'register': {
+            'algorithm': 'sliding_window',
+            'methods': ('POST',),
+            'limits': [('ip', 10, 3600)],
+        },
+        'send_verification_code': {
+            'algorithm': 'sliding_window',
+            'limits': [('ip', 10, 3600), ('email', 5, 3600)],
+        },
+        'verify_code': {
+            'algorithm': 'sliding_window',
+            'limits': [('ip', 20, 300), ('email', 10, 300)],
+        },
+        'download': {
+            'algorithm': 'token_bucket',
+            'limits': [('user', 10, 60)],
+        },
+        'search': {
+            'algorithm': 'token_bucket',
+            'limits': [('ip', 30, 60)],
+        },
+    }
 
     # 验证码配置
-    VERIFICATION_CODE_EXPIRE = 300  # 验证码过期时间（秒）
+    VERIFICATION_CODE_EXPIRE = 600  # 验证码过期时间（秒）
     VERIFICATION_CODE_LENGTH = 6  # 验证码长度
-    VERIFICATION_SEND_LIMIT = 60  # 验证码发送间隔（秒）
+    VERIFICATION_SEND_LIMIT = 120  # 验证码发送间隔（秒）
+    VERIFICATION_CODE_MAX_ATTEMPTS = 5  # 每个验证码最多尝试次数
+    VERIFICATION_CODE_AUDIT = False  # 是否把发出的验证码记入数据库（verification_code 表）
 
     # 登录配置
     LOGIN_ATTEMPT_LIMIT = 5  # 登录尝试次数限制
@@ -0,0 +1,33 @@
+"""add keyset pagination indexes
+
+Revision ID: 3c2f7d1e9a40
+Revises: e8aaa76f94f5
+Create Date: 2026-10-16 10:12:31.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c2f7d1e9a40'
+down_revision = 'e8aaa76f94f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 歌曲列表和收藏列表改为 (created_at, id) 游标分页
+    with op.batch_alter_table('songs', schema=None) as batch_op:
+        batch_op.create_index('ix_songs_created_at_id', ['created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('user_favorites', schema=None) as batch_op:
+        batch_op.create_index('ix_user_favorites_user_created', ['user_id', 'created_at', 'song_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_favorites', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_favorites_user_created')
+
+    with op.batch_alter_table('songs', schema=None) as batch_op:
+        batch_op.drop_index('ix_songs_created_at_id')
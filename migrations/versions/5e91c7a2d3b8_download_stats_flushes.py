@@ -0,0 +1,37 @@
+"""download stats flushes
+
+Revision ID: 5e91c7a2d3b8
+Revises: b7d2e4f19a36
+Create Date: 2026-10-17 15:12:40.904117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e91c7a2d3b8'
+down_revision = 'b7d2e4f19a36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 记录已写入的下载统计批次，重复执行同一批次时跳过；
+    # 应用启动时的 db.create_all() 可能已经建好了这张表
+    if sa.inspect(op.get_bind()).has_table('download_stats_flushes'):
+        return
+    op.create_table('download_stats_flushes',
+    sa.Column('batch_id', sa.String(length=32), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('batch_id')
+    )
+    with op.batch_alter_table('download_stats_flushes', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_download_stats_flushes_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('download_stats_flushes', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_download_stats_flushes_created_at'))
+
+    op.drop_table('download_stats_flushes')
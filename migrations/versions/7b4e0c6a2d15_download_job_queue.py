@@ -0,0 +1,37 @@
+"""download job queue
+
+Revision ID: 7b4e0c6a2d15
+Revises: 3c2f7d1e9a40
+Create Date: 2026-10-16 14:05:47.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b4e0c6a2d15'
+down_revision = '3c2f7d1e9a40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # downloads 表同时作为后台下载任务表：任务创建时还没有歌曲，匿名下载没有用户
+    with op.batch_alter_table('downloads', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('song_query', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('message', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.alter_column('song_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=True)
+
+
+def downgrade():
+    op.execute('DELETE FROM downloads WHERE song_id IS NULL OR user_id IS NULL')
+
+    with op.batch_alter_table('downloads', schema=None) as batch_op:
+        batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('song_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('message')
+        batch_op.drop_column('song_query')
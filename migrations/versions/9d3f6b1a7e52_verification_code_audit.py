@@ -0,0 +1,29 @@
+"""verification code audit
+
+Revision ID: 9d3f6b1a7e52
+Revises: 5e91c7a2d3b8
+Create Date: 2026-10-17 16:03:27.581942
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3f6b1a7e52'
+down_revision = '5e91c7a2d3b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 审计记录与 Redis 不可用时写入的验证码存放在同一张表中，校验时跳过审计记录
+    with op.batch_alter_table('verification_code', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('audit', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade():
+    op.execute(sa.text('DELETE FROM verification_code WHERE audit'))
+
+    with op.batch_alter_table('verification_code', schema=None) as batch_op:
+        batch_op.drop_column('audit')
@@ -0,0 +1,32 @@
+"""song content hash
+
+Revision ID: a1d93f5c7e28
+Revises: 7b4e0c6a2d15
+Create Date: 2026-10-16 15:31:09.662174
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1d93f5c7e28'
+down_revision = '7b4e0c6a2d15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('songs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('emixsong_id', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_songs_emixsong_id'), ['emixsong_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_songs_content_hash'), ['content_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('songs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_songs_content_hash'))
+        batch_op.drop_index(batch_op.f('ix_songs_emixsong_id'))
+        batch_op.drop_column('content_hash')
+        batch_op.drop_column('emixsong_id')
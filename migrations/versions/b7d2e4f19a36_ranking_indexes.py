@@ -0,0 +1,35 @@
+"""ranking indexes
+
+Revision ID: b7d2e4f19a36
+Revises: f3a8d1e5c240
+Create Date: 2026-10-17 09:41:05.318264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e4f19a36'
+down_revision = 'f3a8d1e5c240'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 排行榜在 Redis 不可用时按计数排序，热门榜按最近的下载记录统计
+    with op.batch_alter_table('songs', schema=None) as batch_op:
+        batch_op.create_index('ix_songs_download_count', ['download_count'], unique=False)
+        batch_op.create_index('ix_songs_likes_count', ['likes_count'], unique=False)
+
+    with op.batch_alter_table('downloads', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_downloads_download_time'), ['download_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('downloads', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_downloads_download_time'))
+
+    with op.batch_alter_table('songs', schema=None) as batch_op:
+        batch_op.drop_index('ix_songs_likes_count')
+        batch_op.drop_index('ix_songs_download_count')
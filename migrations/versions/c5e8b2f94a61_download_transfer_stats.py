@@ -0,0 +1,30 @@
+"""download transfer stats
+
+Revision ID: c5e8b2f94a61
+Revises: a1d93f5c7e28
+Create Date: 2026-10-16 16:48:22.130957
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e8b2f94a61'
+down_revision = 'a1d93f5c7e28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('downloads', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('bytes_downloaded', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('transfer_seconds', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('resume_count', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('downloads', schema=None) as batch_op:
+        batch_op.drop_column('resume_count')
+        batch_op.drop_column('transfer_seconds')
+        batch_op.drop_column('bytes_downloaded')
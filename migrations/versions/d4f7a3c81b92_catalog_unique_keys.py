@@ -0,0 +1,114 @@
+"""catalog unique keys for bulk upsert
+
+Revision ID: d4f7a3c81b92
+Revises: c5e8b2f94a61
+Create Date: 2026-10-16 18:12:40.583214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f7a3c81b92'
+down_revision = 'c5e8b2f94a61'
+branch_labels = None
+depends_on = None
+
+
+def _duplicate_groups(conn, table, columns):
+    """
+    按 columns 分组找出重复的行，返回 [(保留的ID, [重复的ID...])]
+
+    分组和比较都由数据库完成，与唯一键使用同样的排序规则（MySQL 默认不区分大小写和重音）。
+    """
+    column_list = ', '.join(columns)
+    groups = conn.execute(sa.text(
+        f'SELECT {column_list}, MIN(id) FROM {table} '
+        f'WHERE {" AND ".join(f"{column} IS NOT NULL" for column in columns)} '
+        f'GROUP BY {column_list} HAVING COUNT(*) > 1'
+    )).all()
+    result = []
+    for row in groups:
+        keeper = row[-1]
+        condition = ' AND '.join(f'{column} = :v{i}' for i, column in enumerate(columns))
+        ids = conn.execute(
+            sa.text(f'SELECT id FROM {table} WHERE {condition} AND id != :keeper'),
+            dict({f'v{i}': value for i, value in enumerate(row[:-1])}, keeper=keeper)
+        ).scalars().all()
+        result.append((keeper, ids))
+    return result
+
+
+def _repoint(conn, table, column, duplicate, keeper, other=None):
+    """把 table.column 从 duplicate 改为 keeper；关联表先删除改完后会重复的 (other, keeper) 行"""
+    if other is not None:
+        existing = set(conn.execute(
+            sa.text(f'SELECT {other} FROM {table} WHERE {column} = :keeper'), {'keeper': keeper}
+        ).scalars())
+        for value in conn.execute(
+            sa.text(f'SELECT {other} FROM {table} WHERE {column} = :duplicate'), {'duplicate': duplicate}
+        ).scalars().all():
+            if value in existing:
+                conn.execute(sa.text(f'DELETE FROM {table} WHERE {column} = :duplicate AND {other} = :value'),
+                             {'duplicate': duplicate, 'value': value})
+    conn.execute(sa.text(f'UPDATE {table} SET {column} = :keeper WHERE {column} = :duplicate'),
+                 {'keeper': keeper, 'duplicate': duplicate})
+
+
+def _merge_duplicates(conn):
+    """合并已有的重复行，否则无法创建唯一键（先艺术家，再专辑，最后歌曲）"""
+    for keeper, duplicates in _duplicate_groups(conn, 'artists', ['name']):
+        for duplicate in duplicates:
+            _repoint(conn, 'albums', 'artist_id', duplicate, keeper)
+            _repoint(conn, 'song_artists', 'artist_id', duplicate, keeper, other='song_id')
+            conn.execute(sa.text('DELETE FROM artists WHERE id = :id'), {'id': duplicate})
+
+    for keeper, duplicates in _duplicate_groups(conn, 'albums', ['name', 'artist_id']):
+        for duplicate in duplicates:
+            _repoint(conn, 'songs', 'album_id', duplicate, keeper)
+            conn.execute(sa.text('DELETE FROM albums WHERE id = :id'), {'id': duplicate})
+
+    for keeper, duplicates in _duplicate_groups(conn, 'songs', ['emixsong_id']):
+        for duplicate in duplicates:
+            _repoint(conn, 'song_artists', 'song_id', duplicate, keeper, other='artist_id')
+            _repoint(conn, 'user_favorites', 'song_id', duplicate, keeper, other='user_id')
+            _repoint(conn, 'downloads', 'song_id', duplicate, keeper)
+            downloads = conn.execute(sa.text('SELECT download_count FROM songs WHERE id = :id'),
+                                     {'id': duplicate}).scalar() or 0
+            conn.execute(sa.text(
+                'UPDATE songs SET download_count = COALESCE(download_count, 0) + :downloads WHERE id = :keeper'
+            ), {'keeper': keeper, 'downloads': downloads})
+            conn.execute(sa.text('DELETE FROM songs WHERE id = :id'), {'id': duplicate})
+        conn.execute(sa.text(
+            'UPDATE songs SET likes_count = '
+            '(SELECT COUNT(*) FROM user_favorites WHERE user_favorites.song_id = :keeper) WHERE id = :keeper'
+        ), {'keeper': keeper})
+
+
+def upgrade():
+    _merge_duplicates(op.get_bind())
+
+    with op.batch_alter_table('artists', schema=None) as batch_op:
+        batch_op.drop_index('ix_artists_name')
+        batch_op.create_index(batch_op.f('ix_artists_name'), ['name'], unique=True)
+
+    with op.batch_alter_table('albums', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_albums_name_artist', ['name', 'artist_id'])
+
+    with op.batch_alter_table('songs', schema=None) as batch_op:
+        batch_op.drop_index('ix_songs_emixsong_id')
+        batch_op.create_index(batch_op.f('ix_songs_emixsong_id'), ['emixsong_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('songs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_songs_emixsong_id'))
+        batch_op.create_index('ix_songs_emixsong_id', ['emixsong_id'], unique=False)
+
+    with op.batch_alter_table('albums', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_albums_name_artist', type_='unique')
+
+    with op.batch_alter_table('artists', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_artists_name'))
+        batch_op.create_index('ix_artists_name', ['name'], unique=False)
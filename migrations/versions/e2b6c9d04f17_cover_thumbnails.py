@@ -0,0 +1,32 @@
+"""cover thumbnails
+
+Revision ID: e2b6c9d04f17
+Revises: d4f7a3c81b92
+Create Date: 2026-10-16 19:05:13.274610
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b6c9d04f17'
+down_revision = 'd4f7a3c81b92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('albums', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cover_thumbnails', sa.JSON(), nullable=True))
+
+    with op.batch_alter_table('songs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_thumbnails', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('songs', schema=None) as batch_op:
+        batch_op.drop_column('image_thumbnails')
+
+    with op.batch_alter_table('albums', schema=None) as batch_op:
+        batch_op.drop_column('cover_thumbnails')
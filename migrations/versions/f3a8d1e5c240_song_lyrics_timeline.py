@@ -0,0 +1,147 @@
+"""song lyrics timeline
+
+Revision ID: f3a8d1e5c240
+Revises: e2b6c9d04f17
+Create Date: 2026-10-16 20:21:47.915306
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8d1e5c240'
+down_revision = 'e2b6c9d04f17'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+songs = sa.table(
+    'songs',
+    sa.column('id', sa.Integer),
+    sa.column('lyrics', sa.JSON),
+    sa.column('lyrics_timeline', sa.JSON)
+)
+
+
+# 以下解析逻辑复制自编写本迁移时的 app/utils/lyrics.py，迁移不依赖应用代码，
+# 之后修改解析器不会改变本迁移的结果
+_TAG = re.compile(r'\[([^\]]*)\]')
+_TIME = re.compile(r'(\d+):(\d{1,2})(?:[.:](\d{1,3}))?')
+_METADATA = re.compile(r'([A-Za-z]\w*):(.*)', re.S)
+
+
+def _tag_ms(tag):
+    match = _TIME.fullmatch(tag)
+    if match is None:
+        return None
+    minutes, seconds, fraction = match.groups()
+    ms = (int(minutes) * 60 + int(seconds)) * 1000
+    if fraction:
+        ms += int(fraction.ljust(3, '0'))
+    return ms
+
+
+def _parse_lrc(text):
+    metadata = {}
+    timed = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line.startswith('['):
+            continue
+
+        stamps = []
+        position = 0
+        match = _TAG.match(line)
+        while match is not None:
+            ms = _tag_ms(match.group(1))
+            if ms is None:
+                break
+            stamps.append(ms)
+            position = match.end()
+            match = _TAG.match(line, position)
+
+        if not stamps:
+            meta_match = _METADATA.fullmatch(match.group(1)) if match else None
+            if meta_match:
+                key, value = meta_match.groups()
+                metadata[key] = value.strip()
+            continue
+
+        lyric_text = line[position:].strip()
+        if lyric_text:
+            for ms in stamps:
+                timed[ms] = lyric_text
+
+    try:
+        offset = int(metadata.get('offset') or 0)
+    except ValueError:
+        offset = 0
+    times = sorted(timed)
+    return {
+        'metadata': metadata,
+        'times': [max(ms - offset, 0) for ms in times],
+        'lines': [timed[ms] for ms in times]
+    }
+
+
+def _timeline_from_legacy(data):
+    timed = {}
+    for timestamp, lyric_text in (data.get('lyrics') or {}).items():
+        minutes, seconds = timestamp.split(':')
+        timed[int(minutes) * 60000 + round(float(seconds) * 1000)] = lyric_text
+    times = sorted(timed)
+    return {
+        'metadata': data.get('metadata') or {},
+        'times': times,
+        'lines': [timed[ms] for ms in times]
+    }
+
+
+def build_timeline(lyrics):
+    """原始歌词（LRC 文本或旧的字典格式）-> {'metadata', 'times': [毫秒], 'lines'}"""
+    if isinstance(lyrics, str) and lyrics.strip():
+        return _parse_lrc(lyrics)
+    if isinstance(lyrics, dict):
+        return _timeline_from_legacy(lyrics)
+    return None
+
+
+def upgrade():
+    with op.batch_alter_table('songs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('lyrics_timeline', sa.JSON(), nullable=True))
+
+    # 分批回填已有歌曲的歌词时间轴
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(songs.c.id, songs.c.lyrics)
+            .where(songs.c.id > last_id, songs.c.lyrics.isnot(None))
+            .order_by(songs.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+
+        updates = []
+        for song_id, lyrics in rows:
+            timeline = build_timeline(lyrics)
+            if timeline is not None:
+                updates.append({'song_id': song_id, 'timeline': timeline})
+        if updates:
+            connection.execute(
+                songs.update()
+                .where(songs.c.id == sa.bindparam('song_id'))
+                .values(lyrics_timeline=sa.bindparam('timeline', type_=sa.JSON)),
+                updates
+            )
+        last_id = rows[-1].id
+
+
+def downgrade():
+    with op.batch_alter_table('songs', schema=None) as batch_op:
+        batch_op.drop_column('lyrics_timeline')
@@ -0,0 +1,69 @@
+# tests/benchmarks/test_audio_stream_benchmark.py
+
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+from werkzeug.serving import make_server
+
+from app import db
+from app.models import Song
+from tests.factories import make_songs
+
+FILE_SIZE = 8 * 1024 * 1024
+SEEK_LENGTH = 256 * 1024
+CONCURRENCY = 16
+SEEKS_PER_ROUND = 200
+
+
+@pytest.fixture
+def server_url(app):
+    """在后台线程中用多线程 WSGI 服务器运行应用，播放一个 8 MiB 的文件"""
+    songs_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'songs')
+    os.makedirs(songs_dir, exist_ok=True)
+    with open(os.path.join(songs_dir, 'long.mp3'), 'wb') as f:
+        f.write(os.urandom(FILE_SIZE))
+    with app.app_context():
+        song_id = make_songs(1)[0]
+        db.session.execute(db.update(Song).where(Song.id == song_id).values(file_path='songs/long.mp3'))
+        db.session.commit()
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/api/play/{song_id}'
+    server.shutdown()
+    thread.join()
+
+
+def test_concurrent_seek_throughput(benchmark, server_url):
+    """16 个并发客户端在文件中随机拖动进度（Range 请求），统计每秒完成的请求数"""
+    rng = random.Random(4)
+    offsets = [rng.randrange(0, FILE_SIZE - SEEK_LENGTH) for _ in range(SEEKS_PER_ROUND)]
+    local = threading.local()
+
+    def seek(offset):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        response = session.get(server_url, headers={'Range': f'bytes={offset}-{offset + SEEK_LENGTH - 1}'})
+        assert response.status_code == 206
+        assert len(response.content) == SEEK_LENGTH
+        return response.headers['Content-Range']
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        def run_round():
+            return list(executor.map(seek, offsets))
+
+        ranges = benchmark(run_round)
+
+    assert ranges[0] == f'bytes {offsets[0]}-{offsets[0] + SEEK_LENGTH - 1}/{FILE_SIZE}'
+    benchmark.extra_info['concurrency'] = CONCURRENCY
+    benchmark.extra_info['seeks'] = SEEKS_PER_ROUND
+    if benchmark.stats:
+        mean = benchmark.stats.stats.mean
+        benchmark.extra_info['seeks_per_sec'] = int(SEEKS_PER_ROUND / mean)
+        benchmark.extra_info['mib_per_sec'] = round(SEEKS_PER_ROUND * SEEK_LENGTH / mean / 2 ** 20, 1)
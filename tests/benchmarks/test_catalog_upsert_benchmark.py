@@ -0,0 +1,58 @@
+# tests/benchmarks/test_catalog_upsert_benchmark.py
+"""
+歌曲信息入库的吞吐：upsert_song_infos 批量写入 vs 逐首调用 song_information_download
+
+每轮写入 BATCH_SIZE 首新歌曲（50 位艺术家、100 张专辑，部分歌曲有两位艺术家），
+extra_info 中记录每秒写入的行数。
+"""
+
+import itertools
+import time
+
+import pytest
+
+from app import db
+from app.catalog_search import index_songs
+from app.catalog_upsert import upsert_song_infos
+from app.music_downloader import parse_song_info, song_information_download
+
+BATCH_SIZE = 500
+
+_songs = itertools.count()
+
+
+def _contents(count):
+    """songinfo 接口 data 字段格式的歌曲信息，返回 [(EMixSongID, data)]"""
+    contents = []
+    for _ in range(count):
+        i = next(_songs)
+        artists = f'artist {i % 50}' + (f'、artist {(i + 1) % 50}' if i % 4 == 0 else '')
+        contents.append((f'E{i}', {'audio_name': f'song {i}', 'author_name': artists, 'album_name': f'album {i % 100}',
+                                   'timelength': 180000, 'img': '', 'lyrics': None}))
+    return contents
+
+
+def _batch(contents):
+    song_ids = upsert_song_infos([dict(parse_song_info(data), emixsong_id=emixsong_id) for emixsong_id, data in contents])
+    db.session.commit()
+    index_songs(song_ids)
+
+
+def _per_song(contents):
+    for emixsong_id, data in contents:
+        song_information_download(data, emixsong_id)
+
+
+@pytest.mark.parametrize('mode', ['batch', 'per_song'])
+def test_upsert_throughput(benchmark, app, mode):
+    store = _batch if mode == 'batch' else _per_song
+    elapsed = []
+
+    def round_(contents):
+        start = time.perf_counter()
+        store(contents)
+        elapsed.append(time.perf_counter() - start)
+
+    with app.app_context():
+        benchmark.pedantic(round_, setup=lambda: ((_contents(BATCH_SIZE),), {}), rounds=3, iterations=1)
+        benchmark.extra_info['rows_per_sec'] = round(BATCH_SIZE / min(elapsed))
@@ -0,0 +1,53 @@
+# tests/benchmarks/test_likes_benchmark.py
+"""
+并发收藏切换的吞吐：16 个线程共 1000 次切换，集中在 5 首热门歌曲上
+
+redis: 写入 Redis，由后台线程批量写入数据库；database: Redis 不可用时逐次写数据库。
+extra_info 中记录每秒切换次数。测试中的 Redis 是进程内的 fakeredis（Lua 脚本与请求线程争用 GIL），
+两者的差距小于使用真实 Redis 时。
+"""
+
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.likes import flush_pending_likes, toggle_like
+from app.utils.redis_client import RedisClient
+from tests.factories import make_songs, make_users
+
+TOGGLES = 1000
+THREADS = 16
+
+
+@pytest.mark.parametrize('mode', ['redis', 'database'])
+def test_toggle_throughput(benchmark, app, mode):
+    with app.app_context():
+        user_ids = make_users(100)
+        song_ids = make_songs(5)
+    rng = random.Random(17)
+    ops = [(rng.choice(user_ids), rng.choice(song_ids)) for _ in range(TOGGLES)]
+    elapsed = []
+
+    def toggle(op):
+        with app.app_context():
+            toggle_like(*op)
+
+    def round_():
+        start = time.perf_counter()
+        with ThreadPoolExecutor(THREADS) as executor:
+            list(executor.map(toggle, ops))
+        elapsed.append(time.perf_counter() - start)
+
+    redis_client = RedisClient()
+    saved = redis_client.client
+    if mode == 'database':
+        redis_client.client = None
+    try:
+        benchmark.pedantic(round_, rounds=3, iterations=1)
+    finally:
+        redis_client.client = saved
+    with app.app_context():
+        flush_pending_likes()
+    benchmark.extra_info['toggles_per_sec'] = round(TOGGLES / min(elapsed))
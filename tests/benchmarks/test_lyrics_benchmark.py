@@ -0,0 +1,48 @@
+# tests/benchmarks/test_lyrics_benchmark.py
+
+import random
+
+import pytest
+
+from app.utils.lyrics import parse_lrc
+
+CORPUS_SIZE = 2000
+
+
+def _lrc(rng: random.Random) -> str:
+    """生成一首 LRC 歌词：元数据、偏移、多时间标签、不同精度和换行符"""
+    newline = rng.choice(('\n', '\r\n'))
+    lines = ['[ti:benchmark]', '[ar:artist]', f'[offset:{rng.randint(-500, 500)}]']
+    ms = 0
+    for index in range(rng.randint(30, 80)):
+        ms += rng.randint(1500, 6000)
+        stamps = [ms] + ([ms + 60000] if index % 7 == 0 else [])
+        tags = ''.join(
+            f'[{stamp // 60000:02d}:{stamp // 1000 % 60:02d}.{stamp % 1000:03d}]' if rng.random() < 0.5
+            else f'[{stamp // 60000:02d}:{stamp // 1000 % 60:02d}.{stamp % 1000 // 10:02d}]'
+            for stamp in stamps
+        )
+        lines.append(f'{tags}line {index} 歌词第 {index} 行')
+    return newline.join(lines)
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    rng = random.Random(2024)
+    return [_lrc(rng) for _ in range(CORPUS_SIZE)]
+
+
+def test_parse_lrc_corpus(benchmark, corpus):
+    total_lines = sum(text.count('\n') + 1 for text in corpus)
+
+    def parse_all():
+        return [parse_lrc(text) for text in corpus]
+
+    timelines = benchmark(parse_all)
+    assert len(timelines) == CORPUS_SIZE
+    assert all(timeline['times'] == sorted(timeline['times']) for timeline in timelines)
+
+    benchmark.extra_info['files'] = CORPUS_SIZE
+    benchmark.extra_info['lines'] = total_lines
+    if benchmark.stats:
+        benchmark.extra_info['lines_per_sec'] = int(total_lines / benchmark.stats.stats.mean)
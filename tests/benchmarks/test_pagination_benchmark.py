@@ -0,0 +1,66 @@
+# tests/benchmarks/test_pagination_benchmark.py
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import create_app, db
+from app.models import Song
+from app.utils.pagination import encode_cursor, keyset_paginate
+from tests.conftest import TestConfig
+
+PER_PAGE = 20
+DEEP_PAGE = 10000
+CATALOG_SIZE = PER_PAGE * (DEEP_PAGE + 1)
+
+
+@pytest.fixture(scope='module')
+def catalog_app(tmp_path_factory):
+    """20 万首歌曲的目录，整个模块共用"""
+    class Settings(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path_factory.mktemp('pagination') / 'catalog.db'}"
+
+    app = create_app(Settings)
+    with app.app_context():
+        start = datetime(2020, 1, 1)
+        rows = [{'name': f'song {i}', 'duration': 180, 'likes_count': 0, 'download_count': 0,
+                 'created_at': start + timedelta(seconds=i // 3)} for i in range(CATALOG_SIZE)]
+        db.session.execute(db.insert(Song.__table__), rows)
+        db.session.commit()
+    return app
+
+
+def _cursor_before_page(page):
+    """第 page 页（从 1 开始）的游标，即前一页最后一行的 (created_at, id)"""
+    if page == 1:
+        return None
+    row = db.session.execute(
+        db.select(Song.created_at, Song.id).order_by(Song.created_at.desc(), Song.id.desc())
+        .offset((page - 1) * PER_PAGE - 1).limit(1)
+    ).one()
+    return encode_cursor(row.created_at, row.id)
+
+
+@pytest.mark.parametrize('page', [1, DEEP_PAGE])
+def test_keyset_page_latency(benchmark, catalog_app, page):
+    benchmark.group = 'keyset pagination'
+    with catalog_app.app_context():
+        cursor = _cursor_before_page(page)
+        result = benchmark(lambda: keyset_paginate(Song.query, Song.created_at, Song.id,
+                                                   cursor=cursor, per_page=PER_PAGE))
+        assert len(result.items) == PER_PAGE
+        if page == DEEP_PAGE:
+            # 最后一页之前：还剩正好一页
+            assert result.has_more
+        db.session.remove()
+
+
+@pytest.mark.parametrize('page', [1, DEEP_PAGE])
+def test_offset_page_latency(benchmark, catalog_app, page):
+    """对照：OFFSET 分页的耗时随页码线性增长"""
+    benchmark.group = 'offset pagination'
+    with catalog_app.app_context():
+        query = Song.query.order_by(Song.created_at.desc(), Song.id.desc())
+        items = benchmark(lambda: query.offset((page - 1) * PER_PAGE).limit(PER_PAGE).all())
+        assert len(items) == PER_PAGE
+        db.session.remove()
@@ -0,0 +1,47 @@
+# tests/benchmarks/test_search_benchmark.py
+"""
+在线搜索的延迟：本地 kugou 模拟服务，每个详情请求耗时 5~30ms
+
+每轮搜索 50 个不同的关键词（不命中缓存），记录单次搜索的 p50/p99 延迟，
+并与逐个请求详情的串行写法对比。
+"""
+
+import itertools
+import statistics
+import time
+
+import pytest
+
+from app import music_downloader
+from app.music_downloader import get_song_info, search_audio_ids, search_songs
+
+SEARCHES_PER_ROUND = 50
+
+_keywords = itertools.count()
+
+
+def _serial_search(keyword):
+    """改动前的写法：逐个请求详情"""
+    _, emixsong_ids = search_audio_ids(keyword)
+    return [get_song_info(emixsong_id, music_downloader.SEARCH_ENRICH_TIMEOUT) for emixsong_id in emixsong_ids]
+
+
+def _run(benchmark, search):
+    latencies = []
+
+    def round_():
+        for _ in range(SEARCHES_PER_ROUND):
+            start = time.perf_counter()
+            search(f'keyword {next(_keywords)}')
+            latencies.append(time.perf_counter() - start)
+
+    benchmark.pedantic(round_, rounds=3, iterations=1)
+    latencies.sort()
+    benchmark.extra_info['p50_ms'] = round(statistics.median(latencies) * 1000, 2)
+    benchmark.extra_info['p99_ms'] = round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2)
+
+
+@pytest.mark.parametrize('mode', ['concurrent', 'serial'])
+def test_search_latency(benchmark, app, kugou_stub, mode):
+    search = search_songs if mode == 'concurrent' else _serial_search
+    _run(benchmark, search)
@@ -0,0 +1,96 @@
+# tests/conftest.py
+
+import fakeredis
+import pytest
+import redis
+
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    # 并发测试中多个线程同时写入 SQLite，等待锁而不是立即报错
+    SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+    RATE_LIMITS = {}
+
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    """每个测试独立的 fakeredis 服务器，应用创建的 Redis 客户端都连接到它"""
+    server = fakeredis.FakeServer()
+
+    class FakeRedis(fakeredis.FakeRedis):
+        def __init__(self, host=None, port=None, db=0, **kwargs):
+            super().__init__(server=server, db=db, **kwargs)
+
+    monkeypatch.setattr(redis, 'Redis', FakeRedis)
+    return server
+
+
+@pytest.fixture
+def app(tmp_path, redis_server, monkeypatch):
+    """使用临时 SQLite 数据库和 fakeredis 的应用；后台写入线程不启动，由测试直接调用写入函数"""
+    from app import catalog_search, catalog_suggest, create_app, db, likes, download_stats, rankings
+    from app.utils.search_index import SearchIndex
+    from app.utils.audio_stream import _path_cache
+    from app.utils.catalog import catalog_cache
+    from app.utils.lyrics import _timeline_cache
+
+    monkeypatch.setattr(likes, '_flusher_started', True)
+    monkeypatch.setattr(download_stats, '_flusher_started', True)
+    monkeypatch.setattr(rankings, '_rebuilder_started', True)
+    # 搜索和补全索引是进程内的，每个测试从空索引开始
+    monkeypatch.setattr(catalog_search, '_index', SearchIndex(catalog_search.FIELD_WEIGHTS))
+    monkeypatch.setattr(catalog_search, '_state', {'version': None, 'max_id': 0, 'seq': 0, 'built_at': None})
+    monkeypatch.setattr(catalog_suggest, '_state',
+                        {'index': None, 'version': None, 'max_id': 0, 'seq': 0, 'built_at': None})
+
+    class Settings(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        UPLOAD_FOLDER = str(tmp_path / 'static')
+        SUGGEST_SNAPSHOT_PATH = str(tmp_path / 'suggest_index.json')
+
+    application = create_app(Settings)
+    # 进程内缓存以歌曲ID为键，不能带到下一个测试的数据库
+    _path_cache.clear()
+    _timeline_cache.clear()
+    catalog_cache.invalidate_local()
+    yield application
+    with application.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def no_redis(app):
+    """模拟 Redis 不可用"""
+    from app.utils.redis_client import RedisClient
+
+    client = RedisClient()
+    saved = client.client
+    client.client = None
+    yield
+    client.client = saved
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def kugou_stub(app, monkeypatch):
+    """本地的 kugou 接口；上游客户端的请求转到这里，搜索和详情缓存清空"""
+    from app import music_downloader
+    from app.utils.http_client import upstream
+    from tests.kugou_stub import KugouStub
+
+    stub = KugouStub().start()
+    monkeypatch.setattr(upstream, 'session', upstream._build_session())
+    stub.install(upstream.session)
+    music_downloader._search_cache.clear()
+    music_downloader._song_info_cache.clear()
+    yield stub
+    stub.stop()
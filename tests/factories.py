@@ -0,0 +1,50 @@
+# tests/factories.py
+
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Album, Artist, Song, User, song_artists
+
+
+def make_songs(count, artist_name='artist', album_name='album', start=datetime(2024, 1, 1)):
+    """批量写入歌曲（同一艺术家和专辑），返回歌曲ID列表，需在应用上下文中调用"""
+    artist = Artist(name=artist_name)
+    db.session.add(artist)
+    db.session.flush()
+    album = Album(name=album_name, artist_id=artist.id)
+    db.session.add(album)
+    db.session.flush()
+
+    rows = [
+        {'name': f'song {i}', 'album_id': album.id, 'duration': 180, 'likes_count': 0, 'download_count': 0,
+         'created_at': start + timedelta(seconds=i), 'updated_at': start + timedelta(seconds=i)}
+        for i in range(count)
+    ]
+    db.session.execute(db.insert(Song.__table__), rows)
+    song_ids = db.session.execute(
+        db.select(Song.id).where(Song.album_id == album.id).order_by(Song.id)
+    ).scalars().all()
+    db.session.execute(db.insert(song_artists), [{'song_id': song_id, 'artist_id': artist.id} for song_id in song_ids])
+    db.session.commit()
+    return song_ids
+
+
+def make_user(email='user@example.com', password='password'):
+    user = User(username=email.split('@')[0], email=email)
+    user.set_password(password)
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def make_users(count):
+    """批量写入用户（密码相同，只计算一次哈希），返回用户ID列表"""
+    user = User()
+    user.set_password('password')
+    db.session.execute(db.insert(User.__table__), [
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': user.password_hash,
+         'is_active': True}
+        for i in range(count)
+    ])
+    db.session.commit()
+    return db.session.execute(db.select(User.id).order_by(User.id)).scalars().all()
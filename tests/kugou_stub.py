@@ -0,0 +1,99 @@
+# tests/kugou_stub.py
+
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, Set
+from urllib.parse import parse_qs
+
+from requests.adapters import HTTPAdapter
+from werkzeug.serving import make_server
+
+UPSTREAM_HOSTS = ('https://complexsearch.kugou.com', 'https://wwwapi.kugou.com')
+
+
+class KugouStub:
+    """
+    本地模拟的 kugou 搜索接口和歌曲详情接口
+
+    搜索词决定返回的 8 个 EMixSongID；歌曲详情按 latency_ms 模拟上游耗时，
+    slow_ids 中的歌曲等待 slow_seconds，failing_ids 中的歌曲返回 500。
+    """
+
+    def __init__(self, latency_ms=(5, 30)):
+        self.latency_ms = latency_ms
+        self.slow_ids: Set[str] = set()
+        self.slow_seconds = 2.0
+        self.failing_ids: Set[str] = set()
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = make_server('127.0.0.1', 0, self._wsgi, threaded=True)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_port}'
+
+    @staticmethod
+    def song_ids(keyword: str):
+        return [f'{hashlib.md5(keyword.encode()).hexdigest()[:10]}{index}' for index in range(8)]
+
+    def _latency(self, song_id: str) -> float:
+        low, high = self.latency_ms
+        return (low + int(hashlib.md5(song_id.encode()).hexdigest(), 16) % (high - low + 1)) / 1000
+
+    def _wsgi(self, environ, start_response):
+        path = environ['PATH_INFO']
+        params = {key: values[0] for key, values in parse_qs(environ.get('QUERY_STRING', '')).items()}
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+        if path == '/v2/search/song':
+            keyword = params.get('keyword', '')
+            lists = [{'FileName': f'artist {index} - {keyword} {index}', 'EMixSongID': song_id}
+                     for index, song_id in enumerate(self.song_ids(keyword))]
+            body = f"callback123({json.dumps({'data': {'lists': lists}})})"
+        elif path == '/play/songinfo':
+            song_id = params.get('encode_album_audio_id', '')
+            time.sleep(self.slow_seconds if song_id in self.slow_ids else self._latency(song_id))
+            if song_id in self.failing_ids:
+                start_response('500 Internal Server Error', [('Content-Type', 'text/plain')])
+                return [b'error']
+            body = json.dumps({'data': {
+                'audio_name': f'title {song_id}', 'author_name': 'artist', 'album_name': 'album',
+                'timelength': 180000, 'img': f'http://img.example/{song_id}.jpg'
+            }})
+        else:
+            start_response('404 Not Found', [('Content-Type', 'text/plain')])
+            return [b'not found']
+
+        start_response('200 OK', [('Content-Type', 'application/json')])
+        return [body.encode()]
+
+    def install(self, session) -> None:
+        """让 session 中发往 kugou 的请求转到本地服务器"""
+        adapter = _RedirectAdapter(self.url, pool_maxsize=16)
+        for host in UPSTREAM_HOSTS:
+            session.mount(host, adapter)
+
+    def start(self) -> 'KugouStub':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._thread.join()
+
+
+class _RedirectAdapter(HTTPAdapter):
+    def __init__(self, target: str, **kwargs):
+        self.target = target
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        for host in UPSTREAM_HOSTS:
+            if request.url.startswith(host):
+                request.url = self.target + request.url[len(host):]
+                break
+        return super().send(request, **kwargs)
@@ -0,0 +1,90 @@
+# tests/test_audio_stream.py
+
+import os
+
+import pytest
+
+from app import db
+from app.models import Song
+from app.utils.audio_stream import _path_cache
+from tests.factories import make_songs
+
+AUDIO = bytes(range(256)) * 64  # 16 KiB
+
+
+@pytest.fixture
+def song_id(app):
+    songs_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'songs')
+    os.makedirs(songs_dir, exist_ok=True)
+    with open(os.path.join(songs_dir, 'track.mp3'), 'wb') as f:
+        f.write(AUDIO)
+    with app.app_context():
+        song_id = make_songs(1)[0]
+        db.session.execute(db.update(Song).where(Song.id == song_id).values(file_path='songs/track.mp3'))
+        db.session.commit()
+    return song_id
+
+
+def test_full_response(client, song_id):
+    response = client.get(f'/api/play/{song_id}')
+    assert response.status_code == 200
+    assert response.data == AUDIO
+    assert response.mimetype == 'audio/mpeg'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['ETag'].startswith('"') and not response.headers['ETag'].startswith('W/')
+
+
+@pytest.mark.parametrize('header, start, stop', [
+    ('bytes=10-19', 10, 20),
+    ('bytes=16000-', 16000, len(AUDIO)),
+    ('bytes=-100', len(AUDIO) - 100, len(AUDIO)),
+    ('bytes=16380-99999', 16380, len(AUDIO)),
+])
+def test_range_requests(client, song_id, header, start, stop):
+    response = client.get(f'/api/play/{song_id}', headers={'Range': header})
+    assert response.status_code == 206
+    assert response.data == AUDIO[start:stop]
+    assert response.headers['Content-Range'] == f'bytes {start}-{stop - 1}/{len(AUDIO)}'
+    assert int(response.headers['Content-Length']) == stop - start
+
+
+def test_unsatisfiable_range(client, song_id):
+    response = client.get(f'/api/play/{song_id}', headers={'Range': f'bytes={len(AUDIO)}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(AUDIO)}'
+
+
+def test_conditional_requests(client, song_id):
+    etag = client.get(f'/api/play/{song_id}').headers['ETag']
+    assert client.get(f'/api/play/{song_id}', headers={'If-None-Match': etag}).status_code == 304
+
+    # If-Range 与当前文件一致时按范围返回，不一致时返回完整文件
+    response = client.get(f'/api/play/{song_id}', headers={'Range': 'bytes=0-9', 'If-Range': etag})
+    assert response.status_code == 206
+    response = client.get(f'/api/play/{song_id}', headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.data == AUDIO
+
+
+def test_sendfile_offload(app, client, song_id):
+    app.config['AUDIO_SENDFILE_MODE'] = 'x-accel'
+    response = client.get(f'/api/play/{song_id}', headers={'Range': 'bytes=0-9'})
+    assert response.headers['X-Accel-Redirect'] == '/protected/songs/track.mp3'
+    assert response.data == b''
+
+    app.config['AUDIO_SENDFILE_MODE'] = 'x-sendfile'
+    response = client.get(f'/api/play/{song_id}')
+    assert response.headers['X-Sendfile'].endswith(os.path.join('songs', 'track.mp3'))
+
+
+def test_missing_file_is_forgotten(app, client, song_id):
+    assert client.get(f'/api/play/{song_id}').status_code == 200
+    assert _path_cache.get(song_id) is not None
+    os.remove(os.path.join(app.config['UPLOAD_FOLDER'], 'songs', 'track.mp3'))
+
+    assert client.get(f'/api/play/{song_id}').status_code == 404
+    assert _path_cache.get(song_id) is None
+
+
+def test_unknown_song(client, app):
+    assert client.get('/api/play/12345').status_code == 404
@@ -0,0 +1,97 @@
+# tests/test_catalog_upsert.py
+
+import pytest
+
+from app import catalog_upsert, db
+from app.catalog_upsert import match_keys, upsert_song_infos
+from app.models import Album, Artist, Song, song_artists
+from app.utils.lyrics import build_timeline
+
+
+def song_info(name, artists=('artist',), album='album', duration=180, emixsong_id=None):
+    info = {'name': name, 'duration': duration, 'image_url': '', 'album_name': album,
+            'artist_names': list(artists), 'lyrics': None, 'lyrics_timeline': None}
+    if emixsong_id:
+        info['emixsong_id'] = emixsong_id
+    return info
+
+
+def song_artist_names(song_id):
+    return set(db.session.execute(
+        db.select(Artist.name).join(song_artists).where(song_artists.c.song_id == song_id)
+    ).scalars())
+
+
+@pytest.fixture(params=['native', 'generic'])
+def upsert_path(request, app, monkeypatch):
+    """native: ON CONFLICT；generic: 没有原生 upsert 的数据库（先查询再写入）"""
+    if request.param == 'generic':
+        monkeypatch.setattr(catalog_upsert, '_ON_CONFLICT_DIALECTS', {})
+    with app.app_context():
+        yield request.param
+
+
+def test_upsert_creates_catalog_rows(upsert_path):
+    ids = upsert_song_infos([
+        song_info('one', ['a', 'b'], emixsong_id='E1'),
+        song_info('two', ['b'], album='other'),
+        song_info('one', ['a', 'b'], emixsong_id='E1'),
+    ])
+    db.session.commit()
+
+    assert ids[0] == ids[2] != ids[1]
+    assert Song.query.count() == 2
+    assert {artist.name for artist in Artist.query} == {'a', 'b'}
+    assert {(album.name, album.artist.name) for album in Album.query} == {('album', 'a'), ('other', 'b')}
+    assert song_artist_names(ids[0]) == {'a', 'b'}
+    assert db.session.get(Song, ids[0]).emixsong_id == 'E1'
+
+
+def test_upsert_updates_existing_songs(upsert_path):
+    first, plain = upsert_song_infos([song_info('one', ['a', 'b'], emixsong_id='E1'), song_info('plain')])
+    db.session.commit()
+
+    # 按 EMixSongID 匹配的歌曲更新字段和艺术家；没有 EMixSongID 的按 (歌曲名, 专辑) 匹配
+    ids = upsert_song_infos([song_info('one', ['a', 'c'], duration=200, emixsong_id='E1'),
+                             song_info('plain', duration=90)])
+    db.session.commit()
+
+    assert ids == [first, plain]
+    assert Song.query.count() == 2
+    assert db.session.get(Song, first).duration == 200
+    assert db.session.get(Song, plain).duration == 90
+    assert song_artist_names(first) == {'a', 'c'}
+
+
+def test_upsert_keeps_emixsong_id(upsert_path):
+    song_id, = upsert_song_infos([song_info('one', emixsong_id='E1')])
+    db.session.commit()
+
+    assert upsert_song_infos([song_info('one')]) == [song_id]
+    db.session.commit()
+    assert db.session.get(Song, song_id).emixsong_id == 'E1'
+
+
+def test_match_keys_spans_chunks(app):
+    with app.app_context():
+        names = [f'artist {i}' for i in range(catalog_upsert._MATCH_CHUNK_SIZE * 2 + 5)]
+        upsert_song_infos([song_info(f'song {i}', [name]) for i, name in enumerate(names)])
+        db.session.commit()
+
+        matched = match_keys([Artist.name], [(name,) for name in names + ['missing', names[0]]], [Artist.id])
+
+        assert [row[0] for row in matched] == names
+
+
+def test_upsert_refreshes_cached_lyrics(app, client):
+    with app.app_context():
+        info = song_info('one', emixsong_id='E1')
+        song_id, = upsert_song_infos([dict(info, lyrics='[00:01.00]old', lyrics_timeline=build_timeline('[00:01.00]old'))])
+        db.session.commit()
+        assert client.get(f'/api/songs/{song_id}/lyrics').get_json()['lyrics']['lines'] == ['old']
+
+        upsert_song_infos([dict(info, lyrics='[00:01.00]new', lyrics_timeline=build_timeline('[00:01.00]new'))])
+        db.session.commit()
+
+    assert client.get(f'/api/songs/{song_id}/lyrics').get_json()['lyrics']['lines'] == ['new']
+    assert client.get(f'/api/songs/{song_id}/lyrics/window?position=2').get_json()['lines'] == ['new']
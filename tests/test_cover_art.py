@@ -0,0 +1,39 @@
+# tests/test_cover_art.py
+
+import pytest
+
+from app import cover_art, db
+from app.cover_art import apply_cover, process_cover
+from app.models import Song
+from app.utils import thumbnails
+from app.utils.song_storage import STATIC_DIR
+from tests.factories import make_songs
+
+
+@pytest.fixture
+def cover(app, tmp_path, monkeypatch):
+    """封面原图已在 static 目录（相对路径 app/static）中，不访问网络"""
+    monkeypatch.chdir(tmp_path)
+    path = STATIC_DIR / 'music_images' / 'covers' / 'cover.jpg'
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b'not an image')
+    monkeypatch.setattr(cover_art, 'fetch_cover', lambda url: path)
+    with app.app_context():
+        song_id = make_songs(1)[0]
+        db.session.execute(db.update(Song).where(Song.id == song_id).values(image_url='http://img.example/1.jpg'))
+        db.session.commit()
+        yield song_id
+
+
+def test_covers_without_pillow_stay_pending(cover, monkeypatch):
+    monkeypatch.setattr(thumbnails, 'Image', None)
+
+    result = process_cover('http://img.example/1.jpg')
+    apply_cover([cover], result)
+    db.session.commit()
+
+    song = db.session.get(Song, cover)
+    assert result == {'original': 'music_images/covers/cover.jpg', 'thumbnails': None}
+    assert song.local_image_path == 'music_images/covers/cover.jpg'
+    # image_thumbnails 仍为空，安装 Pillow 后 schedule_covers / covers-backfill 会重新处理
+    assert song.image_thumbnails is None
@@ -0,0 +1,125 @@
+# tests/test_download_stats.py
+
+import random
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import redis
+
+from app import db, download_stats
+from app.download_stats import flush_download_stats, record_download
+from app.models import Download, Song
+from app.utils.redis_client import RedisClient
+from tests.factories import make_songs, make_users
+
+DOWNLOADS = 1000
+THREADS = 16
+
+
+def _download_counts(song_ids):
+    db.session.expire_all()
+    return {song_id: db.session.get(Song, song_id).download_count for song_id in song_ids}
+
+
+def _history():
+    return Counter(db.session.execute(db.select(Download.song_id, Download.user_id)).all())
+
+
+@pytest.fixture
+def catalog(app):
+    with app.app_context():
+        return make_users(10), make_songs(10)
+
+
+def _downloads(user_ids, song_ids, seed):
+    """(歌曲ID, 用户ID 或 None)，约三分之一是匿名下载"""
+    rng = random.Random(seed)
+    return [(rng.choice(song_ids), rng.choice(user_ids + [None] * 5)) for _ in range(DOWNLOADS)]
+
+
+def _record_concurrently(app, ops, flushers=0):
+    """在 THREADS 个线程中记录下载，同时有 flushers 个线程不断写入数据库"""
+    done = threading.Event()
+
+    def record(op):
+        with app.app_context():
+            record_download(*op)
+
+    def flusher():
+        with app.app_context():
+            while not done.is_set():
+                flush_download_stats()
+
+    threads = [threading.Thread(target=flusher) for _ in range(flushers)]
+    for thread in threads:
+        thread.start()
+    try:
+        with ThreadPoolExecutor(THREADS) as executor:
+            list(executor.map(record, ops))
+    finally:
+        done.set()
+        for thread in threads:
+            thread.join()
+
+
+def test_concurrent_downloads_are_counted_exactly(app, catalog):
+    user_ids, song_ids = catalog
+    buffered = _downloads(user_ids, song_ids, 19)
+    direct = _downloads(user_ids, song_ids, 20)
+
+    _record_concurrently(app, buffered, flushers=2)
+    # Redis 不可用时直接写数据库，与 Redis 中尚未写入的增量叠加
+    redis_client = RedisClient()
+    saved, redis_client.client = redis_client.client, None
+    try:
+        _record_concurrently(app, direct)
+    finally:
+        redis_client.client = saved
+
+    with app.app_context():
+        flush_download_stats()
+        expected = Counter(song_id for song_id, _ in buffered + direct)
+        assert _download_counts(song_ids) == {song_id: expected[song_id] for song_id in song_ids}
+        assert _history() == Counter((song_id, user_id) for song_id, user_id in buffered + direct if user_id)
+        assert flush_download_stats() == 0
+
+
+def test_batch_is_not_applied_twice_after_a_crash(app, catalog, monkeypatch):
+    (user_id, *_), (song_id, *_) = catalog
+    with app.app_context():
+        for _ in range(3):
+            record_download(song_id, user_id)
+
+        # 事务已提交，删除 Redis 中的批次前失败
+        with monkeypatch.context() as patch, pytest.raises(redis.RedisError):
+            patch.setattr(download_stats, '_FINISH_BATCH_SCRIPT', 'error')
+            flush_download_stats()
+        record_download(song_id, user_id)
+
+        # 重新处理同一批次时跳过，之后的新数据在下一批次写入
+        assert flush_download_stats() == 0
+        assert flush_download_stats() == 1
+        assert _download_counts([song_id]) == {song_id: 4}
+        assert _history() == {(song_id, user_id): 4}
+
+
+def test_failed_batch_is_retried(app, catalog, monkeypatch):
+    (user_id, *_), (song_id, *_) = catalog
+    with app.app_context():
+        record_download(song_id, user_id)
+
+        def fail(rows):
+            raise RuntimeError('database unavailable')
+
+        with monkeypatch.context() as patch, pytest.raises(RuntimeError):
+            patch.setattr(download_stats, '_insert_history', fail)
+            flush_download_stats()
+        assert _download_counts([song_id]) == {song_id: 0}
+
+        record_download(song_id)
+        assert flush_download_stats() == 1
+        assert flush_download_stats() == 1
+        assert _download_counts([song_id]) == {song_id: 2}
+        assert _history() == {(song_id, user_id): 1}
@@ -0,0 +1,126 @@
+# tests/test_likes.py
+
+import random
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import db
+from app.likes import flush_pending_likes, get_like_status, get_like_statuses, toggle_like
+from app.models import Song, User, user_favorites
+from app.utils.redis_client import RedisClient
+from tests.factories import make_songs, make_users
+
+TOGGLES = 1000
+THREADS = 16
+
+
+def _favorites():
+    return set(db.session.execute(db.select(user_favorites.c.user_id, user_favorites.c.song_id)).all())
+
+
+def _likes_counts(song_ids):
+    db.session.expire_all()
+    return {song_id: db.session.get(Song, song_id).likes_count for song_id in song_ids}
+
+
+def _toggle_concurrently(app, ops, flush=False):
+    """在 THREADS 个线程中执行 ops 中的收藏切换；flush 时另一个线程同时不断写入数据库"""
+    done = threading.Event()
+
+    def toggle(op):
+        with app.app_context():
+            assert toggle_like(*op) is not None
+
+    def flusher():
+        with app.app_context():
+            while not done.is_set():
+                flush_pending_likes()
+
+    flush_thread = threading.Thread(target=flusher) if flush else None
+    if flush_thread:
+        flush_thread.start()
+    try:
+        with ThreadPoolExecutor(THREADS) as executor:
+            list(executor.map(toggle, ops))
+    finally:
+        done.set()
+        if flush_thread:
+            flush_thread.join()
+
+
+@pytest.fixture
+def catalog(app):
+    with app.app_context():
+        user_ids = make_users(20)
+        song_ids = make_songs(10)
+    return user_ids, song_ids
+
+
+@pytest.mark.parametrize('redis_available', [True, False])
+def test_parallel_toggles_lose_no_updates(app, catalog, redis_available):
+    user_ids, song_ids = catalog
+    rng = random.Random(17)
+    ops = [(rng.choice(user_ids), rng.choice(song_ids)) for _ in range(TOGGLES)]
+    # 每个收藏关系切换奇数次后为已收藏
+    expected = {pair for pair, count in Counter(ops).items() if count % 2}
+
+    redis_client = RedisClient()
+    saved = redis_client.client
+    if not redis_available:
+        redis_client.client = None
+    try:
+        _toggle_concurrently(app, ops, flush=redis_available)
+    finally:
+        redis_client.client = saved
+
+    with app.app_context():
+        flush_pending_likes()
+        assert _favorites() == expected
+        expected_counts = Counter(song_id for _, song_id in expected)
+        assert _likes_counts(song_ids) == {song_id: expected_counts[song_id] for song_id in song_ids}
+        for user_id in user_ids:
+            statuses = get_like_statuses(user_id, song_ids)
+            assert statuses == {
+                song_id: ((user_id, song_id) in expected, expected_counts[song_id]) for song_id in song_ids
+            }
+
+
+def test_toggle_is_served_from_redis_until_flushed(app, catalog):
+    (user_id, *_), (song_id, *_) = catalog
+    with app.app_context():
+        assert toggle_like(user_id, song_id) == (True, 1)
+        assert get_like_status(user_id, song_id) == (True, 1)
+        assert db.session.get(User, user_id).has_liked_song(db.session.get(Song, song_id))
+        assert _favorites() == set()
+
+        assert flush_pending_likes() == 1
+        assert _favorites() == {(user_id, song_id)}
+        assert _likes_counts([song_id]) == {song_id: 1}
+        assert toggle_like(user_id, 10 ** 6) is None
+
+
+def test_changes_made_while_redis_is_down_win_over_pending_ones(app, catalog):
+    (user_id, other_user_id, *_), (song_id, *_) = catalog
+    with app.app_context():
+        toggle_like(other_user_id, song_id)
+        flush_pending_likes()
+        # 已收藏但还没写入数据库
+        toggle_like(user_id, song_id)
+
+        redis_client = RedisClient()
+        saved, redis_client.client = redis_client.client, None
+        try:
+            # Redis 不可用，数据库中还没有这条收藏，切换后为已收藏
+            assert toggle_like(user_id, song_id) == (True, 2)
+            assert toggle_like(user_id, song_id) == (False, 1)
+        finally:
+            redis_client.client = saved
+
+        assert get_like_status(user_id, song_id) == (False, 1)
+        flush_pending_likes()
+        assert _favorites() == {(other_user_id, song_id)}
+        assert _likes_counts([song_id]) == {song_id: 1}
+        assert toggle_like(user_id, song_id) == (True, 2)
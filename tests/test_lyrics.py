@@ -0,0 +1,36 @@
+# tests/test_lyrics.py
+
+from app.utils.lyrics import build_timeline, lyric_window, parse_lrc
+
+
+def test_parse_lrc_line_endings_and_precision():
+    text = '[ti:title]\r\n[00:01]one\n[00:02.5]two\r\n[00:03.25]three\n[01:04.125]four'
+    timeline = parse_lrc(text)
+    assert timeline['metadata'] == {'ti': 'title'}
+    assert timeline['times'] == [1000, 2500, 3250, 64125]
+    assert timeline['lines'] == ['one', 'two', 'three', 'four']
+
+
+def test_parse_lrc_multiple_timestamps_and_offset():
+    timeline = parse_lrc('[offset:500]\n[00:10.00][00:01.00]chorus\n[00:05.00]verse\n[00:00.20]intro')
+    assert timeline['times'] == [0, 500, 4500, 9500]
+    assert timeline['lines'] == ['intro', 'chorus', 'verse', 'chorus']
+
+
+def test_parse_lrc_skips_empty_and_untagged_lines():
+    timeline = parse_lrc('plain text\n[00:01.00]\n[00:02.00]  kept  \n[bad]x')
+    assert timeline['times'] == [2000]
+    assert timeline['lines'] == ['kept']
+
+
+def test_build_timeline_legacy_format():
+    legacy = {'metadata': {'ti': 'x'}, 'lyrics': {'00:03.50': 'b', '00:01.00': 'a'}}
+    assert build_timeline(legacy) == {'metadata': {'ti': 'x'}, 'times': [1000, 3500], 'lines': ['a', 'b']}
+    assert build_timeline('') is None
+
+
+def test_lyric_window():
+    times = [1000, 2000, 3000, 4000]
+    assert lyric_window(times, 500, 2) == (-1, 0, 3)
+    assert lyric_window(times, 2500, 1) == (1, 1, 3)
+    assert lyric_window(times, 2500, 10, until_ms=3500) == (1, 1, 3)
@@ -0,0 +1,92 @@
+# tests/test_pagination.py
+
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models import Song, user_favorites
+from app.utils.pagination import InvalidCursor, decode_cursor, encode_cursor
+from app.utils.redis_client import RedisClient
+from tests.factories import make_songs, make_user
+
+
+def _login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+
+
+def _walk(client, url, per_page):
+    """沿着 next_cursor 翻完所有页，返回歌曲ID列表和页数"""
+    song_ids, pages, cursor = [], 0, None
+    while True:
+        response = client.get(url, query_string={'per_page': per_page, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        data = response.get_json()
+        song_ids.extend(song['id'] for song in data['songs'])
+        pages += 1
+        if not data['has_more']:
+            return song_ids, pages, data
+        cursor = data['next_cursor']
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+
+@pytest.mark.parametrize('cursor', ['', 'not-base64!', 'WzFd', encode_cursor(datetime(2024, 1, 1), 1)[:-2]])
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor or '=')
+
+
+def test_songs_pages_cover_catalog_once(app, client):
+    with app.app_context():
+        song_ids = make_songs(23)
+        # 同一时间创建的歌曲按ID打破并列
+        db.session.execute(db.update(Song).where(Song.id.in_(song_ids[5:15])).values(created_at=datetime(2024, 6, 1)))
+        db.session.commit()
+        expected = [song.id for song in Song.query.order_by(Song.created_at.desc(), Song.id.desc())]
+
+    walked, pages, last = _walk(client, '/api/songsLoading', per_page=5)
+    assert walked == expected
+    assert pages == 5
+    assert last['total'] == 23
+
+
+def test_songs_invalid_cursor_returns_400(app, client):
+    response = client.get('/api/songsLoading', query_string={'cursor': 'garbage'})
+    assert response.status_code == 400
+
+
+def test_unknown_cursor_is_served_but_not_cached(app, client):
+    with app.app_context():
+        make_songs(5)
+    client.get('/api/songsLoading', query_string={'per_page': 2})
+    cursor = encode_cursor(datetime(2030, 1, 1), 999)
+    response = client.get('/api/songsLoading', query_string={'cursor': cursor, 'per_page': 2})
+    assert [song['name'] for song in response.get_json()['songs']] == ['song 4', 'song 3']
+    cached = RedisClient().client.keys('catalog_cache:*:songs:page:*')
+    assert cached and not any(key.endswith(cursor) for key in cached)
+
+
+def test_favorites_pages_in_favorite_order(app, client):
+    with app.app_context():
+        song_ids = make_songs(12)
+        user_id = make_user()
+        db.session.execute(db.insert(user_favorites), [
+            {'user_id': user_id, 'song_id': song_id, 'created_at': datetime(2024, 2, 1, 0, 0, index % 4)}
+            for index, song_id in enumerate(song_ids)
+        ])
+        db.session.commit()
+        expected = [row.song_id for row in db.session.execute(
+            db.select(user_favorites.c.song_id)
+            .order_by(user_favorites.c.created_at.desc(), user_favorites.c.song_id.desc())
+        )]
+
+    _login(client, user_id)
+    walked, pages, last = _walk(client, '/api/me/favorites', per_page=5)
+    assert walked == expected
+    assert pages == 3
+    assert last['total'] == 12
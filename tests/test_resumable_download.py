@@ -0,0 +1,166 @@
+# tests/test_resumable_download.py
+
+import fcntl
+import hashlib
+import os
+import threading
+import time
+from typing import List, Optional
+
+import pytest
+from werkzeug.serving import make_server
+
+from app import db
+from app.models import Download, Song
+from app.music_downloader import download_url
+from app.utils.song_storage import STATIC_DIR, object_path, partial_path
+from tests.factories import make_songs
+
+AUDIO = os.urandom(200 * 1024)
+AUDIO_HASH = hashlib.sha256(AUDIO).hexdigest()
+
+
+class AudioServer:
+    """
+    本地音频下载服务器，支持 Range 请求
+
+    cuts 中依次是每个响应发送多少字节后断开连接（None 表示完整发送）；
+    ignore_range 时忽略 Range 请求，总是返回完整文件（200）。
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.cuts: List[Optional[int]] = []
+        self.ignore_range = False
+        self.ranges: List[Optional[str]] = []
+        self._server = make_server('127.0.0.1', 0, self._wsgi, threaded=True)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_port}/song.mp3'
+
+    def _wsgi(self, environ, start_response):
+        range_header = environ.get('HTTP_RANGE')
+        self.ranges.append(range_header)
+        cut = self.cuts.pop(0) if self.cuts else None
+
+        start = 0
+        if range_header and not self.ignore_range:
+            start = int(range_header[len('bytes='):].rstrip('-'))
+            if start >= len(self.data):
+                start_response('416 Range Not Satisfiable', [('Content-Range', f'bytes */{len(self.data)}')])
+                return [b'']
+            start_response('206 Partial Content', [
+                ('Content-Length', str(len(self.data) - start)),
+                ('Content-Range', f'bytes {start}-{len(self.data) - 1}/{len(self.data)}'),
+            ])
+        else:
+            start_response('200 OK', [('Content-Length', str(len(self.data)))])
+
+        def body():
+            # 保证传输耗时不为 0
+            time.sleep(0.01)
+            sent = self.data[start:] if cut is None else self.data[start:start + cut]
+            for offset in range(0, len(sent), 16 * 1024):
+                yield sent[offset:offset + 16 * 1024]
+            if cut is not None:
+                raise ConnectionAbortedError('模拟连接中断')
+
+        return body()
+
+    def start(self) -> 'AudioServer':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._thread.join()
+
+
+@pytest.fixture
+def server():
+    server = AudioServer(AUDIO).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def song(app, tmp_path, monkeypatch):
+    """songs/ 目录（相对路径 app/static）放在临时目录中"""
+    monkeypatch.chdir(tmp_path)
+    app.config['DOWNLOAD_CHUNK_SIZE'] = 8 * 1024
+    app.config['DOWNLOAD_MAX_RESUMES'] = 3
+    with app.app_context():
+        song_id = make_songs(1)[0]
+        yield db.session.get(Song, song_id)
+
+
+def _download(song, server):
+    download = Download(song_id=song.id, status=Download.STATUS_RUNNING)
+    db.session.add(download)
+    db.session.commit()
+    path = download_url('artist - song', server.url, song, download)
+    db.session.expire_all()
+    return path, db.session.get(Download, download.id)
+
+
+def _assert_committed(song, path):
+    """文件内容正确，并且通过 commit_song_file 存入内容寻址存储（songs/ 下是对象的硬链接）"""
+    assert path == song.file_path == 'songs/artist - song.mp3'
+    stored = STATIC_DIR / path
+    assert hashlib.sha256(stored.read_bytes()).hexdigest() == AUDIO_HASH == song.content_hash
+    assert os.path.samefile(stored, object_path(AUDIO_HASH))
+    assert song.file_size == len(AUDIO)
+    assert not partial_path(f'song-{song.id}').exists()
+
+
+def test_resumes_after_dropped_connections(song, server):
+    server.cuts = [60 * 1024, 50 * 1024]
+
+    path, download = _download(song, server)
+
+    _assert_committed(song, path)
+    assert server.ranges[0] is None
+    assert all(header.startswith('bytes=') and header != 'bytes=0-' for header in server.ranges[1:])
+    assert len(server.ranges) == 3
+    assert download.resume_count == 2
+    assert download.bytes_downloaded == len(AUDIO)
+    assert 0 < download.transfer_seconds < 5
+
+
+def test_restarts_when_range_is_ignored(song, server):
+    server.cuts = [60 * 1024]
+    server.ignore_range = True
+
+    path, download = _download(song, server)
+
+    # 第二次响应是完整文件（200），.part 文件被截断后重新写入，而不是追加
+    assert server.ranges[1] is not None
+    _assert_committed(song, path)
+    assert download.resume_count == 1
+    assert download.bytes_downloaded == len(AUDIO)
+
+
+def test_partial_file_survives_failure_and_is_resumed(song, server):
+    server.cuts = [40 * 1024] * 4
+
+    path, download = _download(song, server)
+
+    assert path is None
+    part = partial_path(f'song-{song.id}')
+    kept = part.read_bytes()
+    assert 0 < len(kept) < len(AUDIO)
+    assert AUDIO.startswith(kept)
+    # 失败后锁已释放，其他下载可以使用这个 .part 文件
+    with open(part, 'rb') as f:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        fcntl.flock(f, fcntl.LOCK_UN)
+
+    server.ranges.clear()
+    path, download = _download(song, server)
+
+    assert server.ranges == [f'bytes={len(kept)}-']
+    _assert_committed(song, path)
+    assert download.resume_count == 1
+    assert download.bytes_downloaded == len(AUDIO) - len(kept)
@@ -0,0 +1,71 @@
+# tests/test_search.py
+
+import time
+
+from app import music_downloader
+from app.catalog_search import rebuild_index
+from app.music_downloader import search_songs
+from app.utils import search_index
+from tests.kugou_stub import KugouStub
+
+
+def test_search_songs_keeps_upstream_order(kugou_stub):
+    songs, complete = search_songs('Hello World')
+
+    assert complete
+    assert [song['emixsong_id'] for song in songs] == KugouStub.song_ids('hello world')
+    assert songs[0]['file_name'] == 'artist 0 - hello world 0'
+    assert songs[0]['title'] == f"title {songs[0]['emixsong_id']}"
+    assert songs[0]['duration'] == 180
+
+
+def test_slow_details_return_partial_results(kugou_stub):
+    ids = KugouStub.song_ids('slow')
+    kugou_stub.slow_ids.add(ids[3])
+
+    start = time.monotonic()
+    songs, complete = search_songs('slow', deadline=0.5)
+
+    assert time.monotonic() - start < kugou_stub.slow_seconds
+    assert not complete
+    assert [song['emixsong_id'] for song in songs] == ids[:3] + ids[4:]
+
+
+def test_search_results_are_cached(kugou_stub):
+    search_songs('cached')
+    first = dict(kugou_stub.requests)
+
+    # 本地缓存被清空后仍从 Redis 读取，不再请求上游
+    music_downloader._search_cache.clear()
+    music_downloader._song_info_cache.clear()
+    songs, complete = search_songs('  CACHED ')
+
+    assert complete and len(songs) == 8
+    assert kugou_stub.requests == first == {'/v2/search/song': 1, '/play/songinfo': 8}
+
+
+def test_api_search_marks_partial_results(client, kugou_stub):
+    ids = KugouStub.song_ids('broken')
+    kugou_stub.failing_ids.add(ids[0])
+
+    response = client.get('/api/search?q=broken')
+
+    assert response.status_code == 200
+    assert response.headers['X-Search-Partial'] == '1'
+    assert [song['emixsong_id'] for song in response.get_json()] == ids[1:]
+
+    response = client.get('/api/search?q=complete')
+    assert 'X-Search-Partial' not in response.headers
+    assert len(response.get_json()) == 8
+
+
+def test_missing_pinyin_is_logged_once(app, monkeypatch, caplog):
+    monkeypatch.setattr(search_index, 'lazy_pinyin', None)
+    monkeypatch.setattr(search_index, '_pinyin_warned', False)
+    with app.app_context():
+        rebuild_index()
+        rebuild_index()
+
+    assert [record.message for record in caplog.records if 'pypinyin' in record.message] == [
+        '未安装 pypinyin，搜索和输入补全不支持拼音及首字母查询'
+    ]
@@ -0,0 +1,70 @@
+# tests/test_suggest.py
+
+import pytest
+
+from app import db
+from app.catalog_search import index_songs
+from app.catalog_suggest import suggest
+from app.catalog_upsert import upsert_song_infos
+from app.models import Song
+from app.utils.suggest_index import SuggestIndex
+
+
+def entry(ref_id, text, score=1, kind='song'):
+    return {'type': kind, 'id': ref_id, 'text': text, 'subtitle': '', 'score': score}
+
+
+def refs(results):
+    return [result['ref'] for result in results]
+
+
+@pytest.mark.parametrize('merge_threshold', [2000, 1])
+def test_renamed_entries_are_rekeyed(merge_threshold):
+    index = SuggestIndex.build({f's:{i}': entry(i, f'song {i}', score=i) for i in range(50)},
+                               merge_threshold=merge_threshold)
+
+    index.add({'s:49': entry(49, 'renamed', score=49)}, removed=['s:48'])
+
+    assert refs(index.suggest('renamed')) == ['s:49']
+    # 过时的键不再匹配，其他条目仍按分数排在前面
+    assert refs(index.suggest('song', 3)) == ['s:47', 's:46', 's:45']
+    assert 's:48' not in index.entries
+    snapshot = index.to_snapshot()
+    assert ('song 49', 's:49') not in zip(snapshot['keys'], snapshot['refs'])
+    assert SuggestIndex.from_snapshot(snapshot).suggest('renamed')[0]['ref'] == 's:49'
+
+
+def _info(name, artist, emixsong_id):
+    return {'name': name, 'duration': 180, 'image_url': '', 'album_name': 'album', 'artist_names': [artist],
+            'lyrics': None, 'lyrics_timeline': None, 'emixsong_id': emixsong_id}
+
+
+def _store(infos):
+    song_ids = upsert_song_infos(infos)
+    db.session.commit()
+    index_songs(song_ids)
+    return song_ids
+
+
+def test_changed_songs_reach_suggestions_without_rebuild(app):
+    with app.app_context():
+        song_id, other_id = _store([_info('yesterday', 'beatles', 'E1'), _info('yellow', 'coldplay', 'E2')])
+        assert {result['id'] for result in suggest('ye')} == {song_id, other_id}
+
+        # 改名（不经过 catalog_upsert）后发布变更
+        song = db.session.get(Song, song_id)
+        song.name = 'hey jude'
+        db.session.commit()
+        index_songs([song_id])
+        # 重新写入时换了艺术家
+        _store([_info('yellow', 'chris martin', 'E2')])
+        db.session.execute(db.update(Song).where(Song.id == other_id).values(download_count=5))
+        db.session.commit()
+        index_songs([other_id])
+
+        assert [result['id'] for result in suggest('ye')] == [other_id]
+        assert suggest('hey')[0]['id'] == song_id
+        assert suggest('jude')[0]['id'] == song_id
+        assert suggest('yellow')[0]['subtitle'] == 'chris martin'
+        artist, = suggest('chris')
+        assert (artist['type'], artist['score']) == ('artist', 5)